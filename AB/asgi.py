@@ -3,6 +3,14 @@ ASGI config for AB project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+ASGI serving mode, the one of the Procfile (needed for the concurrent
+`dashboard/async/` view and the dashboard live stream)::
+
+    gunicorn AB.asgi:application -k uvicorn_worker.UvicornWorker --bind 0.0.0.0:$PORT
+
+or locally ``uvicorn AB.asgi:application --reload``. Sync views keep working
+unchanged under ASGI.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
 """
@@ -63,6 +63,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # first, so its timings cover the whole middleware stack
+    'core.middleware.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -73,6 +75,11 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
+# Share of requests instrumented by MetricsMiddleware (1.0 = all, 0.1 = 10%)
+METRICS_SAMPLE_RATE = float(os.environ.get('METRICS_SAMPLE_RATE', '1.0'))
+# When set, /metrics requires the header `Authorization: Bearer <METRICS_TOKEN>`
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+
 ROOT_URLCONF = 'AB.urls'
 
 TEMPLATES = [
@@ -100,6 +107,18 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        # concurrent writers (stock/services.py): take the write lock at BEGIN and
+        # wait for it, instead of failing on a read -> write upgrade; WAL lets
+        # readers run during a write and, with synchronous=NORMAL, syncs at
+        # checkpoints rather than at every commit
+        'OPTIONS': {
+            'transaction_mode': 'IMMEDIATE',
+            'timeout': 20,
+            'init_command': 'PRAGMA journal_mode=WAL; PRAGMA synchronous=NORMAL;',
+        },
+        # tests on a file rather than in memory: the concurrency tests
+        # (stock/tests.py) need several connections to the same database
+        'TEST': {'NAME': BASE_DIR / 'test_db.sqlite3'},
     }
 }
 
@@ -113,9 +132,29 @@ if DATABASE_URL:
         )
     # Parse database configuration from $DATABASE_URL
     db_config = dj_database_url.parse(DATABASE_URL, conn_max_age=600)
+    # the OPTIONS and TEST above are SQLite ones
+    DATABASES['default'].pop('OPTIONS')
+    DATABASES['default'].pop('TEST')
     DATABASES['default'].update(db_config)
 
 
+# Cache
+# The dashboard caches its computed results (see dashboard/cache.py). Keys are
+# versioned by per-model generation counters stored in the database, so the
+# default per-process LocMemCache stays correct with several workers; point
+# DJANGO_CACHE_BACKEND/DJANGO_CACHE_LOCATION to a shared backend to share the
+# computed values between workers as well.
+CACHES = {
+    'default': {
+        'BACKEND': os.environ.get('DJANGO_CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.environ.get('DJANGO_CACHE_LOCATION', 'agrodata'),
+    }
+}
+
+# Seconds a computed dashboard result stays fresh (writes invalidate it earlier)
+DASHBOARD_CACHE_TIMEOUT = int(os.environ.get('DASHBOARD_CACHE_TIMEOUT', '300'))
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -166,6 +205,10 @@ STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+# Les formulaires producteur envoient ~5 champs par récolte : le défaut de
+# Django (1000) bloque l'édition d'un producteur à ~200 récoltes.
+DATA_UPLOAD_MAX_NUMBER_FIELDS = int(os.environ.get('DATA_UPLOAD_MAX_NUMBER_FIELDS', '10000'))
+
 # ------------------ Security settings (tunable via env vars) ------------------
 # These are safe defaults for development. For production (DEBUG=False) set the
 # corresponding environment variables in Render (or your hosting) to enable them.
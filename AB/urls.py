@@ -24,6 +24,15 @@ urlpatterns = [
     path('', core_views.login_view, name='root'),
     path('accounts/login/', core_views.login_view, name='login'),
     path('accounts/logout/', core_views.logout_view, name='logout'),
+    # Prometheus scrape endpoint fed by core.middleware.MetricsMiddleware
+    path('metrics', core_views.metrics, name='metrics'),
+    # global search across all entities (core/omnibox.py)
+    path('recherche/', core_views.recherche, name='recherche'),
+    # typeahead lookups of the form widgets (core/lookup.py)
+    path('lookup/<slug:name>/', core_views.lookup, name='lookup'),
+    # lot traceability, forward (recalls) and backward (core/tracabilite.py)
+    path('tracabilite/aval/', core_views.trace_aval, name='trace_aval'),
+    path('tracabilite/amont/', core_views.trace_amont, name='trace_amont'),
     path('',include('producteurs.urls')),
     path('',include('stock.urls')),
     path('',include('transformation.urls')),
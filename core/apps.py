@@ -1,6 +1,19 @@
 from django.apps import AppConfig
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_migrate
 
 
 class CoreConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'core'
+
+    def ready(self):
+        # trigram search indexes live outside the migrations (see core/search.py)
+        from . import metrics, omnibox, search, tracabilite
+        # SQL metrics of MetricsMiddleware, on the connections of every thread
+        connection_created.connect(metrics.instrument, dispatch_uid='core_metrics_queries')
+        post_migrate.connect(search.installer, sender=self, dispatch_uid='core_search_indexes')
+        # keep the omnibox documents in sync with the main tables
+        omnibox.connect()
+        # lot lineage table, rebuilt after writes that move a path
+        tracabilite.connect()
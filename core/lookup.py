@@ -0,0 +1,139 @@
+"""Recherche à la saisie (typeahead) pour les champs clé étrangère des formulaires.
+
+Les formulaires ne chargent plus des tables entières dans des `<select>` :
+le widget `_typeahead.html` interroge `lookup/<nom>/?q=...` et ne reçoit
+qu'une page de résultats. Chaque nom de `LOOKUPS` décrit un modèle :
+
+- les champs cherchés : préfixe (`istartswith`) sous 3 caractères, index
+  trigramme de `core.search` au-delà ;
+- l'ordre des résultats, à adosser à un index pour que `LIMIT` s'arrête tôt ;
+- les filtres acceptés en paramètre (ex. les parcelles d'un producteur) ;
+- le libellé affiché, calculé sans requête supplémentaire (`select_related`).
+"""
+from django.apps import apps
+from django.db.models import Q
+
+from producteurs import fruits
+
+from . import search
+
+LIMIT = 20
+LIMIT_MAX = 50
+
+
+class Lookup:
+    def __init__(self, model, champs, ordering, label, detail=None, select_related=(), filtres=None, chercher=None):
+        self.model = model
+        self.champs = tuple(champs)
+        self.ordering = tuple(ordering)
+        self.label = label
+        self.detail = detail
+        self.select_related = tuple(select_related)
+        # GET param -> field lookup, e.g. {'producteur': 'producteur_id'}
+        self.filtres = filtres or {}
+        # custom matching: f(queryset, q) -> queryset
+        self.chercher = chercher
+
+    def queryset(self):
+        qs = apps.get_model(self.model).objects.all()
+        if self.select_related:
+            qs = qs.select_related(*self.select_related)
+        return qs.order_by(*self.ordering)
+
+    def filtrer(self, qs, q):
+        if self.chercher is not None:
+            return self.chercher(qs, q)
+        return par_texte(qs, q, self.champs)
+
+    def resultat(self, obj):
+        return {'id': obj.pk, 'label': self.label(obj), 'detail': self.detail(obj) if self.detail else ''}
+
+
+def par_texte(qs, q, champs):
+    """Rows whose `champs` start with `q` (short input) or contain it (trigram index)."""
+    if len(q) >= search.MIN_LENGTH:
+        return search.filtrer(qs, q, champs)
+    condition = Q()
+    for champ in champs:
+        condition |= Q(**{f'{champ}__istartswith': q})
+    return qs.filter(condition)
+
+
+def _recoltes(qs, q):
+    # a number is a récolte id, text a fruit or a producteur
+    if q.isdecimal():
+        return qs.filter(pk=int(q))
+    cle = fruits.normaliser(q)
+    fruit_ids = [id_ for id_, nom in fruits.choix() if fruits.normaliser(nom).startswith(cle)]
+    producteurs = par_texte(apps.get_model('producteurs.Producteur').objects.all(), q, ('nom', 'prenom', 'telephone'))
+    return qs.filter(Q(fruit_id__in=fruit_ids) | Q(producteur__in=producteurs.values('pk')))
+
+
+def _ventes(qs, q):
+    # "12" or "#12" is a vente id, text a client
+    numero = q.lstrip('#')
+    if numero.isdecimal():
+        return qs.filter(pk=int(numero))
+    clients = par_texte(apps.get_model('vente.Client').objects.all(), q, ('nom', 'prenom', 'telephone', 'email'))
+    return qs.filter(client__in=clients.values('pk'))
+
+
+LOOKUPS = {
+    'producteur': Lookup(
+        'producteurs.Producteur', ('nom', 'prenom', 'telephone'), ('nom', 'prenom', 'id'),
+        label=lambda o: f"{o.nom} {o.prenom}",
+        detail=lambda o: o.telephone,
+    ),
+    'parcelle': Lookup(
+        'producteurs.Parcelle', ('nom', 'adresse'), ('nom', 'id'),
+        label=lambda o: o.nom,
+        detail=lambda o: f"{o.superficie:g} ha · {o.producteur.nom} {o.producteur.prenom}",
+        select_related=('producteur',),
+        filtres={'producteur': 'producteur_id'},
+    ),
+    'recolte': Lookup(
+        'producteurs.Recolte', (), ('-date_recolte', '-id'),
+        label=lambda o: f"{o.fruit.nom} - {o.quantite:g} ({o.date_recolte:%d/%m/%Y})",
+        detail=lambda o: f"{o.producteur.nom} {o.producteur.prenom}",
+        select_related=('fruit', 'producteur'),
+        filtres={'producteur': 'producteur_id', 'parcelle': 'parcelle_id'},
+        chercher=_recoltes,
+    ),
+    'stock': Lookup(
+        'stock.Stock', ('produit',), ('produit', 'id'),
+        label=lambda o: f"{o.produit} - {o.quantite_disponible:g} {o.unite_mesure}",
+        detail=lambda o: f"Mis à jour le {o.date_mise_a_jour:%d/%m/%Y}",
+    ),
+    'client': Lookup(
+        'vente.Client', ('nom', 'prenom', 'telephone', 'email'), ('nom', 'prenom', 'id'),
+        label=lambda o: f"{o.nom} {o.prenom}",
+        detail=lambda o: o.telephone,
+    ),
+    'vente': Lookup(
+        'vente.Vente', (), ('-date_vente', '-id'),
+        label=lambda o: f"Vente #{o.id} - {o.client.nom} {o.client.prenom}",
+        detail=lambda o: f"{o.stock.produit} · {o.date_vente:%d/%m/%Y} · {o.montant_total}",
+        select_related=('client', 'stock'),
+        filtres={'client': 'client_id'},
+        chercher=_ventes,
+    ),
+}
+
+
+def libelle(nom, obj):
+    """Label of `obj` as lookup `nom` shows it: the initial text of a widget."""
+    return LOOKUPS[nom].label(obj) if obj is not None else ''
+
+
+def chercher(nom, q='', filtres=None, limit=LIMIT):
+    """(results, more) of lookup `nom` for the input `q`; KeyError for an unknown lookup."""
+    lookup = LOOKUPS[nom]
+    qs = lookup.queryset()
+    for param, valeur in (filtres or {}).items():
+        if param in lookup.filtres and str(valeur).isdecimal():
+            qs = qs.filter(**{lookup.filtres[param]: int(valeur)})
+    q = (q or '').strip()
+    if q:
+        qs = lookup.filtrer(qs, q)
+    rows = list(qs[:limit + 1])
+    return [lookup.resultat(obj) for obj in rows[:limit]], len(rows) > limit
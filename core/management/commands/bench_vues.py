@@ -0,0 +1,219 @@
+import json
+import logging
+import platform
+import time
+import tracemalloc
+from datetime import datetime
+from pathlib import Path
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+from django.test import Client as TestClient
+from django.test.utils import override_settings, setup_databases, teardown_databases
+from django.urls import URLPattern, URLResolver, get_resolver
+
+from producteurs.models import Producteur, Parcelle, Recolte
+from transformation.models import Transformation
+from stock.models import Stock
+from vente.models import Client, Vente, Facture
+from core.metrics import QueryTimer
+from dashboard.widgets import WIDGETS
+
+# model used to pick an existing id for `<int:id>` routes, by URL name suffix
+ID_MODELS = {
+    'producteur': Producteur,
+    'parcelle': Parcelle,
+    'recolte': Recolte,
+    'transformation': Transformation,
+    'stock': Stock,
+    'client': Client,
+    'vente': Vente,
+    'facture': Facture,
+}
+
+# routes that modify data on GET, log the client out or never finish
+SKIPPED_PREFIXES = ('supprimer_', 'logout')
+SKIPPED_NAMES = {'dashboard_stream'}
+
+
+def _percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, round(pct / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def _walk(patterns, prefix=''):
+    for p in patterns:
+        if isinstance(p, URLResolver):
+            if getattr(p, 'app_name', None) == 'admin':
+                continue
+            yield from _walk(p.url_patterns, prefix + str(p.pattern))
+        elif isinstance(p, URLPattern) and p.name:
+            yield p.name, prefix + str(p.pattern), p
+
+
+class Command(BaseCommand):
+    help = (
+        "Mesure chaque vue de AB/urls.py via le client WSGI de test sur la base courante "
+        "(latence p50/p95/p99, nombre de requêtes SQL, pic mémoire), écrit le résultat en JSON "
+        "et échoue si une vue régresse par rapport à une baseline."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=20)
+        parser.add_argument('--output', default='bench_vues.json')
+        parser.add_argument('--baseline', help="Fichier JSON de référence à comparer")
+        parser.add_argument('--save-baseline', action='store_true',
+                            help="Écrit aussi le résultat dans le fichier --baseline")
+        parser.add_argument('--only', nargs='*', default=None, help="Noms d'URL à mesurer")
+        parser.add_argument('--tolerance', type=float, default=0.25,
+                            help="Hausse relative de p95 / mémoire tolérée (0.25 = +25%%)")
+        parser.add_argument('--min-delta-ms', type=float, default=5.0,
+                            help="Hausse absolue de p95 ignorée quelle que soit la tolérance")
+        parser.add_argument('--seed-producteurs', type=int,
+                            help="Mesure sur une base de test jetable (comme manage.py test), "
+                                 "remplie avec generer_donnees ; la base courante n'est pas touchée")
+        parser.add_argument('--seed-ventes', type=int, default=10000)
+
+    def handle(self, *args, **options):
+        if not options['seed_producteurs']:
+            return self._bench(options)
+        # never seed the configured database: a throwaway test database, dropped at the end
+        old_config = setup_databases(verbosity=0, interactive=False)
+        try:
+            call_command('generer_donnees', producteurs=options['seed_producteurs'],
+                         ventes=options['seed_ventes'], stdout=self.stdout)
+            self._bench(options)
+        finally:
+            teardown_databases(old_config, verbosity=0)
+            connections.close_all()
+
+    def _bench(self, options):
+        targets = self._targets(options['only'])
+        if not targets:
+            raise CommandError("Aucune vue à mesurer (base vide ?)")
+
+        results = {}
+        # failing views are reported through their status, not their tracebacks
+        request_logger = logging.getLogger('django.request')
+        previous_level = request_logger.level
+        request_logger.setLevel(logging.CRITICAL)
+        try:
+            self._run(targets, options, results)
+        finally:
+            request_logger.setLevel(previous_level)
+
+        report = {
+            'meta': {
+                'date': datetime.now().isoformat(timespec='seconds'),
+                'database': connection.vendor,
+                'test_database': bool(options['seed_producteurs']),
+                'python': platform.python_version(),
+                'iterations': options['iterations'],
+            },
+            'views': results,
+        }
+        Path(options['output']).write_text(json.dumps(report, indent=2))
+        self.stdout.write(f"Résultats écrits dans {options['output']}")
+
+        if options['baseline'] and options['save_baseline']:
+            Path(options['baseline']).write_text(json.dumps(report, indent=2))
+            self.stdout.write(f"Baseline mise à jour: {options['baseline']}")
+        elif options['baseline']:
+            self._compare(results, options)
+
+    def _run(self, targets, options, results):
+        with override_settings(ALLOWED_HOSTS=['*'], SECURE_SSL_REDIRECT=False):
+            client = TestClient(raise_request_exception=False)
+            for name, url in targets:
+                results[name] = self._measure(client, url, options['iterations'])
+                r = results[name]
+                self.stdout.write(
+                    f"{name:<32} {r['status']} p50 {r['p50_ms']:8.1f} p95 {r['p95_ms']:8.1f} "
+                    f"p99 {r['p99_ms']:8.1f} ms  {r['queries']:4d} req.  {r['peak_kb']:9.1f} Ko"
+                )
+
+    def _targets(self, only):
+        ids = {}
+        targets = []
+        for name, route, pattern in _walk(get_resolver().url_patterns):
+            if name in SKIPPED_NAMES or name.startswith(SKIPPED_PREFIXES):
+                continue
+            if only is not None and name not in only:
+                continue
+            converters = pattern.pattern.converters
+            if not converters:
+                targets.append((name, '/' + route))
+            elif name == 'dashboard_widget':
+                for widget in WIDGETS:
+                    targets.append((f"{name}:{widget}", '/' + route.replace('<slug:name>', widget)))
+            elif list(converters) == ['id']:
+                model = ID_MODELS.get(name.split('_', 1)[-1])
+                if model is None:
+                    continue
+                if model not in ids:
+                    ids[model] = model.objects.order_by('id').values_list('id', flat=True).first()
+                if ids[model] is None:
+                    self.stdout.write(f"{name:<32} ignorée (aucun {model.__name__})")
+                    continue
+                targets.append((name, '/' + route.replace('<int:id>', str(ids[model]))))
+        return targets
+
+    def _measure(self, client, url, iterations):
+        client.get(url)  # warm-up: template loading, caches, connection
+        timings = []
+        status = None
+        for _ in range(iterations):
+            t0 = time.perf_counter()
+            response = client.get(url)
+            timings.append((time.perf_counter() - t0) * 1000)
+            status = response.status_code
+
+        queries = QueryTimer()
+        with connection.execute_wrapper(queries):
+            client.get(url)
+        # tracemalloc slows everything down: measure memory in a separate pass
+        tracemalloc.start()
+        try:
+            client.get(url)
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+
+        timings.sort()
+        return {
+            'url': url,
+            'status': status,
+            'p50_ms': round(_percentile(timings, 50), 2),
+            'p95_ms': round(_percentile(timings, 95), 2),
+            'p99_ms': round(_percentile(timings, 99), 2),
+            'queries': queries.count,
+            'peak_kb': round(peak / 1024, 1),
+        }
+
+    def _compare(self, results, options):
+        path = Path(options['baseline'])
+        if not path.exists():
+            raise CommandError(f"Baseline introuvable: {path} (utilisez --save-baseline)")
+        baseline = json.loads(path.read_text()).get('views', {})
+        tolerance = options['tolerance']
+        regressions = []
+        for name, current in results.items():
+            ref = baseline.get(name)
+            if ref is None:
+                continue
+            if current['status'] != ref['status']:
+                regressions.append(f"{name}: statut {ref['status']} -> {current['status']}")
+            if current['queries'] > ref['queries']:
+                regressions.append(f"{name}: requêtes SQL {ref['queries']} -> {current['queries']}")
+            delta = current['p95_ms'] - ref['p95_ms']
+            if delta > options['min_delta_ms'] and current['p95_ms'] > ref['p95_ms'] * (1 + tolerance):
+                regressions.append(f"{name}: p95 {ref['p95_ms']} -> {current['p95_ms']} ms")
+            if current['peak_kb'] > ref['peak_kb'] * (1 + tolerance) + 64:
+                regressions.append(f"{name}: mémoire {ref['peak_kb']} -> {current['peak_kb']} Ko")
+
+        if regressions:
+            raise CommandError("Régressions détectées:\n  " + "\n  ".join(regressions))
+        self.stdout.write(self.style.SUCCESS("Aucune régression par rapport à la baseline."))
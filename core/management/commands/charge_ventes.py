@@ -0,0 +1,166 @@
+import threading
+import time
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, connection, transaction
+from django.db.models import Count, Sum
+
+from stock import services as stock_services
+from stock.models import Stock, StockMovement
+from vente.models import Client, Vente
+
+
+def _percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, round(pct / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+class Command(BaseCommand):
+    help = (
+        "Test de charge des ventes concurrentes : plusieurs threads (une connexion chacun) "
+        "vendent les mêmes stocks en même temps, puis les quantités finales sont comparées "
+        "aux ventes et aux mouvements enregistrés. Les stocks utilisés sont remis à leur "
+        "quantité d'origine et les ventes créées supprimées à la fin (sauf --garder). "
+        "À lancer sur une base de test."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=16)
+        parser.add_argument('--ventes', type=int, default=2000, help="Nombre total de ventes tentées")
+        parser.add_argument('--stocks', type=int, default=3, help="Nombre de stocks vendus (les plus disputés)")
+        parser.add_argument('--quantite', type=float, default=1.0, help="Quantité de chaque vente")
+        parser.add_argument('--initial', type=float,
+                            help="Quantité de départ de chaque stock (défaut : de quoi servir 80%% des ventes)")
+        parser.add_argument('--strict', action='store_true', help="Refuser les ventes sur stock insuffisant")
+        parser.add_argument('--naif', action='store_true',
+                            help="Ancien chemin lecture / soustraction / save(), pour comparaison")
+        parser.add_argument('--essais', type=int, default=5, help="Essais par vente sur une base verrouillée")
+        parser.add_argument('--garder', action='store_true', help="Garder les ventes et quantités finales")
+
+    def handle(self, *args, **options):
+        stocks = list(Stock.objects.order_by('pk')[:options['stocks']])
+        client = Client.objects.order_by('pk').first()
+        if not stocks or client is None:
+            raise CommandError("Il faut au moins un stock et un client (voir generer_donnees)")
+        total = options['ventes']
+        quantite = options['quantite']
+        initial = options['initial']
+        if initial is None:
+            initial = round(0.8 * total * quantite / len(stocks), 3)
+
+        origine = {s.pk: s.quantite_disponible for s in stocks}
+        debut_ventes = Vente.objects.order_by('-pk').values_list('pk', flat=True).first() or 0
+        debut_mouvements = StockMovement.objects.order_by('-pk').values_list('pk', flat=True).first() or 0
+        # through the ledger, like the sales: an ajustement movement, removed with them at the end
+        for s in stocks:
+            stock_services.fixer(s, initial, reason='AJUST', note='charge_ventes')
+
+        vendre = self._vendre_naif if options['naif'] else self._vendre
+        resultats = {'retire': {s.pk: 0.0 for s in stocks}, 'ok': 0, 'refus': 0, 'erreurs': 0, 'latences': []}
+        verrou = threading.Lock()
+        suivant = iter(range(total))
+
+        def travailleur():
+            try:
+                while True:
+                    with verrou:
+                        i = next(suivant, None)
+                    if i is None:
+                        return
+                    stock = Stock(pk=stocks[i % len(stocks)].pk, produit=stocks[i % len(stocks)].produit)
+                    t0 = time.perf_counter()
+                    issue, retire = self._essayer(vendre, client, stock, quantite, options)
+                    duree = time.perf_counter() - t0
+                    with verrou:
+                        resultats[issue] += 1
+                        resultats['latences'].append(duree)
+                        resultats['retire'][stock.pk] += retire
+            finally:
+                connection.close()
+
+        started = time.monotonic()
+        threads = [threading.Thread(target=travailleur) for _ in range(options['threads'])]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        elapsed = time.monotonic() - started
+
+        ok = self._verifier(stocks, initial, origine, resultats, debut_ventes, debut_mouvements, options)
+        latences = sorted(resultats['latences'])
+        self.stdout.write(
+            f"{resultats['ok']} vente(s), {resultats['refus']} refus (stock insuffisant), "
+            f"{resultats['erreurs']} erreur(s) en {elapsed:.2f} s : {resultats['ok'] / elapsed:.0f} ventes/s, "
+            f"latence p50 {1000 * _percentile(latences, 50):.1f} ms / p95 {1000 * _percentile(latences, 95):.1f} ms "
+            f"({options['threads']} threads, {len(stocks)} stock(s))"
+        )
+
+        if not options['garder']:
+            Vente.objects.filter(pk__gt=debut_ventes).delete()
+            StockMovement.objects.filter(pk__gt=debut_mouvements).delete()
+            for pk, quantite_origine in origine.items():
+                Stock.objects.filter(pk=pk).update(quantite_disponible=quantite_origine)
+        if not ok:
+            raise CommandError("Incohérences détectées (voir ci-dessus)")
+        self.stdout.write(self.style.SUCCESS("Aucune mise à jour perdue"))
+
+    def _essayer(self, vendre, client, stock, quantite, options):
+        for essai in range(options['essais']):
+            try:
+                return 'ok', vendre(client, stock, quantite, options['strict'])
+            except stock_services.StockInsuffisant:
+                return 'refus', 0.0
+            except OperationalError:
+                # SQLite: another writer held the database past the timeout
+                time.sleep(0.01 * (essai + 1))
+        return 'erreurs', 0.0
+
+    def _vendre(self, client, stock, quantite, strict):
+        _, retire = stock_services.enregistrer_vente(client, stock, quantite, 1, date.today(), strict=strict)
+        return retire
+
+    def _vendre_naif(self, client, stock, quantite, strict):
+        # the former views: read, subtract in Python, save the whole row
+        stock = Stock.objects.get(pk=stock.pk)
+        if strict and quantite > stock.quantite_disponible:
+            raise stock_services.StockInsuffisant(stock, quantite, stock.quantite_disponible)
+        with transaction.atomic():
+            vente = Vente.objects.create(client=client, stock=stock, quantite_vendue=quantite, prix_unitaire=1,
+                                         date_vente=date.today(), montant_total=quantite)
+        retire = min(quantite, stock.quantite_disponible)
+        stock.quantite_disponible -= retire
+        stock.save()
+        StockMovement.objects.create(stock=stock, vente=vente, change=-retire, reason='VENTE', note=f'Vente #{vente.id}')
+        return retire
+
+    def _verifier(self, stocks, initial, origine, resultats, debut_ventes, debut_mouvements, options):
+        ok = True
+        mouvements = dict(
+            StockMovement.objects.filter(pk__gt=debut_mouvements).values('stock').annotate(total=Sum('change'))
+            .values_list('stock', 'total')
+        )
+        for s in stocks:
+            final = Stock.objects.values_list('quantite_disponible', flat=True).get(pk=s.pk)
+            attendu = initial - resultats['retire'][s.pk]
+            trace = origine[s.pk] + (mouvements.get(s.pk) or 0)
+            self.stdout.write(
+                f"Stock #{s.pk} : final {final:g}, attendu {attendu:g} d'après les ventes, {trace:g} d'après les mouvements"
+            )
+            if abs(final - attendu) > 1e-6 or abs(final - trace) > 1e-6:
+                ok = False
+                self.stdout.write(self.style.ERROR(f"  écart de {abs(final - attendu):g} : sorties perdues"))
+            if options['strict'] and final < -1e-9:
+                ok = False
+                self.stdout.write(self.style.ERROR("  stock négatif en mode strict"))
+        ventes = Vente.objects.filter(pk__gt=debut_ventes)
+        sans_mouvement = ventes.annotate(n=Count('stockmovement')).exclude(n=1).count()
+        if ventes.count() != resultats['ok'] or sans_mouvement:
+            ok = False
+            self.stdout.write(self.style.ERROR(
+                f"{ventes.count()} vente(s) en base pour {resultats['ok']} réussie(s), "
+                f"{sans_mouvement} sans exactement un mouvement"
+            ))
+        return ok
@@ -0,0 +1,288 @@
+import random
+import time
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Max
+
+from producteurs.models import Producteur, Parcelle, Recolte
+from producteurs import compteurs, fruits, geo
+from transformation.models import Transformation, ETAPES_CHOICES
+from stock.models import Stock, StockMovement, UNITE_CHOICES
+from vente.models import Client, Vente, Facture, PAIEMENT_CHOICES, STATUT_CHOICES
+from dashboard import cache as dashboard_cache
+from dashboard import rollup
+from core import omnibox, tracabilite
+
+NOMS = ['Diallo', 'Barry', 'Bah', 'Camara', 'Sylla', 'Soumah', 'Keita', 'Conde', 'Toure', 'Kouyate']
+PRENOMS = ['Mamadou', 'Fatoumata', 'Ibrahima', 'Aissatou', 'Alpha', 'Mariama', 'Ousmane', 'Kadiatou', 'Sekou', 'Hawa']
+VILLES = ['Conakry', 'Kindia', 'Labe', 'Mamou', 'Kankan', 'Boke', 'Faranah', 'Nzerekore', 'Dalaba', 'Pita']
+# centre (lat, lon) de chaque ville : les parcelles sont semées à ~20 km autour
+COORDONNEES = {
+    'Conakry': (9.5092, -13.7122), 'Kindia': (10.0569, -12.8658), 'Labe': (11.3182, -12.2833),
+    'Mamou': (10.3755, -12.0915), 'Kankan': (10.3854, -9.3057), 'Boke': (10.9409, -14.2967),
+    'Faranah': (10.0404, -10.7434), 'Nzerekore': (7.7562, -8.8179), 'Dalaba': (10.6868, -12.2496),
+    'Pita': (11.0591, -12.3953),
+}
+FRUITS = ['Mangue', 'Ananas', 'Banane', 'Papaye', 'Orange', 'Avocat', 'Goyave', 'Citron']
+
+
+class Command(BaseCommand):
+    help = (
+        "Génère un jeu de données cohérent et reproductible sur tous les modèles "
+        "(Producteur → Parcelle → Recolte → Transformation → Stock → Vente → Facture/StockMovement) "
+        "avec des bulk_create par lots, pour les benchmarks à volume réaliste."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--producteurs', type=int, default=1000)
+        parser.add_argument('--parcelles-par-producteur', type=int, default=2)
+        parser.add_argument('--recoltes-par-parcelle', type=int, default=3)
+        parser.add_argument('--taux-transformation', type=float, default=0.5,
+                            help="Part des récoltes qui donnent un lot de transformation (et un stock)")
+        parser.add_argument('--clients', type=int, default=None, help="Par défaut: ventes / 20")
+        parser.add_argument('--ventes', type=int, default=10000)
+        parser.add_argument('--taux-facture', type=float, default=0.6)
+        parser.add_argument('--jours', type=int, default=730, help="Profondeur de l'historique généré")
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--batch-size', type=int, default=5000,
+                            help="Lignes par bulk_create ; chaque lot est une transaction")
+
+    def handle(self, *args, **options):
+        if options['producteurs'] < 1 or options['ventes'] < 0:
+            raise CommandError("--producteurs doit être >= 1 et --ventes >= 0")
+        self.rng = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+        self.today = date.today()
+        self.jours = max(options['jours'], 1)
+        started = time.monotonic()
+
+        producteur_ids = self._producteurs(options['producteurs'])
+        parcelles = self._parcelles(producteur_ids, options['parcelles_par_producteur'])
+        recoltes = self._recoltes(parcelles, options['recoltes_par_parcelle'])
+        stocks = self._transformations_et_stocks(recoltes, options['taux_transformation'])
+        if not stocks:
+            raise CommandError("Aucun stock généré : augmentez --producteurs ou --taux-transformation")
+        nb_clients = options['clients'] or max(options['ventes'] // 20, 1)
+        client_ids = self._clients(nb_clients)
+        self._ventes(options['ventes'], stocks, client_ids, options['taux_facture'])
+
+        # bulk_create bypasses signals: refresh the derived tables once at the end
+        self._log("Recalcul des tables dérivées")
+        rollup.rebuild(batch_size=self.batch_size)
+        compteurs.recalculer()
+        dashboard_cache.bump(*dashboard_cache.TRACKED_MODELS)
+        omnibox.reindexer(batch_size=self.batch_size)
+        tracabilite.reconstruire_tout(batch_size=self.batch_size)
+
+        self.stdout.write(self.style.SUCCESS(f"Terminé en {time.monotonic() - started:.1f} s"))
+
+    # ------------------------------------------------------------------ helpers
+
+    def _log(self, message):
+        self.stdout.write(message)
+        self.stdout.flush()
+
+    def _date(self):
+        return self.today - timedelta(days=self.rng.randrange(self.jours))
+
+    def _insert(self, model, objects):
+        """bulk_create `objects` (any iterable) in chunked transactions; return the created pks."""
+        pks = []
+        batch = []
+        total = 0
+        for obj in objects:
+            batch.append(obj)
+            if len(batch) >= self.batch_size:
+                pks.extend(self._flush(model, batch))
+                total += len(batch)
+                batch = []
+                self._log(f"  {model.__name__}: {total}")
+        if batch:
+            pks.extend(self._flush(model, batch))
+            total += len(batch)
+        self._log(f"{model.__name__}: {total} ligne(s)")
+        return pks
+
+    def _flush(self, model, batch):
+        with transaction.atomic():
+            created = model.objects.bulk_create(batch)
+        return [obj.pk for obj in created]
+
+    # ------------------------------------------------------------------ generators
+
+    def _producteurs(self, n):
+        # offset phone numbers past existing rows so the command can be rerun
+        offset = (Producteur.objects.aggregate(m=Max('id'))['m'] or 0) + 1
+        rng = self.rng
+        return self._insert(Producteur, (
+            Producteur(
+                nom=rng.choice(NOMS),
+                prenom=rng.choice(PRENOMS),
+                adresse=rng.choice(VILLES),
+                telephone=f"+224{600000000 + offset + i}",
+            )
+            for i in range(n)
+        ))
+
+    def _parcelles(self, producteur_ids, per_producteur):
+        rng = self.rng
+        owners = [pid for pid in producteur_ids for _ in range(rng.randint(1, max(per_producteur * 2 - 1, 1)))]
+        pks = self._insert(Parcelle, (
+            self._parcelle(i, owner)
+            for i, owner in enumerate(owners)
+        ))
+        return list(zip(pks, owners))
+
+    def _parcelle(self, i, owner):
+        rng = self.rng
+        ville = rng.choice(VILLES)
+        lat, lon = COORDONNEES[ville]
+        lat, lon = round(lat + rng.gauss(0, 0.2), 6), round(lon + rng.gauss(0, 0.2), 6)
+        return Parcelle(
+            nom=f"Parcelle {i + 1}",
+            superficie=round(rng.uniform(0.2, 15.0), 2),
+            adresse=ville,
+            producteur_id=owner,
+            latitude=lat,
+            longitude=lon,
+            # bulk_create skips Parcelle.save()
+            cellule=geo.cellule(lat, lon),
+        )
+
+    def _recoltes(self, parcelles, per_parcelle):
+        rng = self.rng
+        rows = [(pk, owner) for pk, owner in parcelles for _ in range(rng.randint(0, per_parcelle * 2))]
+        quantites = [round(rng.uniform(50, 5000), 1) for _ in rows]
+        fruit_ids = list(fruits.resoudre(FRUITS).values())
+        pks = self._insert(Recolte, (
+            Recolte(
+                fruit_id=rng.choice(fruit_ids),
+                quantite=quantites[i],
+                date_recolte=self._date(),
+                producteur_id=owner,
+                parcelle_id=parcelle,
+            )
+            for i, (parcelle, owner) in enumerate(rows)
+        ))
+        return list(zip(pks, quantites))
+
+    def _transformations_et_stocks(self, recoltes, taux):
+        rng = self.rng
+        etapes = [code for code, _ in ETAPES_CHOICES]
+        unites = [code for code, _ in UNITE_CHOICES]
+        chosen = [(pk, q) for pk, q in recoltes if rng.random() < taux]
+        finales = [round(q * rng.uniform(0.1, 0.3), 1) for _, q in chosen]
+
+        def transformations():
+            for i, (recolte, depart) in enumerate(chosen):
+                debut = self._date()
+                yield Transformation(
+                    code_lot=f"LOT-{recolte:07d}",
+                    recolte_id=recolte,
+                    etape=rng.choice(etapes),
+                    quantite_depart=depart,
+                    quantite_finale=finales[i],
+                    date_debut=debut,
+                    date_fin=debut + timedelta(days=rng.randint(1, 10)),
+                )
+
+        lot_ids = self._insert(Transformation, transformations())
+        stock_pks = self._insert(Stock, (
+            Stock(
+                lot_id=lot,
+                produit=f"{rng.choice(FRUITS)} séchée",
+                quantite_disponible=finales[i],
+                unite_mesure=rng.choice(unites),
+                date_mise_a_jour=self.today,
+            )
+            for i, lot in enumerate(lot_ids)
+        ))
+        # the ledger of each stock starts with its initial quantity (stock/registre.py)
+        self._insert(StockMovement, (
+            StockMovement(stock_id=pk, change=finales[i], reason='INITIAL', note='Stock initial')
+            for i, pk in enumerate(stock_pks)
+        ))
+        # stock_pk -> initial quantity, decremented as sales are generated
+        return dict(zip(stock_pks, finales))
+
+    def _clients(self, n):
+        offset = (Client.objects.aggregate(m=Max('id'))['m'] or 0) + 1
+        rng = self.rng
+        return self._insert(Client, (
+            Client(
+                nom=rng.choice(NOMS),
+                prenom=rng.choice(PRENOMS),
+                telephone=f"+224{700000000 + offset + i}",
+                adresse=rng.choice(VILLES),
+                email=f"client{offset + i}@seed.agrodata.local",
+            )
+            for i in range(n)
+        ))
+
+    def _ventes(self, n, stocks, client_ids, taux_facture):
+        """Sales, their stock movements and invoices, written chunk by chunk."""
+        rng = self.rng
+        stock_ids = list(stocks)
+        paiements = [code for code, _ in PAIEMENT_CHOICES]
+        statuts = [code for code, _ in STATUT_CHOICES]
+        numero = (Facture.objects.aggregate(m=Max('numero_facture'))['m'] or 0) + 1
+        remaining = n
+        done = 0
+        while remaining > 0:
+            size = min(self.batch_size, remaining)
+            ventes = []
+            for _ in range(size):
+                stock_id = rng.choice(stock_ids)
+                quantite = round(rng.uniform(1, 20), 1)
+                prix = round(rng.uniform(500, 25000), 2)
+                ventes.append(Vente(
+                    client_id=rng.choice(client_ids),
+                    stock_id=stock_id,
+                    quantite_vendue=quantite,
+                    prix_unitaire=prix,
+                    date_vente=self._date(),
+                    montant_total=round(quantite * prix, 2),
+                ))
+            with transaction.atomic():
+                created = Vente.objects.bulk_create(ventes)
+                movements = []
+                factures = []
+                for vente in created:
+                    available = stocks[vente.stock_id]
+                    deducted = min(vente.quantite_vendue, max(available, 0))
+                    stocks[vente.stock_id] = available - deducted
+                    movements.append(StockMovement(
+                        stock_id=vente.stock_id, vente_id=vente.pk, change=-deducted,
+                        reason='VENTE', note=f'Vente #{vente.pk}',
+                    ))
+                    if rng.random() < taux_facture:
+                        factures.append(Facture(
+                            vente_id=vente.pk,
+                            numero_facture=numero,
+                            date_emission=vente.date_vente,
+                            montant=vente.montant_total,
+                            mode_paiement=rng.choice(paiements),
+                            statut=rng.choice(statuts),
+                        ))
+                        numero += 1
+                StockMovement.objects.bulk_create(movements)
+                Facture.objects.bulk_create(factures)
+            remaining -= size
+            done += size
+            self._log(f"  Vente: {done}/{n}")
+        self._log(f"Vente: {done} ligne(s)")
+
+        # write back the stock levels left by the generated sales
+        self._log("Mise à jour des stocks")
+        batch = []
+        for stock_id, quantite in stocks.items():
+            batch.append(Stock(id=stock_id, quantite_disponible=round(quantite, 3)))
+            if len(batch) >= self.batch_size:
+                with transaction.atomic():
+                    Stock.objects.bulk_update(batch, ['quantite_disponible'])
+                batch = []
+        if batch:
+            with transaction.atomic():
+                Stock.objects.bulk_update(batch, ['quantite_disponible'])
@@ -0,0 +1,22 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from core import tracabilite
+
+
+class Command(BaseCommand):
+    help = (
+        "Reconstruit la table de traçabilité des lots (core.Lignee), "
+        "par exemple après un chargement de données qui n'envoie pas de signaux."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        with transaction.atomic():
+            total = tracabilite.reconstruire_tout(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"{total} chemin(s) reconstruit(s) en {time.monotonic() - started:.1f} s"))
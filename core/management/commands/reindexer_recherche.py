@@ -0,0 +1,26 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from core import omnibox
+
+
+class Command(BaseCommand):
+    help = (
+        "Reconstruit les documents de la recherche globale (core.SearchDocument), "
+        "par exemple après un chargement de données qui n'envoie pas de signaux."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('types', nargs='*', help=f"Types à réindexer (défaut: tous) : {', '.join(omnibox.TYPES)}")
+        parser.add_argument('--batch-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        unknown = set(options['types']) - set(omnibox.TYPES)
+        if unknown:
+            raise CommandError(f"Type(s) inconnu(s): {', '.join(sorted(unknown))}")
+        started = time.monotonic()
+        with transaction.atomic():
+            total = omnibox.reindexer(options['types'] or None, batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"{total} document(s) indexé(s) en {time.monotonic() - started:.1f} s"))
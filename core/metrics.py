@@ -0,0 +1,129 @@
+"""Métriques par vue exposées au format texte Prometheus.
+
+`MetricsMiddleware` (core/middleware.py) alimente, pour chaque nom de vue
+résolu, quatre histogrammes en mémoire : durée de la vue, durée SQL, nombre
+de requêtes SQL et taille de la réponse. `/metrics` les expose. Les valeurs
+sont propres à chaque processus (un worker gunicorn = une série).
+
+Les requêtes SQL sont comptées sur toutes les connexions, quel que soit
+leur thread : la requête HTTP en cours est portée par une ContextVar, que
+`sync_to_async` recopie dans ses threads (widgets du tableau de bord
+calculés en parallèle compris). Le temps SQL est alors une somme sur les
+threads et peut dépasser la durée totale.
+"""
+import contextvars
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+TIME_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+SIZE_BUCKETS = (1024, 10 * 1024, 100 * 1024, 1024 * 1024, 10 * 1024 * 1024)
+
+
+class QueryTimer:
+    """`connection.execute_wrapper` counting and timing SQL statements (from any thread)."""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self._lock = threading.Lock()
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - start
+            with self._lock:
+                self.duration += elapsed
+                self.count += 1
+
+
+# timer of the request being measured, inherited by the sync_to_async threads
+_current = contextvars.ContextVar('metrics_query_timer', default=None)
+
+
+def _execute(execute, sql, params, many, context):
+    timer = _current.get()
+    if timer is None:
+        return execute(sql, params, many, context)
+    return timer(execute, sql, params, many, context)
+
+
+def instrument(sender, connection, **kwargs):
+    """`connection_created` receiver: every connection reports to the current request's timer."""
+    if _execute not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_execute)
+
+
+@contextmanager
+def capture():
+    """Count the SQL statements run in this context, worker threads included."""
+    timer = QueryTimer()
+    token = _current.set(timer)
+    try:
+        yield timer
+    finally:
+        _current.reset(token)
+
+
+class Histogram:
+    """Cumulative histogram labelled by view name."""
+
+    def __init__(self, name, documentation, buckets):
+        self.name = name
+        self.documentation = documentation
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        # view -> [per-bucket counts..., +Inf count], sum
+        self._series = {}
+
+    def observe(self, view, value):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            counts, total = self._series.get(view, ([0] * (len(self.buckets) + 1), 0.0))
+            counts[index] += 1
+            self._series[view] = (counts, total + value)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = {view: (list(counts), total) for view, (counts, total) in self._series.items()}
+        for view in sorted(series):
+            counts, total = series[view]
+            label = _escape(view)
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{{view="{label}",le="{bound:g}"}} {cumulative}')
+            cumulative += counts[-1]
+            lines.append(f'{self.name}_bucket{{view="{label}",le="+Inf"}} {cumulative}')
+            lines.append(f'{self.name}_sum{{view="{label}"}} {total:g}')
+            lines.append(f'{self.name}_count{{view="{label}"}} {cumulative}')
+        return "\n".join(lines)
+
+
+def _escape(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+view_duration = Histogram('agrodata_view_duration_seconds', 'Durée totale de traitement de la requête.', TIME_BUCKETS)
+sql_duration = Histogram('agrodata_view_sql_duration_seconds', 'Temps passé dans les requêtes SQL.', TIME_BUCKETS)
+sql_queries = Histogram('agrodata_view_sql_queries', 'Nombre de requêtes SQL par requête HTTP.', QUERY_BUCKETS)
+response_size = Histogram('agrodata_view_response_bytes', 'Taille du corps de la réponse.', SIZE_BUCKETS)
+
+HISTOGRAMS = (view_duration, sql_duration, sql_queries, response_size)
+
+
+def record(view, duration, timer, size):
+    view_duration.observe(view, duration)
+    sql_duration.observe(view, timer.duration)
+    sql_queries.observe(view, timer.count)
+    if size is not None:
+        response_size.observe(view, size)
+
+
+def render():
+    return "\n".join(h.render() for h in HISTOGRAMS) + "\n"
@@ -0,0 +1,61 @@
+import random
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+
+from . import metrics
+
+
+class MetricsMiddleware:
+    """Record per-view SQL and timing metrics and add a `Server-Timing` header.
+
+    Only a fraction of requests (settings.METRICS_SAMPLE_RATE, 1.0 = all) is
+    instrumented; the others go straight through. Sync and async: under
+    ASGI the async views and the SSE stream are not adapted to a thread.
+    The queries of every thread serving the request are counted (see
+    core/metrics.py); the `Server-Timing` SQL time is their sum.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.sample_rate = getattr(settings, 'METRICS_SAMPLE_RATE', 1.0)
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def _sampled(self):
+        return self.sample_rate >= 1.0 or random.random() < self.sample_rate
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not self._sampled():
+            return self.get_response(request)
+
+        start = time.perf_counter()
+        with metrics.capture() as timer:
+            response = self.get_response(request)
+        return self._record(request, response, timer, time.perf_counter() - start)
+
+    async def __acall__(self, request):
+        if not self._sampled():
+            return await self.get_response(request)
+
+        start = time.perf_counter()
+        with metrics.capture() as timer:
+            response = await self.get_response(request)
+        return self._record(request, response, timer, time.perf_counter() - start)
+
+    def _record(self, request, response, timer, duration):
+        match = getattr(request, 'resolver_match', None)
+        view = match.view_name if match else 'unresolved'
+        size = None if response.streaming else len(response.content)
+        metrics.record(view, duration, timer, size)
+
+        response['Server-Timing'] = (
+            f'sql;dur={timer.duration * 1000:.1f};desc="{timer.count} queries", '
+            f'total;dur={duration * 1000:.1f}'
+        )
+        return response
@@ -0,0 +1,82 @@
+# Generated by Django 5.2.7 on 2026-10-18 19:32
+
+from django.db import migrations, models
+
+
+# Self-contained on purpose: historical models only, no application code
+# (core.omnibox may change, this migration must replay the same way).
+# Same documents as core.omnibox at the time: (titre, sous-titre, termes).
+DOCUMENTS = {
+    'producteur': ('producteurs', 'Producteur', ('nom', 'prenom', 'telephone', 'adresse'),
+                   lambda o: (f"{o['nom']} {o['prenom']}", f"{o['telephone']} · {o['adresse']}",
+                              [o['nom'], o['prenom'], o['telephone'], o['adresse']])),
+    'parcelle': ('producteurs', 'Parcelle', ('nom', 'superficie', 'adresse'),
+                 lambda o: (o['nom'], f"{o['superficie']:g} ha · {o['adresse']}", [o['nom'], o['adresse']])),
+    'recolte': ('producteurs', 'Recolte', ('fruit', 'quantite', 'date_recolte'),
+                lambda o: (o['nom_fruit'], f"{o['quantite']:g} · {o['date_recolte']}", [o['nom_fruit']])),
+    'transformation': ('transformation', 'Transformation', ('code_lot', 'etape', 'date_debut'),
+                       lambda o: (o['code_lot'], f"{o['etape']} · {o['date_debut']}", [o['code_lot'], o['etape']])),
+    'stock': ('stock', 'Stock', ('produit', 'quantite_disponible', 'unite_mesure'),
+              lambda o: (o['produit'], f"{o['quantite_disponible']:g} {o['unite_mesure']}", [o['produit']])),
+    'client': ('vente', 'Client', ('nom', 'prenom', 'telephone', 'email', 'adresse'),
+               lambda o: (f"{o['nom']} {o['prenom']}", f"{o['telephone']} · {o['email']}",
+                          [o['nom'], o['prenom'], o['telephone'], o['email'], o['adresse']])),
+    'vente': ('vente', 'Vente', ('date_vente', 'montant_total'),
+              lambda o: (f"Vente #{o['id']}", f"{o['date_vente']} · {o['montant_total']}", [f"vente #{o['id']}"])),
+    'facture': ('vente', 'Facture', ('numero_facture', 'montant', 'statut'),
+                lambda o: (f"Facture N° {o['numero_facture']}", f"{o['montant']} · {o['statut']}",
+                           [f"facture n° {o['numero_facture']}", str(o['numero_facture'])])),
+}
+
+
+def backfill(apps, schema_editor):
+    SearchDocument = apps.get_model('core', 'SearchDocument')
+    for type_, (app_label, model_name, fields, build) in DOCUMENTS.items():
+        model = apps.get_model(app_label, model_name)
+        values = {}
+        if type_ == 'recolte':
+            # free text at first, a table once producteurs is past 0005_fruit
+            fruit = model._meta.get_field('fruit')
+            values['nom_fruit'] = models.F('fruit__nom' if fruit.is_relation else 'fruit')
+            fields = tuple(f for f in fields if f != 'fruit')
+        batch = []
+        for o in model.objects.order_by('pk').values('id', *fields, **values).iterator(chunk_size=2000):
+            titre, sous_titre, termes = build(o)
+            batch.append(SearchDocument(
+                type=type_, objet_id=o['id'], titre=titre[:200], sous_titre=sous_titre[:200],
+                contenu=' '.join(str(t) for t in termes if t).lower(),
+            ))
+            if len(batch) >= 2000:
+                SearchDocument.objects.bulk_create(batch)
+                batch = []
+        SearchDocument.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('producteurs', '0002_alter_parcelle_adresse'),
+        ('stock', '0002_stockmovement'),
+        ('transformation', '0001_initial'),
+        ('vente', '0002_client_prenom'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchDocument',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('type', models.CharField(max_length=20)),
+                ('objet_id', models.BigIntegerField()),
+                ('titre', models.CharField(max_length=200)),
+                ('sous_titre', models.CharField(blank=True, max_length=200)),
+                ('contenu', models.TextField()),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('type', 'objet_id'), name='search_document_unique_objet')],
+            },
+        ),
+        migrations.RunPython(backfill, migrations.RunPython.noop),
+    ]
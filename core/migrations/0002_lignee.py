@@ -0,0 +1,59 @@
+# Generated by Django 5.2.7 on 2026-10-18 20:03
+
+from django.db import migrations, models
+
+
+def backfill(apps, schema_editor):
+    # historical models only, no application code: core.tracabilite may
+    # change, this migration must replay the same way. One row per path
+    # récolte -> lot -> stock -> vente -> facture (LEFT JOINs).
+    Lignee = apps.get_model('core', 'Lignee')
+    Transformation = apps.get_model('transformation', 'Transformation')
+    colonnes = (
+        'producteur_id', 'parcelle_id', 'recolte_id', 'transformation_id', 'code_lot',
+        'stock_id', 'vente_id', 'client_id', 'facture_id',
+    )
+    chemins = Transformation.objects.order_by().values_list(
+        'recolte__producteur_id', 'recolte__parcelle_id', 'recolte_id', 'id', 'code_lot',
+        'stock__id', 'stock__vente__id', 'stock__vente__client_id', 'stock__vente__facture__id',
+    )
+    batch = []
+    for row in chemins.iterator(chunk_size=2000):
+        batch.append(Lignee(**dict(zip(colonnes, row))))
+        if len(batch) >= 2000:
+            Lignee.objects.bulk_create(batch)
+            batch = []
+    Lignee.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0001_searchdocument'),
+        ('producteurs', '0007_parcelle_geo'),
+        ('stock', '0003_lookup_indexes'),
+        ('transformation', '0001_initial'),
+        ('vente', '0004_lookup_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Lignee',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('producteur_id', models.BigIntegerField()),
+                ('parcelle_id', models.BigIntegerField()),
+                ('recolte_id', models.BigIntegerField()),
+                ('transformation_id', models.BigIntegerField()),
+                ('code_lot', models.CharField(max_length=50)),
+                ('stock_id', models.BigIntegerField(null=True)),
+                ('vente_id', models.BigIntegerField(null=True)),
+                ('client_id', models.BigIntegerField(null=True)),
+                ('facture_id', models.BigIntegerField(null=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['code_lot'], name='lignee_code_lot'), models.Index(fields=['transformation_id'], name='lignee_transformation'), models.Index(fields=['recolte_id'], name='lignee_recolte'), models.Index(fields=['parcelle_id'], name='lignee_parcelle'), models.Index(fields=['producteur_id'], name='lignee_producteur'), models.Index(fields=['stock_id'], name='lignee_stock'), models.Index(fields=['vente_id'], name='lignee_vente'), models.Index(fields=['client_id'], name='lignee_client'), models.Index(fields=['facture_id'], name='lignee_facture')],
+            },
+        ),
+        migrations.RunPython(backfill, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.7 on 2026-10-18 20:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0002_lignee'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='lignee',
+            name='lignee_transformation',
+        ),
+        migrations.RemoveIndex(
+            model_name='lignee',
+            name='lignee_stock',
+        ),
+        migrations.AddIndex(
+            model_name='lignee',
+            index=models.Index(fields=['transformation_id', 'stock_id'], name='lignee_transformation_stock'),
+        ),
+        migrations.AddIndex(
+            model_name='lignee',
+            index=models.Index(fields=['stock_id', 'vente_id'], name='lignee_stock_vente'),
+        ),
+    ]
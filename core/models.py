@@ -1,3 +1,56 @@
 from django.db import models
 
-# Create your models here.
+#----------------------------Table SearchDocument---------------------------
+class SearchDocument(models.Model):
+    """Denormalized, searchable copy of one row of the main tables (see core/omnibox.py)."""
+    type = models.CharField(max_length=20)
+    objet_id = models.BigIntegerField()
+    titre = models.CharField(max_length=200)
+    sous_titre = models.CharField(max_length=200, blank=True)
+    # lower-cased text the omnibox matches against (trigram-indexed)
+    contenu = models.TextField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['type', 'objet_id'], name='search_document_unique_objet'),
+        ]
+
+    def __str__(self):
+        return f"{self.type} #{self.objet_id} {self.titre}"
+
+
+#----------------------------Table Lignee---------------------------
+class Lignee(models.Model):
+    """One path récolte → lot → stock → vente → facture, flattened (see core/tracabilite.py).
+
+    Plain ids, no foreign keys: the rows are rebuilt from the source tables
+    after each write, deletions included. The downstream ids are empty where
+    the path stops (a lot not stocked yet, a vente without facture...).
+    """
+    producteur_id = models.BigIntegerField()
+    parcelle_id = models.BigIntegerField()
+    recolte_id = models.BigIntegerField()
+    transformation_id = models.BigIntegerField()
+    code_lot = models.CharField(max_length=50)
+    stock_id = models.BigIntegerField(null=True)
+    vente_id = models.BigIntegerField(null=True)
+    client_id = models.BigIntegerField(null=True)
+    facture_id = models.BigIntegerField(null=True)
+
+    class Meta:
+        # every trace is a lookup on one of these; (parent, child) pairs also
+        # find a placeholder row or the first child in one probe
+        indexes = [
+            models.Index(fields=['code_lot'], name='lignee_code_lot'),
+            models.Index(fields=['transformation_id', 'stock_id'], name='lignee_transformation_stock'),
+            models.Index(fields=['recolte_id'], name='lignee_recolte'),
+            models.Index(fields=['parcelle_id'], name='lignee_parcelle'),
+            models.Index(fields=['producteur_id'], name='lignee_producteur'),
+            models.Index(fields=['stock_id', 'vente_id'], name='lignee_stock_vente'),
+            models.Index(fields=['vente_id'], name='lignee_vente'),
+            models.Index(fields=['client_id'], name='lignee_client'),
+            models.Index(fields=['facture_id'], name='lignee_facture'),
+        ]
+
+    def __str__(self):
+        return f"LOT {self.code_lot} : récolte {self.recolte_id} → vente {self.vente_id}"
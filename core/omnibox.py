@@ -0,0 +1,200 @@
+"""Recherche globale (« omnibox ») sur toutes les entités.
+
+Chaque ligne des tables principales a un `SearchDocument` (titre, sous-titre
+et texte de recherche). Les enregistrements / suppressions marquent les ids
+concernés ; au commit, ils sont réindexés par modèle en trois requêtes
+(relecture des lignes, suppression des anciens documents, bulk_create),
+même pour une suppression en cascade de milliers de lignes.
+
+`chercher(q)` interroge la seule table `core_searchdocument` via l'index
+trigramme de `core.search` et classe les résultats.
+"""
+import threading
+
+from django.apps import apps
+from django.db import transaction
+from django.db.models import Case, IntegerField, Value, When
+from django.db.models.functions import Length
+from django.db.models.signals import post_delete, post_save
+from django.urls import reverse
+
+from producteurs import fruits
+
+from . import search
+from .models import SearchDocument
+from .signals import bulk_changed
+
+
+def _producteur(o):
+    return f"{o.nom} {o.prenom}", f"{o.telephone} · {o.adresse}", [o.nom, o.prenom, o.telephone, o.adresse]
+
+
+def _parcelle(o):
+    return o.nom, f"{o.superficie:g} ha · {o.adresse}", [o.nom, o.adresse]
+
+
+def _recolte(o):
+    if hasattr(o, 'fruit_id'):
+        fruit = fruits.nom(o.fruit_id)
+    else:
+        fruit = o.fruit  # historical model of the 0001 backfill: free-text column
+    return fruit, f"{o.quantite:g} · {o.date_recolte}", [fruit]
+
+
+def _transformation(o):
+    return o.code_lot, f"{o.etape} · {o.date_debut}", [o.code_lot, o.etape]
+
+
+def _stock(o):
+    return o.produit, f"{o.quantite_disponible:g} {o.unite_mesure}", [o.produit]
+
+
+def _client(o):
+    return f"{o.nom} {o.prenom}", f"{o.telephone} · {o.email}", [o.nom, o.prenom, o.telephone, o.email, o.adresse]
+
+
+def _vente(o):
+    return f"Vente #{o.id}", f"{o.date_vente} · {o.montant_total}", [f"vente #{o.id}"]
+
+
+def _facture(o):
+    return f"Facture N° {o.numero_facture}", f"{o.montant} · {o.statut}", [f"facture n° {o.numero_facture}", str(o.numero_facture)]
+
+
+# type -> (model label, label affiché, route details_*, document builder)
+TYPES = {
+    'producteur': ('producteurs.Producteur', 'Producteur', 'details_producteur', _producteur),
+    'parcelle': ('producteurs.Parcelle', 'Parcelle', 'details_parcelle', _parcelle),
+    'recolte': ('producteurs.Recolte', 'Récolte', 'details_recolte', _recolte),
+    'transformation': ('transformation.Transformation', 'Transformation', 'details_transformation', _transformation),
+    'stock': ('stock.Stock', 'Stock', 'details_stock', _stock),
+    'client': ('vente.Client', 'Client', 'details_client', _client),
+    'vente': ('vente.Vente', 'Vente', 'details_vente', _vente),
+    'facture': ('vente.Facture', 'Facture', 'details_facture', _facture),
+}
+_TYPE_BY_LABEL = {label: type_ for type_, (label, *_) in TYPES.items()}
+
+
+def _document(type_, obj, document=SearchDocument):
+    titre, sous_titre, termes = TYPES[type_][3](obj)
+    return document(
+        type=type_, objet_id=obj.pk, titre=titre[:200], sous_titre=sous_titre[:200],
+        contenu=' '.join(str(t) for t in termes if t).lower(),
+    )
+
+
+def indexer(type_, ids):
+    """Rebuild the documents of the given ids: rows that no longer exist lose theirs."""
+    ids = list(ids)
+    model = apps.get_model(TYPES[type_][0])
+    documents = [_document(type_, obj) for obj in model.objects.filter(pk__in=ids)]
+    SearchDocument.objects.filter(type=type_, objet_id__in=ids).exclude(
+        objet_id__in=[d.objet_id for d in documents],
+    ).delete()
+    # upsert: two commits flushing the same row at once must not collide
+    SearchDocument.objects.bulk_create(
+        documents, update_conflicts=True,
+        unique_fields=['type', 'objet_id'], update_fields=['titre', 'sous_titre', 'contenu'],
+    )
+
+
+def reindexer(types=None, batch_size=2000, get_model=apps.get_model):
+    """Rebuild every document of `types` (all by default), batch by batch.
+
+    `get_model` lets a data migration pass its historical models.
+    """
+    document = get_model('core.SearchDocument')
+    total = 0
+    for type_ in types or TYPES:
+        model = get_model(TYPES[type_][0])
+        document.objects.filter(type=type_).delete()
+        batch = []
+        for obj in model.objects.order_by('pk').iterator(chunk_size=batch_size):
+            batch.append(_document(type_, obj, document))
+            if len(batch) >= batch_size:
+                document.objects.bulk_create(batch)
+                total += len(batch)
+                batch = []
+        document.objects.bulk_create(batch)
+        total += len(batch)
+    return total
+
+
+#---------------------------- Mise à jour au commit ---------------------------
+
+# type -> ids changed in the current thread's transaction
+_pending = threading.local()
+
+
+def _flush():
+    pending = getattr(_pending, 'ids', None)
+    if not pending:
+        return
+    _pending.ids = {}
+    # one commit for all the documents of the transaction
+    with transaction.atomic():
+        for type_, ids in pending.items():
+            indexer(type_, ids)
+
+
+def _mark(type_, ids):
+    if not hasattr(_pending, 'ids'):
+        _pending.ids = {}
+    _pending.ids.setdefault(type_, set()).update(ids)
+    # after a rollback the leftover ids are reindexed with the next commit,
+    # which reads the rows as they are: harmless
+    transaction.on_commit(_flush)
+
+
+def _changed(sender, instance, raw=False, **kwargs):
+    if not raw:
+        _mark(_TYPE_BY_LABEL[sender._meta.label], [instance.pk])
+
+
+def _bulk_changed(sender, instances, **kwargs):
+    ids = [obj.pk for obj in instances if obj.pk is not None]
+    if ids:
+        _mark(_TYPE_BY_LABEL[sender._meta.label], ids)
+
+
+def connect():
+    for type_, (label, *_) in TYPES.items():
+        model = apps.get_model(label)
+        post_save.connect(_changed, sender=model, dispatch_uid=f'omnibox_save_{type_}')
+        post_delete.connect(_changed, sender=model, dispatch_uid=f'omnibox_delete_{type_}')
+        bulk_changed.connect(_bulk_changed, sender=model, dispatch_uid=f'omnibox_bulk_{type_}')
+
+
+#---------------------------- Recherche ---------------------------
+
+def chercher(q, types=None, limit=20):
+    """Ranked documents matching `q`, as dicts ready for JSON."""
+    q = (q or '').strip().lower()
+    if not q:
+        return []
+    qs = search.filtrer(SearchDocument.objects.all(), q, ('contenu',))
+    if types:
+        qs = qs.filter(type__in=types)
+    # exact title, then title prefix, then title contains, then other fields;
+    # shorter titles first inside a group
+    qs = qs.annotate(
+        _rang=Case(
+            When(titre__iexact=q, then=Value(0)),
+            When(titre__istartswith=q, then=Value(1)),
+            When(titre__icontains=q, then=Value(2)),
+            default=Value(3),
+            output_field=IntegerField(),
+        ),
+        _longueur=Length('titre'),
+    ).order_by('_rang', '_longueur', 'type', 'objet_id')
+    return [
+        {
+            'type': doc.type,
+            'type_label': TYPES[doc.type][1],
+            'id': doc.objet_id,
+            'titre': doc.titre,
+            'sous_titre': doc.sous_titre,
+            'url': reverse(TYPES[doc.type][2], args=[doc.objet_id]),
+        }
+        for doc in qs[:limit]
+    ]
@@ -0,0 +1,137 @@
+"""Pagination par curseur (keyset) pour les grandes listes.
+
+`Paginator` fait un `COUNT(*)` puis un `OFFSET` : la page 5000 lit toutes
+les lignes qui la précèdent. Ici la page est définie par la clé de tri de
+sa première / dernière ligne (`(nom, prenom, id)`, `(date, id)`, ...) :
+chaque page est une lecture d'index bornée par un `WHERE` sur cette clé et
+un `LIMIT`, au même coût quelle que soit sa profondeur. La clé doit se
+terminer par un champ unique (l'id) pour être totale.
+
+Les curseurs sont des jetons signés et opaques : un jeton invalide ou
+falsifié ramène simplement à la première page.
+"""
+import json
+
+from django.core import signing
+from django.db import connections
+from django.db.models import Q
+
+SALT = 'core.pagination'
+
+
+class KeysetPage:
+    def __init__(self, object_list, has_next, has_previous, next_cursor, previous_cursor):
+        self.object_list = object_list
+        self.has_next = has_next
+        self.has_previous = has_previous
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    @property
+    def has_other_pages(self):
+        return self.has_next or self.has_previous
+
+
+class KeysetPaginator:
+    """Paginate `queryset` along `ordering` (field names, '-' for descending)."""
+
+    def __init__(self, queryset, ordering, per_page=12):
+        self.queryset = queryset
+        self.ordering = tuple(ordering)
+        self.fields = [name.lstrip('-') for name in self.ordering]
+        self.descending = [name.startswith('-') for name in self.ordering]
+        self.per_page = per_page
+
+    # ------------------------------------------------------------------ cursors
+
+    def _encode(self, obj, direction):
+        key = [self._field(name).value_to_string(obj) for name in self.fields]
+        return signing.dumps({'k': key, 'd': direction, 'o': self.ordering}, salt=SALT, compress=True)
+
+    def _decode(self, cursor):
+        try:
+            data = signing.loads(cursor, salt=SALT)
+            key = data['k']
+            # a cursor of another sort order (the user changed it) restarts
+            if tuple(data.get('o', ())) != self.ordering or data['d'] not in ('n', 'p'):
+                return None, None
+            return [self._field(name).to_python(value) for name, value in zip(self.fields, key)], data['d']
+        except (signing.BadSignature, KeyError, TypeError, ValueError, json.JSONDecodeError):
+            return None, None
+
+    def _field(self, name):
+        return self.queryset.model._meta.get_field(name)
+
+    # ------------------------------------------------------------------ query
+
+    def _after(self, key, reverse):
+        """Rows strictly after `key` in the ordering (before it when `reverse`)."""
+        condition = None
+        # build from the last column: a > x OR (a = x AND (b > y OR (b = y AND ...)))
+        for name, desc, value in reversed(list(zip(self.fields, self.descending, key))):
+            lookup = 'lt' if desc != reverse else 'gt'
+            strict = Q(**{f'{name}__{lookup}': value})
+            condition = strict if condition is None else strict | (Q(**{name: value}) & condition)
+        # leading-column bound first so the index range scan starts at the key
+        first, desc = self.fields[0], self.descending[0]
+        bound = Q(**{f"{first}__{'lte' if desc != reverse else 'gte'}": key[0]})
+        return bound & condition
+
+    def page(self, cursor=None):
+        key, direction = self._decode(cursor) if cursor else (None, None)
+        backwards = direction == 'p'
+        if backwards:
+            order = [name[1:] if name.startswith('-') else f'-{name}' for name in self.ordering]
+        else:
+            order = list(self.ordering)
+        qs = self.queryset.order_by(*order)
+        if key is not None:
+            qs = qs.filter(self._after(key, backwards))
+        rows = list(qs[:self.per_page + 1])
+        more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        if backwards:
+            rows.reverse()
+            has_previous, has_next = more, True
+        else:
+            has_previous, has_next = key is not None, more
+        return KeysetPage(
+            rows,
+            has_next=has_next and bool(rows),
+            has_previous=has_previous and bool(rows),
+            next_cursor=self._encode(rows[-1], 'n') if rows and has_next else None,
+            previous_cursor=self._encode(rows[0], 'p') if rows and has_previous else None,
+        )
+
+
+def approximate_count(queryset, exact_up_to=10000):
+    """Row count estimate: the planner's estimate on PostgreSQL, else a capped COUNT.
+
+    Returns (count, exact). On other databases the count stops at
+    `exact_up_to` (then `exact` is False and the count is a lower bound).
+    """
+    connection = connections[queryset.db]
+    if connection.vendor == 'postgresql':
+        sql, params = queryset.order_by().query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute(f"EXPLAIN (FORMAT JSON) {sql}", params)
+            plan = cursor.fetchone()[0]
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        return int(plan[0]['Plan']['Plan Rows']), False
+    count = queryset.order_by()[:exact_up_to + 1].count()
+    return min(count, exact_up_to), count <= exact_up_to
+
+
+def query_string(request, *exclude):
+    """The current GET parameters minus `exclude`, for building page links."""
+    params = request.GET.copy()
+    for key in exclude:
+        params.pop(key, None)
+    return params.urlencode()
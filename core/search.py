@@ -0,0 +1,140 @@
+"""Recherche « contient » indexée (trigrammes) pour les listes.
+
+`filtrer(queryset, q, champs)` a le même sens qu'un OU de `icontains` sur les
+champs, mais s'appuie sur un index trigramme quand il existe :
+
+- PostgreSQL : index GIN `gin_trgm_ops` (extension pg_trgm) sur
+  `UPPER(col::text)`, l'expression exacte générée par `icontains` ; le
+  filtre reste un `icontains` et le planificateur utilise l'index.
+- SQLite : table virtuelle FTS5 `tokenize='trigram'` à contenu externe,
+  tenue à jour par des triggers (donc aussi par les bulk_create / update()
+  et les imports), interrogée par `MATCH`.
+
+Les index sont (ré)installés à chaque `migrate` (signal post_migrate) : sur
+SQLite, une migration qui reconstruit la table supprime ses triggers.
+Les recherches de moins de 3 caractères ne peuvent pas utiliser de trigramme
+et retombent sur `icontains`.
+"""
+import logging
+
+from django.apps import apps
+from django.db import DatabaseError, connections
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+
+logger = logging.getLogger(__name__)
+
+# model label -> searchable columns
+INDEXES = {
+    'producteurs.Producteur': ('nom', 'prenom', 'adresse', 'telephone'),
+    'producteurs.Parcelle': ('nom', 'adresse'),
+    'stock.Stock': ('produit',),
+    'vente.Client': ('nom', 'prenom', 'telephone', 'email'),
+    'core.SearchDocument': ('contenu',),
+}
+
+MIN_LENGTH = 3
+
+# (alias, table) -> FTS5 table available
+_fts_tables = {}
+
+
+def _fts_name(table):
+    return f"{table}_fts"
+
+
+def _fts_available(connection, table):
+    key = (connection.alias, table)
+    if key not in _fts_tables:
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = %s", [_fts_name(table)])
+            _fts_tables[key] = cursor.fetchone() is not None
+    return _fts_tables[key]
+
+
+def filtrer(queryset, q, champs):
+    """Keep the rows of `queryset` where one of `champs` contains `q` (case-insensitive)."""
+    q = (q or '').strip()
+    if not q:
+        return queryset
+    model = queryset.model
+    colonnes = INDEXES.get(model._meta.label, ())
+    connection = connections[queryset.db]
+    if (
+        connection.vendor == 'sqlite'
+        and len(q) >= MIN_LENGTH
+        and colonnes and set(champs) <= set(colonnes)
+        and _fts_available(connection, model._meta.db_table)
+    ):
+        fts = _fts_name(model._meta.db_table)
+        # column filter + phrase: the rows whose columns contain q
+        expression = '{%s} : "%s"' % (' '.join(champs), q.replace('"', '""'))
+        return queryset.filter(pk__in=RawSQL(f'SELECT rowid FROM "{fts}" WHERE "{fts}" MATCH %s', [expression]))
+
+    condition = Q()
+    for champ in champs:
+        condition |= Q(**{f"{champ}__icontains": q})
+    return queryset.filter(condition)
+
+
+#---------------------------- Installation des index ---------------------------
+
+def _install_postgresql(cursor, table, colonnes):
+    cursor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    for col in colonnes:
+        cursor.execute(
+            f'CREATE INDEX IF NOT EXISTS "{table}_{col}_trgm" ON "{table}" '
+            f'USING gin ((UPPER("{col}"::text)) gin_trgm_ops)'
+        )
+
+
+def _install_sqlite(cursor, table, colonnes):
+    fts = _fts_name(table)
+    cols = ', '.join(f'"{c}"' for c in colonnes)
+    new = ', '.join(f'new."{c}"' for c in colonnes)
+    old = ', '.join(f'old."{c}"' for c in colonnes)
+
+    cursor.execute("SELECT name FROM sqlite_master WHERE name IN (%s, %s)", [fts, f"{fts}_ai"])
+    existing = {row[0] for row in cursor.fetchall()}
+    if existing == {fts, f"{fts}_ai"}:
+        return
+    # missing table, or triggers dropped by a table rebuild: recreate and reindex
+    cursor.execute(
+        f'CREATE VIRTUAL TABLE IF NOT EXISTS "{fts}" USING fts5({cols}, '
+        f"content='{table}', content_rowid='id', tokenize='trigram')"
+    )
+    cursor.execute(f'DROP TRIGGER IF EXISTS "{fts}_ai"')
+    cursor.execute(f'DROP TRIGGER IF EXISTS "{fts}_ad"')
+    cursor.execute(f'DROP TRIGGER IF EXISTS "{fts}_au"')
+    cursor.execute(
+        f'CREATE TRIGGER "{fts}_ai" AFTER INSERT ON "{table}" BEGIN '
+        f'INSERT INTO "{fts}"(rowid, {cols}) VALUES (new.id, {new}); END'
+    )
+    cursor.execute(
+        f'CREATE TRIGGER "{fts}_ad" AFTER DELETE ON "{table}" BEGIN '
+        f'INSERT INTO "{fts}"("{fts}", rowid, {cols}) VALUES (\'delete\', old.id, {old}); END'
+    )
+    cursor.execute(
+        f'CREATE TRIGGER "{fts}_au" AFTER UPDATE ON "{table}" BEGIN '
+        f'INSERT INTO "{fts}"("{fts}", rowid, {cols}) VALUES (\'delete\', old.id, {old}); '
+        f'INSERT INTO "{fts}"(rowid, {cols}) VALUES (new.id, {new}); END'
+    )
+    cursor.execute(f'INSERT INTO "{fts}"("{fts}") VALUES (\'rebuild\')')
+
+
+def installer(using='default', **kwargs):
+    """Create the trigram indexes that are missing (idempotent); post_migrate receiver."""
+    connection = connections[using]
+    install = {'postgresql': _install_postgresql, 'sqlite': _install_sqlite}.get(connection.vendor)
+    if install is None:
+        return
+    for label, colonnes in INDEXES.items():
+        table = apps.get_model(label)._meta.db_table
+        try:
+            with connection.cursor() as cursor:
+                install(cursor, table, colonnes)
+        except DatabaseError as e:
+            # e.g. no pg_trgm privileges, or SQLite built without FTS5 trigram:
+            # the search still works through icontains
+            logger.warning("Index de recherche non installé pour %s : %s", label, e)
+        _fts_tables.pop((connection.alias, table), None)
@@ -0,0 +1,7 @@
+from django.dispatch import Signal
+
+# Sent by write paths that use bulk_create / bulk_update / queryset.delete(),
+# which bypass the per-instance post_save / post_delete signals.
+# Arguments: sender (model class), instances (list, possibly empty),
+# action ('create', 'update' or 'delete').
+bulk_changed = Signal()
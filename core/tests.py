@@ -1,3 +1,486 @@
-from django.test import TestCase
+import asyncio
+import json
+import re
+import tempfile
+from collections import Counter
+from datetime import date
+from io import StringIO
+from pathlib import Path
+from unittest import mock
 
-# Create your tests here.
+from django.core.management import CommandError, call_command
+from django.db.models import Q, Sum
+from asgiref.sync import iscoroutinefunction
+from django.db import connection
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils.datastructures import MultiValueDict
+
+from dashboard.models import VenteJournaliere
+from dashboard.widgets import WIDGETS
+from producteurs import compteurs
+from producteurs import services as producteur_services
+from producteurs.models import Fruit, Parcelle, Producteur, Recolte
+from stock import registre
+from stock import services as stock_services
+from stock.models import Stock
+from transformation.models import Transformation
+from vente.models import Client, Facture, Vente
+
+from . import metrics, omnibox, search, tracabilite
+from .middleware import MetricsMiddleware
+from .models import Lignee, SearchDocument
+
+
+#------ Traçabilité : table Lignee ------
+
+class LigneeTests(TestCase):
+
+    def setUp(self):
+        self.producteur = Producteur.objects.create(nom='Camara', prenom='Alpha', adresse='Kindia', telephone='622000001')
+        self.parcelles = [
+            Parcelle.objects.create(nom=f'P{i}', superficie=1, adresse='Kindia', producteur=self.producteur)
+            for i in range(2)
+        ]
+        self.fruit = Fruit.objects.create(nom='Mangue')
+        self.clients = [
+            Client.objects.create(nom='Diallo', prenom='Fatou', adresse='Conakry',
+                                  telephone=f'62400000{i}', email=f'client{i}@example.com')
+            for i in range(2)
+        ]
+
+    def _ecrire(self, fonction, *args, **kwargs):
+        # the rows are rebuilt at commit
+        with self.captureOnCommitCallbacks(execute=True):
+            return fonction(*args, **kwargs)
+
+    def assertCoherente(self):
+        lignes = Counter(Lignee.objects.values_list(*tracabilite.COLONNES))
+        tracabilite.reconstruire_tout()
+        self.assertEqual(lignes, Counter(Lignee.objects.values_list(*tracabilite.COLONNES)))
+
+    def _recolte(self, parcelle):
+        return self._ecrire(Recolte.objects.create, fruit=self.fruit, quantite=100, date_recolte=date(2026, 6, 1),
+                            producteur=self.producteur, parcelle=parcelle)
+
+    def _lot(self, recolte, code):
+        return self._ecrire(Transformation.objects.create, code_lot=code, recolte=recolte, etape='CONDITIONNEMENT',
+                            quantite_depart=100, quantite_finale=80,
+                            date_debut=date(2026, 6, 2), date_fin=date(2026, 6, 3))
+
+    def _stock(self, lot):
+        return self._ecrire(Stock.objects.create, lot=lot, produit='Mangue séchée', quantite_disponible=80,
+                            unite_mesure='KG', date_mise_a_jour=date(2026, 6, 3))
+
+    def _vente(self, stock, client):
+        return self._ecrire(Vente.objects.create, client=client, stock=stock, quantite_vendue=2, prix_unitaire=10,
+                            date_vente=date(2026, 6, 4), montant_total=20)
+
+    def _sauver(self, obj, **champs):
+        for nom, valeur in champs.items():
+            setattr(obj, nom, valeur)
+        self._ecrire(obj.save)
+
+    def test_chemins_apres_ecritures(self):
+        recoltes = [self._recolte(p) for p in self.parcelles]
+        lots = [self._lot(recoltes[0], 'LOT-A'), self._lot(recoltes[1], 'LOT-B')]
+        self.assertCoherente()
+        stocks = [self._stock(lots[0]), self._stock(lots[0])]
+        ventes = [self._vente(stocks[0], self.clients[0]), self._vente(stocks[0], self.clients[1])]
+        facture = self._ecrire(Facture.objects.create, vente=ventes[0], numero_facture=1, date_emission=date(2026, 6, 4),
+                               montant=20, mode_paiement='OM', statut='PAYER')
+        self.assertCoherente()
+        self.assertEqual(Lignee.objects.filter(transformation_id=lots[0].id).count(), 3)
+
+        # changes of link, at every level
+        self._sauver(ventes[1], stock=stocks[1])
+        self.assertCoherente()
+        self._sauver(ventes[0], client=self.clients[1])
+        self.assertCoherente()
+        self._sauver(stocks[0], lot=lots[1])
+        self.assertCoherente()
+        self._sauver(lots[1], code_lot='LOT-B2', recolte=recoltes[0])
+        self.assertCoherente()
+        self._sauver(recoltes[0], parcelle=self.parcelles[1])
+        self.assertCoherente()
+        self.assertEqual(Lignee.objects.get(facture_id=facture.id).parcelle_id, self.parcelles[1].id)
+
+        # other fields: no rewrite, still coherent
+        self._sauver(ventes[0], quantite_vendue=3)
+        self.assertCoherente()
+
+        # deletions, down to the placeholder rows
+        self._ecrire(facture.delete)
+        self.assertCoherente()
+        self._ecrire(ventes[1].delete)
+        self.assertCoherente()
+        self.assertTrue(Lignee.objects.filter(stock_id=stocks[1].id, vente_id__isnull=True).exists())
+        self._ecrire(stocks[1].delete)
+        self.assertCoherente()
+        self._ecrire(self.producteur.delete)
+        self.assertCoherente()
+        self.assertFalse(Lignee.objects.exists())
+
+    def test_traces(self):
+        recolte = self._recolte(self.parcelles[0])
+        lot = self._lot(recolte, 'LOT-A')
+        stock = self._stock(lot)
+        vente = self._vente(stock, self.clients[0])
+        aval = tracabilite.aval('code_lot', 'LOT-A')
+        self.assertEqual(aval['ventes'], [vente.id])
+        self.assertEqual([c['id'] for c in aval['clients']], [self.clients[0].id])
+        amont = tracabilite.amont('vente_id', vente.id)
+        self.assertEqual(amont['recoltes'], [recolte.id])
+        self.assertEqual([p['id'] for p in amont['producteurs']], [self.producteur.id])
+
+    def test_vues_parametres(self):
+        vente = self._vente(self._stock(self._lot(self._recolte(self.parcelles[0]), 'LOT-A')), self.clients[0])
+        response = self.client.get(reverse('trace_amont'), {'vente': vente.id})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['vente'], str(vente.id))
+        self.assertEqual(self.client.get(reverse('trace_aval'), {'lot': 'LOT-A'}).json()['ventes'], [vente.id])
+        for valeur in ('abc', '1.5', '²'):
+            with self.subTest(vente=valeur):
+                response = self.client.get(reverse('trace_amont'), {'vente': valeur})
+                self.assertEqual(response.status_code, 400)
+                self.assertIn('error', response.json())
+        self.assertEqual(self.client.get(reverse('trace_amont')).status_code, 400)
+
+
+#------ Générateur de données synthétiques ------
+
+class GenererDonneesTests(TestCase):
+
+    def _generer(self, **options):
+        call_command('generer_donnees', stdout=StringIO(), batch_size=7, **options)
+
+    def test_volumes_demandes(self):
+        self._generer(producteurs=6, parcelles_par_producteur=2, recoltes_par_parcelle=2,
+                      taux_transformation=1.0, clients=4, ventes=50, taux_facture=0.5, seed=3)
+        self.assertEqual(Producteur.objects.count(), 6)
+        self.assertEqual(Client.objects.count(), 4)
+        self.assertEqual(Vente.objects.count(), 50)
+        # per-producteur / per-parcelle counts are averages, at least one parcelle each
+        self.assertFalse(Producteur.objects.filter(parcelle__isnull=True).exists())
+        self.assertLessEqual(Parcelle.objects.count(), 6 * 3)
+        self.assertEqual(Transformation.objects.count(), Recolte.objects.count())
+        self.assertEqual(Stock.objects.count(), Recolte.objects.count())
+        self.assertLessEqual(Facture.objects.count(), 50)
+
+        # the derived tables are rebuilt at the end
+        self.assertFalse(compteurs.incoherents().exists())
+        self.assertEqual(VenteJournaliere.objects.aggregate(n=Sum('nombre_ventes'))['n'], 50)
+        self.assertFalse(registre.ecarts().exists())
+        self.assertFalse(Stock.objects.filter(quantite_disponible__lt=0).exists())
+        self.assertEqual(Lignee.objects.filter(vente_id__isnull=False).count(), 50)
+
+    def test_relance_ajoute(self):
+        # phone numbers and e-mails continue after the existing rows
+        self._generer(producteurs=3, clients=2, ventes=5, taux_transformation=1.0)
+        self._generer(producteurs=3, clients=2, ventes=5, taux_transformation=1.0)
+        self.assertEqual(Producteur.objects.count(), 6)
+        self.assertEqual(Vente.objects.count(), 10)
+
+
+#------ Banc de mesure des vues ------
+
+class BenchVuesTests(TestCase):
+
+    def setUp(self):
+        dossier = tempfile.TemporaryDirectory()
+        self.addCleanup(dossier.cleanup)
+        self.sortie = Path(dossier.name) / 'bench.json'
+        self.baseline = Path(dossier.name) / 'baseline.json'
+        call_command('generer_donnees', producteurs=3, clients=2, ventes=5, taux_transformation=1.0,
+                     stdout=StringIO())
+
+    def _bench(self, only=('liste_producteurs', 'details_producteur', 'dashboard_widget'), **options):
+        call_command('bench_vues', iterations=2, output=str(self.sortie), stdout=StringIO(), only=list(only), **options)
+        return json.loads(self.sortie.read_text())
+
+    def test_rapport(self):
+        rapport = self._bench()
+        # one entry per dashboard widget
+        self.assertEqual(set(rapport['views']), {'liste_producteurs', 'details_producteur'}
+                         | {f'dashboard_widget:{name}' for name in WIDGETS})
+        self.assertFalse(rapport['meta']['test_database'])
+        for name, vue in rapport['views'].items():
+            with self.subTest(vue=name):
+                self.assertEqual(vue['status'], 200)
+                self.assertGreater(vue['queries'], 0)
+                self.assertLessEqual(vue['p50_ms'], vue['p99_ms'])
+        self.assertRegex(rapport['views']['details_producteur']['url'], r'^/producteurs/\d+/$')
+
+    def test_baseline(self):
+        self._bench(baseline=str(self.baseline), save_baseline=True)
+        self._bench(baseline=str(self.baseline), tolerance=100.0, min_delta_ms=1e6)
+        # fewer queries in the baseline: a regression
+        reference = json.loads(self.baseline.read_text())
+        reference['views']['liste_producteurs']['queries'] -= 1
+        self.baseline.write_text(json.dumps(reference))
+        with self.assertRaisesMessage(CommandError, 'liste_producteurs: requêtes SQL'):
+            self._bench(baseline=str(self.baseline), tolerance=100.0, min_delta_ms=1e6)
+
+    def test_base_jetable(self):
+        # --seed-producteurs seeds and measures a test database, torn down even on failure
+        from core.management.commands import bench_vues
+        with mock.patch.object(bench_vues, 'setup_databases', return_value='config') as setup, \
+                mock.patch.object(bench_vues, 'teardown_databases') as teardown, \
+                mock.patch.object(bench_vues, 'connections'), \
+                mock.patch.object(bench_vues, 'call_command') as generer:
+            rapport = self._bench(seed_producteurs=2, seed_ventes=3)
+            setup.assert_called_once()
+            generer.assert_called_once_with('generer_donnees', producteurs=2, ventes=3, stdout=mock.ANY)
+            teardown.assert_called_once_with('config', verbosity=0)
+            self.assertTrue(rapport['meta']['test_database'])
+
+            with self.assertRaises(CommandError):
+                self._bench(seed_producteurs=2, only=['inconnue'])
+            self.assertEqual(teardown.call_count, 2)
+
+
+#------ Métriques par vue ------
+
+def _server_timing(response):
+    return re.match(r'sql;dur=([\d.]+);desc="(\d+) queries", total;dur=([\d.]+)$', response['Server-Timing'])
+
+
+class MetricsTests(TestCase):
+
+    def test_histogramme(self):
+        histogramme = metrics.Histogram('test_duree', 'Durée.', (0.1, 1.0))
+        for valeur in (0.05, 0.5, 0.7, 3.0):
+            histogramme.observe('a"b', valeur)
+        self.assertEqual(histogramme.render().split('\n'), [
+            '# HELP test_duree Durée.',
+            '# TYPE test_duree histogram',
+            'test_duree_bucket{view="a\\"b",le="0.1"} 1',
+            'test_duree_bucket{view="a\\"b",le="1"} 3',
+            'test_duree_bucket{view="a\\"b",le="+Inf"} 4',
+            'test_duree_sum{view="a\\"b"} 4.25',
+            'test_duree_count{view="a\\"b"} 4',
+        ])
+
+    def test_server_timing_et_metrics(self):
+        Client.objects.create(nom='Diallo', prenom='Fatou', adresse='Conakry', telephone='624000001',
+                              email='client1@example.com')
+        response = self.client.get(reverse('liste_producteurs'))
+        timing = _server_timing(response)
+        self.assertIsNotNone(timing)
+        self.assertGreater(int(timing[2]), 0)
+
+        texte = self.client.get(reverse('metrics')).content.decode()
+        for nom in ('agrodata_view_duration_seconds', 'agrodata_view_sql_queries', 'agrodata_view_response_bytes'):
+            self.assertIn(f'{nom}_count{{view="liste_producteurs"}}', texte)
+        self.assertRegex(texte, r'agrodata_view_sql_queries_bucket\{view="liste_producteurs",le="\+Inf"\} [1-9]')
+
+    @override_settings(METRICS_TOKEN='secret')
+    def test_metrics_jeton(self):
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, 403)
+        self.assertEqual(self.client.get(reverse('metrics'), HTTP_AUTHORIZATION='Bearer secret').status_code, 200)
+
+    def test_requetes_des_autres_threads(self):
+        # the context follows the request into sync_to_async worker threads
+        from asgiref.sync import async_to_sync, sync_to_async
+
+        def requete():
+            return Client.objects.exists()
+
+        async def vue():
+            await asyncio.gather(*(sync_to_async(requete, thread_sensitive=False)() for _ in range(3)))
+
+        with metrics.capture() as timer:
+            async_to_sync(vue)()
+        self.assertEqual(timer.count, 3)
+
+    def test_middleware_async(self):
+        async def vue(request):
+            return HttpResponse('ok')
+
+        middleware = MetricsMiddleware(vue)
+        self.assertTrue(iscoroutinefunction(middleware))
+        response = asyncio.run(middleware(RequestFactory().get('/')))
+        self.assertIsNotNone(_server_timing(response))
+        self.assertFalse(iscoroutinefunction(MetricsMiddleware(lambda request: HttpResponse())))
+
+
+class MetricsAsyncTests(TransactionTestCase):
+    """The async dashboard runs its widgets on their own connections."""
+
+    def setUp(self):
+        if connection.vendor == 'sqlite' and connection.is_in_memory_db():
+            self.skipTest("base de test en mémoire : une seule connexion")
+
+    async def test_requetes_des_widgets(self):
+        response = await self.async_client.get(reverse('home_async'))
+        self.assertEqual(response.status_code, 200)
+        # at least one query per widget, each run in a worker thread
+        self.assertGreaterEqual(int(_server_timing(response)[2]), len(WIDGETS))
+
+
+#------ Recherche indexée (FTS5 trigramme sur SQLite) ------
+
+class RechercheTests(TestCase):
+
+    NOMS = [('Camara', 'Alpha', 'Kindia'), ('CAMARA', 'Mamadou', 'Kankan'), ('Diallo', 'Fatoumata', 'Labé'),
+            ('Bah', 'Aïssatou', 'Mamou'), ('Soumah', 'Kadiatou', 'Dubréka'), ('Keita', "N'Faly", 'Siguiri'),
+            ('Kamara', 'Ibrahima', 'Boké'), ('Sylla', 'Ousmane "Ous"', 'Conakry')]
+    REQUETES = ['cam', 'AMARA', 'amar', 'ma', 'a', 'labé', 'dou', "n'fa", '"ous"', '6220000', 'xyz', 'kindia conakry']
+
+    def setUp(self):
+        Producteur.objects.bulk_create([
+            Producteur(nom=nom, prenom=prenom, adresse=adresse, telephone=f'62200000{i}')
+            for i, (nom, prenom, adresse) in enumerate(self.NOMS)
+        ])
+
+    def _icontains(self, q, champs):
+        condition = Q()
+        for champ in champs:
+            condition |= Q(**{f'{champ}__icontains': q})
+        return set(Producteur.objects.filter(condition).values_list('id', flat=True))
+
+    def assertMemesResultats(self):
+        for champs in (('nom', 'prenom', 'telephone'), ('adresse',), ('prenom',)):
+            for q in self.REQUETES:
+                with self.subTest(q=q, champs=champs):
+                    trouve = search.filtrer(Producteur.objects.all(), q, champs)
+                    self.assertEqual(set(trouve.values_list('id', flat=True)), self._icontains(q, champs))
+
+    def test_index_utilise(self):
+        if connection.vendor != 'sqlite':
+            self.skipTest("FTS5 : SQLite seulement")
+        sql = str(search.filtrer(Producteur.objects.all(), 'cam', ('nom',)).query)
+        self.assertIn('MATCH', sql)
+        # under MIN_LENGTH characters: no trigram, icontains
+        self.assertNotIn('MATCH', str(search.filtrer(Producteur.objects.all(), 'ca', ('nom',)).query))
+
+    def test_memes_resultats_que_icontains(self):
+        self.assertMemesResultats()
+
+    def test_index_suit_les_ecritures(self):
+        # triggers: save(), update(), bulk_update() and delete() all reach the index
+        camara = Producteur.objects.get(prenom='Alpha')
+        camara.nom = 'Conté'
+        camara.save()
+        Producteur.objects.filter(nom='Diallo').update(adresse='Kamsar')
+        keita = Producteur.objects.get(nom='Keita')
+        keita.prenom = 'Amara'
+        Producteur.objects.bulk_update([keita], ['prenom'])
+        Producteur.objects.filter(nom='Bah').delete()
+        self.REQUETES = self.REQUETES + ['conté', 'kamsar', 'bah']
+        self.assertMemesResultats()
+
+
+#------ Recherche globale (omnibox) ------
+
+class OmniboxTests(TestCase):
+
+    def _ecrire(self, fonction, *args, **kwargs):
+        # the documents are rebuilt at commit
+        with self.captureOnCommitCallbacks(execute=True):
+            return fonction(*args, **kwargs)
+
+    def assertAJour(self):
+        documents = set(SearchDocument.objects.values_list('type', 'objet_id', 'titre', 'sous_titre', 'contenu'))
+        omnibox.reindexer()
+        self.assertEqual(documents, set(SearchDocument.objects.values_list(
+            'type', 'objet_id', 'titre', 'sous_titre', 'contenu')))
+
+    def test_documents_apres_ecritures(self):
+        producteur = self._ecrire(Producteur.objects.create, nom='Camara', prenom='Alpha', adresse='Kindia',
+                                  telephone='622000001')
+        self.assertAJour()
+        # bulk_create of the grouped form: bulk_changed
+        data = MultiValueDict({'parcelle_nom': ['Verger'], 'parcelle_superficie': ['2'], 'parcelle_adresse': ['Kindia'],
+                               'recolte_fruit': ['Mangue'], 'recolte_quantite': ['500'],
+                               'recolte_date': ['2026-06-01'], 'recolte_parcelle': ['new-0']})
+        _, (recolte,), _ = self._ecrire(producteur_services.creer_parcelles_recoltes, producteur, data)
+        lot = self._ecrire(Transformation.objects.create, code_lot='LOT-1', recolte=recolte, etape='CONDITIONNEMENT',
+                           quantite_depart=500, quantite_finale=100,
+                           date_debut=date(2026, 6, 2), date_fin=date(2026, 6, 5))
+        stock = self._ecrire(stock_services.creer, 10, lot=lot, produit='Mangue séchée', unite_mesure='KG',
+                             date_mise_a_jour=date(2026, 6, 5))
+        client = self._ecrire(Client.objects.create, nom='Diallo', prenom='Fatou', adresse='Conakry',
+                              telephone='624000001', email='fatou@example.com')
+        self.assertAJour()
+
+        # save(), a sale (QuerySet.update() + bulk_changed) and a cascade
+        producteur.nom = 'Keita'
+        self._ecrire(producteur.save)
+        self._ecrire(stock_services.enregistrer_vente, client, stock, 4, 1, date(2026, 6, 6))
+        self.assertAJour()
+        self.assertEqual(omnibox.chercher('keita')[0]['id'], producteur.id)
+        self.assertIn('6 KG', SearchDocument.objects.get(type='stock', objet_id=stock.id).sous_titre)
+        self._ecrire(client.delete)
+        self._ecrire(producteur.delete)
+        self.assertAJour()
+        self.assertFalse(SearchDocument.objects.exists())
+
+    def test_rang(self):
+        for i, nom in enumerate(('Mangueira', 'Mangue', 'Kamangue')):
+            self._ecrire(Client.objects.create, nom=nom, prenom='Fatou', adresse='Conakry',
+                         telephone=f'62400000{i}', email=f'client{i}@example.com')
+        response = self.client.get(reverse('recherche'), {'q': 'mangue', 'type': ['client', 'inconnu'], 'limit': '²'})
+        self.assertEqual([r['titre'] for r in response.json()['results']],
+                         ['Mangue Fatou', 'Mangueira Fatou', 'Kamangue Fatou'])
+
+
+#------ Recherche à la saisie (lookups) ------
+
+class LookupTests(TestCase):
+
+    def setUp(self):
+        self.producteurs = [
+            Producteur.objects.create(nom=nom, prenom=prenom, adresse='Kindia', telephone=f'62200000{i}')
+            for i, (nom, prenom) in enumerate((('Camara', 'Alpha'), ('Kamara', 'Ibrahima'), ('Diallo', 'Fatou')))
+        ]
+        self.parcelles = [
+            Parcelle.objects.create(nom=f'Verger {i}', superficie=2, adresse='Kindia', producteur=producteur)
+            for i, producteur in enumerate(self.producteurs)
+        ]
+        fruit = Fruit.objects.create(nom='Mangue')
+        self.recolte = Recolte.objects.create(fruit=fruit, quantite=100, date_recolte=date(2026, 6, 1),
+                                              producteur=self.producteurs[2], parcelle=self.parcelles[2])
+
+    def _chercher(self, nom, **params):
+        response = self.client.get(reverse('lookup', args=[nom]), params)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_producteurs(self):
+        # under 3 characters a prefix, beyond a "contains" (trigram index)
+        self.assertEqual([r['label'] for r in self._chercher('producteur', q='ca')['results']], ['Camara Alpha'])
+        resultats = self._chercher('producteur', q='AMAR')['results']
+        self.assertEqual([r['label'] for r in resultats], ['Camara Alpha', 'Kamara Ibrahima'])
+        self.assertEqual(resultats[0], {'id': self.producteurs[0].id, 'label': 'Camara Alpha', 'detail': '622000000'})
+        page = self._chercher('producteur', limit='2')
+        self.assertEqual((len(page['results']), page['more']), (2, True))
+
+    def test_filtres(self):
+        resultats = self._chercher('parcelle', producteur=self.producteurs[1].id)['results']
+        self.assertEqual([r['id'] for r in resultats], [self.parcelles[1].id])
+        self.assertEqual(resultats[0]['detail'], '2 ha · Kamara Ibrahima')
+        # not an id ('²'.isdigit() is true): the filter is ignored
+        self.assertEqual(len(self._chercher('parcelle', producteur='²')['results']), 3)
+
+    def test_recoltes_et_ventes(self):
+        self.assertEqual([r['id'] for r in self._chercher('recolte', q=str(self.recolte.id))['results']],
+                         [self.recolte.id])
+        self.assertEqual([r['id'] for r in self._chercher('recolte', q='mang')['results']], [self.recolte.id])
+        self.assertEqual([r['id'] for r in self._chercher('recolte', q='diallo')['results']], [self.recolte.id])
+        self.assertEqual(self._chercher('recolte', q='²')['results'], [])
+        lot = Transformation.objects.create(code_lot='LOT-1', recolte=self.recolte, etape='CONDITIONNEMENT',
+                                            quantite_depart=100, quantite_finale=80,
+                                            date_debut=date(2026, 6, 2), date_fin=date(2026, 6, 3))
+        stock = Stock.objects.create(lot=lot, produit='Mangue séchée', quantite_disponible=80, unite_mesure='KG',
+                                     date_mise_a_jour=date(2026, 6, 3))
+        client = Client.objects.create(nom='Sylla', prenom='Awa', adresse='Conakry', telephone='624000001',
+                                       email='awa@example.com')
+        vente = Vente.objects.create(client=client, stock=stock, quantite_vendue=2, prix_unitaire=10,
+                                     date_vente=date(2026, 6, 4), montant_total=20)
+        for q in (f'#{vente.id}', str(vente.id), 'syl'):
+            with self.subTest(q=q):
+                self.assertEqual([r['label'] for r in self._chercher('vente', q=q)['results']],
+                                 [f'Vente #{vente.id} - Sylla Awa'])
+        self.assertEqual(self.client.get(reverse('lookup', args=['inconnu'])).status_code, 404)
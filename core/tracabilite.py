@@ -0,0 +1,259 @@
+"""Traçabilité des lots : de la récolte à la facture, et retour.
+
+La table `Lignee` aplatit chaque chemin récolte → lot (transformation) →
+stock → vente → facture en une ligne d'identifiants. Un rappel de lot ou la
+recherche de l'origine d'une vente est alors une seule requête sur un index
+de cette table, au lieu de remonter quatre applications à la main.
+
+Les lignes sont reconstruites au commit quand une écriture change la forme
+d'un chemin : création / suppression, ou changement d'un lien (récolte d'un
+lot, lot d'un stock, stock ou client d'une vente, vente d'une facture).
+Seules les lignes sous l'objet touché sont réécrites : une vente de plus
+coûte sa ligne, pas celles de tout le lot.
+Les autres écritures (quantités, prix, statuts...) ne coûtent que deux
+lectures indexées au commit.
+"""
+import threading
+
+from django.apps import apps
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+
+from .signals import bulk_changed
+
+COLONNES = (
+    'producteur_id', 'parcelle_id', 'recolte_id', 'transformation_id', 'code_lot',
+    'stock_id', 'vente_id', 'client_id', 'facture_id',
+)
+# the same columns read from each level: one row per path below it (LEFT JOINs)
+# level -> (model label, Lignee column of its id, path fields, parent level)
+NIVEAUX = {
+    'transformation': ('transformation.Transformation', 'transformation_id', (
+        'recolte__producteur_id', 'recolte__parcelle_id', 'recolte_id', 'id', 'code_lot',
+        'stock__id', 'stock__vente__id', 'stock__vente__client_id', 'stock__vente__facture__id',
+    ), None),
+    'stock': ('stock.Stock', 'stock_id', (
+        'lot__recolte__producteur_id', 'lot__recolte__parcelle_id', 'lot__recolte_id', 'lot_id', 'lot__code_lot',
+        'id', 'vente__id', 'vente__client_id', 'vente__facture__id',
+    ), 'transformation'),
+    'vente': ('vente.Vente', 'vente_id', (
+        'stock__lot__recolte__producteur_id', 'stock__lot__recolte__parcelle_id', 'stock__lot__recolte_id',
+        'stock__lot_id', 'stock__lot__code_lot', 'stock_id', 'id', 'client_id', 'facture__id',
+    ), 'stock'),
+}
+# type -> (model label, Lignee column of its id,
+#          links: (Lignee column, model field) that place a row in the paths,
+#          level rebuilt when it moves, model field leading to it)
+TYPES = {
+    'recolte': ('producteurs.Recolte', 'recolte_id',
+                (('producteur_id', 'producteur_id'), ('parcelle_id', 'parcelle_id')),
+                'transformation', 'transformation__id'),
+    'transformation': ('transformation.Transformation', 'transformation_id',
+                       (('recolte_id', 'recolte_id'), ('code_lot', 'code_lot')), 'transformation', 'id'),
+    'stock': ('stock.Stock', 'stock_id', (('transformation_id', 'lot_id'),), 'stock', 'id'),
+    'vente': ('vente.Vente', 'vente_id', (('stock_id', 'stock_id'), ('client_id', 'client_id')), 'vente', 'id'),
+    'facture': ('vente.Facture', 'facture_id', (('vente_id', 'vente_id'),), 'vente', 'vente_id'),
+}
+_TYPE_BY_LABEL = {label: type_ for type_, (label, *_) in TYPES.items()}
+
+
+#---------------------------- Construction ---------------------------
+
+def _reconstruire(niveau, ids, batch_size=2000, get_model=apps.get_model):
+    """Replace the rows going through `ids` of `niveau` by their current paths.
+
+    Only the rows below these ids are rewritten: a new vente costs its own
+    row, not the whole lot. The parents' placeholder rows (a stock without
+    vente, a lot without stock) are then added or dropped.
+    """
+    Lignee = get_model('core.Lignee')
+    label, colonne, chemin, parent = NIVEAUX[niveau]
+    model = get_model(label)
+    ids = sorted(ids)
+    parents, total = set(), 0
+    for start in range(0, len(ids), batch_size):
+        lot = ids[start:start + batch_size]
+        with transaction.atomic():
+            # concurrent rebuilds of a row wait for each other instead of both inserting
+            list(model.objects.select_for_update().filter(pk__in=lot).values_list('pk', flat=True))
+            anciens = Lignee.objects.filter(**{f'{colonne}__in': lot})
+            if parent:
+                parents.update(anciens.values_list(NIVEAUX[parent][1], flat=True).distinct())
+            anciens.delete()
+            lignes = [Lignee(**dict(zip(COLONNES, row))) for row in model.objects.filter(pk__in=lot).values_list(*chemin).order_by()]
+            total += len(Lignee.objects.bulk_create(lignes))
+            if parent:
+                parents.update(getattr(ligne, NIVEAUX[parent][1]) for ligne in lignes)
+    if parents:
+        total += _attentes(parent, parents, batch_size, get_model)
+    return total
+
+
+def _attentes(niveau, ids, batch_size, get_model):
+    """Fix the placeholder rows of `ids` of `niveau` after their children moved.
+
+    A row with children drops its placeholder (empty child column); a row
+    left without any is rebuilt, which writes its placeholder if it still
+    exists. One indexed probe per id: (parent column, child column).
+    """
+    Lignee = get_model('core.Lignee')
+    colonne = NIVEAUX[niveau][1]
+    enfant = next(c for _, c, _, p in NIVEAUX.values() if p == niveau)
+    avec = {
+        id_ for id_ in ids
+        if Lignee.objects.filter(**{colonne: id_, f'{enfant}__isnull': False}).exists()
+    }
+    if avec:
+        Lignee.objects.filter(**{f'{colonne}__in': avec, f'{enfant}__isnull': True}).delete()
+    sans = set(ids) - avec
+    return _reconstruire(niveau, sans, batch_size, get_model) if sans else 0
+
+
+def reconstruire(transformation_ids, batch_size=2000, get_model=apps.get_model):
+    """Replace the rows of the given lots by their current paths (none for deleted lots).
+
+    Returns the number of rows written. `get_model` lets a data migration
+    pass its historical models.
+    """
+    return _reconstruire('transformation', transformation_ids, batch_size, get_model)
+
+
+def reconstruire_tout(batch_size=2000, get_model=apps.get_model):
+    """Rebuild the whole table, e.g. after a load that sends no signals."""
+    Lignee = get_model('core.Lignee')
+    Transformation = get_model('transformation.Transformation')
+    Lignee.objects.all().delete()
+    ids = Transformation.objects.order_by('pk').values_list('pk', flat=True)
+    return reconstruire(list(ids), batch_size, get_model)
+
+
+def _touches(type_, ids):
+    """(level, ids of that level) whose paths go through rows `ids` of `type_` and no longer match them."""
+    Lignee = apps.get_model('core.Lignee')
+    label, colonne, liens, niveau, vers = TYPES[type_]
+    model = apps.get_model(label)
+    colonnes = [c for c, _ in liens]
+    colonne_niveau = NIVEAUX[niveau][1]
+
+    actuels = {row[0]: row[1:] for row in model.objects.filter(pk__in=ids).values_list('pk', *[f for _, f in liens])}
+    stockes, places = {}, set()
+    for row in Lignee.objects.filter(**{f'{colonne}__in': ids}).values_list(colonne, colonne_niveau, *colonnes).distinct():
+        stockes.setdefault(row[0], set()).add(row[2:])
+        places.add((row[0], row[1]))
+
+    # created, deleted, or moved to another parent
+    modifies = {id_ for id_ in set(actuels) | set(stockes) if stockes.get(id_) != ({actuels[id_]} if id_ in actuels else None)}
+    if not modifies:
+        return niveau, set()
+    touches = {place for id_, place in places if id_ in modifies and place is not None}
+    touches.update(
+        place for place in model.objects.filter(pk__in=modifies).values_list(vers, flat=True) if place is not None
+    )
+    return niveau, touches
+
+
+#---------------------------- Mise à jour au commit ---------------------------
+
+# type -> ids written in the current thread's transaction
+_pending = threading.local()
+
+
+def _flush():
+    pending = getattr(_pending, 'ids', None)
+    if not pending:
+        return
+    _pending.ids = {}
+    with transaction.atomic():
+        par_niveau = {}
+        for type_, ids in pending.items():
+            niveau, touches = _touches(type_, list(ids))
+            par_niveau.setdefault(niveau, set()).update(touches)
+        # each rebuild deletes its scope before inserting: any order ends in the same rows
+        for niveau in NIVEAUX:
+            if par_niveau.get(niveau):
+                _reconstruire(niveau, par_niveau[niveau])
+
+
+def _mark(type_, ids):
+    if not hasattr(_pending, 'ids'):
+        _pending.ids = {}
+    _pending.ids.setdefault(type_, set()).update(ids)
+    transaction.on_commit(_flush)
+
+
+def _changed(sender, instance, raw=False, **kwargs):
+    if not raw:
+        _mark(_TYPE_BY_LABEL[sender._meta.label], [instance.pk])
+
+
+def _bulk_changed(sender, instances, **kwargs):
+    ids = [obj.pk for obj in instances if obj.pk is not None]
+    if ids:
+        _mark(_TYPE_BY_LABEL[sender._meta.label], ids)
+
+
+def connect():
+    for type_, (label, *_) in TYPES.items():
+        model = apps.get_model(label)
+        post_save.connect(_changed, sender=model, dispatch_uid=f'tracabilite_save_{type_}')
+        post_delete.connect(_changed, sender=model, dispatch_uid=f'tracabilite_delete_{type_}')
+        bulk_changed.connect(_bulk_changed, sender=model, dispatch_uid=f'tracabilite_bulk_{type_}')
+
+
+#---------------------------- Traces ---------------------------
+
+# GET param -> Lignee column
+AVAL = {'lot': 'code_lot', 'transformation': 'transformation_id', 'recolte': 'recolte_id',
+        'parcelle': 'parcelle_id', 'producteur': 'producteur_id'}
+AMONT = {'facture': 'facture_id', 'vente': 'vente_id', 'client': 'client_id', 'stock': 'stock_id'}
+
+
+def _chemins(colonne, valeur):
+    Lignee = apps.get_model('core.Lignee')
+    return list(Lignee.objects.filter(**{colonne: valeur}).values_list(*COLONNES))
+
+
+def _distincts(chemins, colonne):
+    i = COLONNES.index(colonne)
+    return sorted({row[i] for row in chemins if row[i] is not None})
+
+
+def _lots(chemins):
+    return [{'id': id_, 'code_lot': code} for id_, code in sorted({(row[3], row[4]) for row in chemins})]
+
+
+def aval(colonne, valeur):
+    """Forward trace (recall): everything downstream of a lot / récolte / parcelle / producteur.
+
+    The paths are one query on an index of Lignee; the clients' contact
+    details, needed to act on a recall, are one more query by primary key.
+    """
+    chemins = _chemins(colonne, valeur)
+    clients = apps.get_model('vente.Client').objects.in_bulk(_distincts(chemins, 'client_id'))
+    return {
+        'lots': _lots(chemins),
+        'stocks': _distincts(chemins, 'stock_id'),
+        'ventes': _distincts(chemins, 'vente_id'),
+        'factures': _distincts(chemins, 'facture_id'),
+        'clients': [
+            {'id': c.id, 'nom': c.nom, 'prenom': c.prenom, 'telephone': c.telephone, 'email': c.email}
+            for c in clients.values()
+        ],
+        'chemins': len(chemins),
+    }
+
+
+def amont(colonne, valeur):
+    """Backward trace: the lots, récoltes, parcelles and producteurs behind a sale / stock / client."""
+    chemins = _chemins(colonne, valeur)
+    producteurs = apps.get_model('producteurs.Producteur').objects.in_bulk(_distincts(chemins, 'producteur_id'))
+    return {
+        'lots': _lots(chemins),
+        'recoltes': _distincts(chemins, 'recolte_id'),
+        'parcelles': _distincts(chemins, 'parcelle_id'),
+        'producteurs': [
+            {'id': p.id, 'nom': p.nom, 'prenom': p.prenom, 'telephone': p.telephone, 'adresse': p.adresse}
+            for p in producteurs.values()
+        ],
+        'chemins': len(chemins),
+    }
@@ -1,7 +1,14 @@
 from django.shortcuts import render, redirect
 from django.contrib.auth import authenticate, login, logout
 from django.contrib import messages
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden, JsonResponse
 from django.urls import reverse
+from django.utils.crypto import constant_time_compare
+
+from . import lookup as lookups
+from . import metrics as metrics_registry
+from . import omnibox, tracabilite
 
 
 def login_view(request):
@@ -31,4 +38,77 @@ def logout_view(request):
 	messages.info(request, 'Vous avez été déconnecté.')
 	return redirect('login')
 
-# Create your views here.
+
+def metrics(request):
+	"""Per-view histograms in Prometheus text format (this process only).
+
+	When settings.METRICS_TOKEN is set, scrapers must send `Authorization: Bearer <token>`.
+	"""
+	token = getattr(settings, 'METRICS_TOKEN', '')
+	if token:
+		auth = request.headers.get('Authorization', '')
+		if not constant_time_compare(auth, f'Bearer {token}'):
+			return HttpResponseForbidden('Forbidden')
+	return HttpResponse(metrics_registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+def recherche(request):
+	"""Global search (omnibox): ranked JSON results across every entity.
+
+	GET params: q, type (repeatable, restricts the entity types), limit (max 50).
+	"""
+	q = request.GET.get('q', '')
+	types = [t for t in request.GET.getlist('type') if t in omnibox.TYPES]
+	try:
+		limit = min(max(int(request.GET.get('limit', 20)), 1), 50)
+	except ValueError:
+		limit = 20
+	return JsonResponse({'q': q, 'results': omnibox.chercher(q, types, limit)})
+
+
+def lookup(request, name):
+	"""Typeahead lookup for the foreign-key fields of the forms (core/lookup.py).
+
+	GET params: q, limit (max 50), plus the filters the lookup accepts
+	(e.g. producteur=<id> for parcelles). Returns {results: [{id, label, detail}], more}.
+	"""
+	if name not in lookups.LOOKUPS:
+		return JsonResponse({'error': 'Lookup inconnu'}, status=404)
+	try:
+		limit = min(max(int(request.GET.get('limit', lookups.LIMIT)), 1), lookups.LIMIT_MAX)
+	except ValueError:
+		limit = lookups.LIMIT
+	results, more = lookups.chercher(name, request.GET.get('q', ''), request.GET, limit)
+	return JsonResponse({'results': results, 'more': more})
+
+
+def _trace(request, params, trace):
+	"""Run `trace` on the first of `params` given in the query string."""
+	for param, colonne in params.items():
+		valeur = request.GET.get(param, '').strip()
+		if not valeur:
+			continue
+		cle = valeur
+		if colonne != 'code_lot':
+			try:
+				cle = int(valeur)
+			except ValueError:
+				return JsonResponse({'error': f'{param} doit être un identifiant'}, status=400)
+		return JsonResponse({param: valeur, **trace(colonne, cle)})
+	return JsonResponse({'error': f"Paramètre attendu : {', '.join(params)}"}, status=400)
+
+
+def trace_aval(request):
+	"""Forward trace for recalls: stocks, ventes, factures and clients of a lot.
+
+	GET params (one of): lot (code_lot), transformation, recolte, parcelle, producteur.
+	"""
+	return _trace(request, tracabilite.AVAL, tracabilite.aval)
+
+
+def trace_amont(request):
+	"""Backward trace: lots, récoltes, parcelles and producteurs behind a sale.
+
+	GET params (one of): facture, vente, client, stock.
+	"""
+	return _trace(request, tracabilite.AMONT, tracabilite.amont)
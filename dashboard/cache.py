@@ -0,0 +1,120 @@
+"""Cache versionné des calculs du tableau de bord.
+
+Chaque modèle suivi possède un compteur `Generation`, incrémenté par les
+signaux post_save / post_delete (voir `dashboard.signals`). La clé d'une
+entrée contient les générations des modèles dont elle dépend : dès qu'une
+écriture a lieu, la clé change et l'ancienne valeur n'est plus servie.
+
+Lorsqu'une clé manque, un seul worker la recalcule (verrou posé avec
+`cache.add`) ; les autres servent la dernière valeur connue pour les mêmes
+paramètres en attendant.
+"""
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.db.models import F
+
+from .models import Generation
+
+# Models whose writes invalidate dashboard results
+TRACKED_MODELS = [
+    'producteurs.Producteur',
+    'producteurs.Parcelle',
+    'producteurs.Recolte',
+    'producteurs.Fruit',
+    'transformation.Transformation',
+    'stock.Stock',
+    'vente.Client',
+    'vente.Vente',
+    'vente.Facture',
+]
+
+KEY_PREFIX = 'dashboard'
+TIMEOUT = getattr(settings, 'DASHBOARD_CACHE_TIMEOUT', 300)
+STALE_TIMEOUT = getattr(settings, 'DASHBOARD_CACHE_STALE_TIMEOUT', 24 * 3600)
+LOCK_TIMEOUT = 30
+LOCK_WAIT = 2.0
+
+
+def model_label(model):
+    return model._meta.label
+
+
+def bump(*labels):
+    """Increment the generation counter of each given model label."""
+    for label in labels:
+        updated = Generation.objects.filter(nom=label).update(valeur=F('valeur') + 1)
+        if updated:
+            continue
+        try:
+            with transaction.atomic():
+                Generation.objects.create(nom=label, valeur=1)
+        except IntegrityError:
+            Generation.objects.filter(nom=label).update(valeur=F('valeur') + 1)
+
+
+def generations(labels):
+    """Return the current generation of each label, in one query."""
+    found = dict(Generation.objects.filter(nom__in=labels).values_list('nom', 'valeur'))
+    return tuple(found.get(label, 0) for label in labels)
+
+
+def _digest(parts):
+    return hashlib.md5(repr(parts).encode('utf-8')).hexdigest()
+
+
+def etag(name, params, version):
+    """Strong ETag for a cached result, derived without computing it."""
+    return _digest((name, params, version))
+
+
+def cached(name, params, compute, depends_on=TRACKED_MODELS, timeout=None, version=None):
+    """Return `compute()` cached under (name, params, generations of `depends_on`).
+
+    `params` must be a tuple of plain values (dates, strings...). `version`
+    lets a caller that already read the generations reuse them.
+    """
+    return cached_entry(name, params, compute, depends_on, timeout, version)[1]
+
+
+def cached_entry(name, params, compute, depends_on=TRACKED_MODELS, timeout=None, version=None):
+    """Like `cached` but return (version, value).
+
+    The version differs from the current one when a stale value is served
+    while another worker recomputes it.
+    """
+    if version is None:
+        version = generations(depends_on)
+    base = f"{KEY_PREFIX}:{name}:{_digest(params)}"
+    key = f"{base}:{_digest(version)}"
+    latest_key = f"{base}:latest"
+    lock_key = f"{key}:lock"
+
+    entry = cache.get(key)
+    if entry is not None:
+        return entry
+
+    if cache.add(lock_key, 1, LOCK_TIMEOUT):
+        try:
+            entry = (version, compute())
+            cache.set(key, entry, TIMEOUT if timeout is None else timeout)
+            cache.set(latest_key, entry, STALE_TIMEOUT)
+        finally:
+            cache.delete(lock_key)
+        return entry
+
+    # Someone else is recomputing: serve the previous value if there is one,
+    # otherwise wait briefly for the fresh one before computing it ourselves.
+    stale = cache.get(latest_key)
+    if stale is not None:
+        return stale
+    deadline = time.monotonic() + LOCK_WAIT
+    while time.monotonic() < deadline:
+        time.sleep(0.05)
+        entry = cache.get(key)
+        if entry is not None:
+            return entry
+    return (version, compute())
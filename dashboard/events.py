@@ -0,0 +1,109 @@
+"""Diffusion en processus des évènements « live » du tableau de bord.
+
+Les signaux (voir `dashboard.signals`) publient de petits deltas (nouvelle
+vente, mouvement de stock, nouvelle récolte) ; chaque connexion au flux SSE
+`dashboard/stream/` est abonnée et les reçoit. Aucun broker externe n'est
+nécessaire : un évènement n'atteint que les abonnés du même processus.
+"""
+import asyncio
+import json
+import queue
+import threading
+from itertools import count
+
+# bounded per-subscriber buffer: a stalled client loses events instead of memory
+MAX_PENDING = 100
+
+
+def format_event(event, data, event_id=None):
+    """Serialize one Server-Sent Event."""
+    lines = []
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    lines.append(f"event: {event}")
+    lines.append(f"data: {json.dumps(data)}")
+    return "\n".join(lines) + "\n\n"
+
+
+class _SyncSubscriber:
+    def __init__(self):
+        self.queue = queue.Queue(maxsize=MAX_PENDING)
+
+    def put(self, message):
+        try:
+            self.queue.put_nowait(message)
+        except queue.Full:
+            pass
+
+    def get(self, timeout):
+        try:
+            return self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+
+class _AsyncSubscriber:
+    def __init__(self, loop):
+        self.loop = loop
+        self.queue = asyncio.Queue(maxsize=MAX_PENDING)
+
+    def _put(self, message):
+        try:
+            self.queue.put_nowait(message)
+        except asyncio.QueueFull:
+            pass
+
+    def put(self, message):
+        # publish() runs in a worker thread; hand the message to the subscriber's loop
+        try:
+            self.loop.call_soon_threadsafe(self._put, message)
+        except RuntimeError:
+            # loop already closed: the client is gone
+            pass
+
+    async def get(self, timeout):
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+
+class Broadcaster:
+    """Thread-safe fan-out of events to every current subscriber."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers = set()
+        self._ids = count(1)
+
+    def subscribe(self):
+        subscriber = _SyncSubscriber()
+        with self._lock:
+            self._subscribers.add(subscriber)
+        return subscriber
+
+    def subscribe_async(self):
+        subscriber = _AsyncSubscriber(asyncio.get_running_loop())
+        with self._lock:
+            self._subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        with self._lock:
+            self._subscribers.discard(subscriber)
+
+    def publish(self, event, data):
+        message = format_event(event, data, next(self._ids))
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for subscriber in subscribers:
+            subscriber.put(message)
+        return len(subscribers)
+
+    @property
+    def subscriber_count(self):
+        with self._lock:
+            return len(self._subscribers)
+
+
+broadcaster = Broadcaster()
@@ -0,0 +1,66 @@
+import asyncio
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from dashboard import widgets
+from dashboard.views import _period_bounds
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare la latence du calcul séquentiel (vue sync) et concurrent (vue async) "
+        "de tous les widgets du tableau de bord, cache désactivé. "
+        "À lancer contre Postgres (DATABASE_URL) pour des chiffres représentatifs."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=20)
+        parser.add_argument('--period', default='30d', choices=['7d', '30d', '90d', '365d'])
+
+    def handle(self, *args, **options):
+        class _Req:
+            GET = {'period': options['period']}
+
+        period, start_date, end_date = _period_bounds(_Req())
+        names = list(widgets.WIDGETS)
+
+        def run_sync():
+            for name in names:
+                widgets.WIDGETS[name][0](start_date, end_date)
+
+        def run_async():
+            asyncio.run(widgets.gather_widgets(names, period, start_date, end_date, use_cache=False))
+
+        def run_slowest():
+            # the lower bound for the async view: its slowest single widget
+            slowest = 0.0
+            for name in names:
+                t0 = time.perf_counter()
+                widgets.WIDGETS[name][0](start_date, end_date)
+                slowest = max(slowest, time.perf_counter() - t0)
+            return slowest
+
+        self.stdout.write(f"Base: {connection.vendor}, {options['iterations']} itérations, période {period}")
+        # warm up connections and query plans
+        run_sync()
+        run_async()
+
+        results = {}
+        for label, func in (('sync (séquentiel)', run_sync), ('async (gather)', run_async)):
+            timings = []
+            for _ in range(options['iterations']):
+                t0 = time.perf_counter()
+                func()
+                timings.append(time.perf_counter() - t0)
+            results[label] = timings
+        results['widget le plus lent'] = [run_slowest() for _ in range(options['iterations'])]
+
+        for label, timings in results.items():
+            timings.sort()
+            p95 = timings[min(len(timings) - 1, int(len(timings) * 0.95))]
+            self.stdout.write(
+                f"{label:<22} p50 {statistics.median(timings) * 1000:8.1f} ms   p95 {p95 * 1000:8.1f} ms"
+            )
@@ -0,0 +1,24 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from dashboard import rollup
+
+
+class Command(BaseCommand):
+    help = "Recalcule la table VenteJournaliere à partir des ventes (backfill ou réparation)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--start', help="Premier jour à recalculer (YYYY-MM-DD)")
+        parser.add_argument('--end', help="Dernier jour à recalculer (YYYY-MM-DD)")
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        try:
+            start = date.fromisoformat(options['start']) if options['start'] else None
+            end = date.fromisoformat(options['end']) if options['end'] else None
+        except ValueError as exc:
+            raise CommandError(f"Date invalide: {exc}")
+
+        written = rollup.rebuild(start=start, end=end, batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"{written} ligne(s) de cumul journalier écrites."))
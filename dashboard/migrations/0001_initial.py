@@ -0,0 +1,54 @@
+# Generated by Django 5.2.7 on 2026-10-18 19:12
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Sum
+
+
+def backfill(apps, schema_editor):
+    Vente = apps.get_model('vente', 'Vente')
+    VenteJournaliere = apps.get_model('dashboard', 'VenteJournaliere')
+    rows = (
+        Vente.objects.values('date_vente', 'stock_id', 'client_id')
+        .annotate(total=Sum('montant_total'), qty=Sum('quantite_vendue'), n=Count('id'))
+        .order_by()
+    )
+    VenteJournaliere.objects.bulk_create(
+        [
+            VenteJournaliere(
+                jour=r['date_vente'], stock_id=r['stock_id'], client_id=r['client_id'],
+                chiffre_affaires=r['total'] or 0, quantite=r['qty'] or 0, nombre_ventes=r['n'],
+            )
+            for r in rows.iterator()
+        ],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('stock', '0002_stockmovement'),
+        ('vente', '0002_client_prenom'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VenteJournaliere',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('jour', models.DateField()),
+                ('chiffre_affaires', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('quantite', models.FloatField(default=0)),
+                ('nombre_ventes', models.IntegerField(default=0)),
+                ('client', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='vente.client')),
+                ('stock', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='stock.stock')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('jour', 'stock', 'client'), name='vente_journaliere_unique_cle')],
+            },
+        ),
+        migrations.RunPython(backfill, migrations.RunPython.noop),
+    ]
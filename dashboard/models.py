@@ -1,3 +1,41 @@
 from django.db import models
+from stock.models import Stock
+from vente.models import Client
 
-# Create your models here.
+#----------------------------Table VenteJournaliere---------------------------
+class VenteJournaliere(models.Model):
+    """Cumul quotidien des ventes par (jour, stock, client).
+
+    Table de synthèse maintenue par les signaux de `vente.Vente` (voir
+    `dashboard.rollup`) afin que le tableau de bord agrège quelques lignes par
+    jour au lieu de parcourir toute la table des ventes.
+    """
+    jour = models.DateField()
+    stock = models.ForeignKey(Stock, on_delete=models.CASCADE)
+    client = models.ForeignKey(Client, on_delete=models.CASCADE)
+    chiffre_affaires = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    quantite = models.FloatField(default=0)
+    nombre_ventes = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['jour', 'stock', 'client'], name='vente_journaliere_unique_cle'),
+        ]
+
+    def __str__(self):
+        return f"{self.jour} {self.stock_id}/{self.client_id} CA: {self.chiffre_affaires}"
+
+
+#----------------------------Table Generation---------------------------
+class Generation(models.Model):
+    """Compteur de génération par modèle, incrémenté à chaque écriture.
+
+    Les entrées du cache du tableau de bord embarquent les générations des
+    modèles dont elles dépendent : une écriture rend la clé obsolète sans
+    avoir à supprimer explicitement les entrées concernées.
+    """
+    nom = models.CharField(max_length=100, unique=True)
+    valeur = models.BigIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.nom} #{self.valeur}"
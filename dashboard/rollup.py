@@ -0,0 +1,137 @@
+"""Maintenance incrémentale de la table `VenteJournaliere`.
+
+Chaque écriture sur `Vente` se traduit par un delta (+1 / -1) appliqué à la
+ligne (jour, stock, client) correspondante avec des expressions F(), ce qui
+évite toute relecture de la table des ventes. Les écritures en masse (signal
+`bulk_changed`) recalculent seulement les lignes de leurs clés ; `rebuild`
+recalcule la table à partir des ventes (commande `rebuild_ventes_journalieres`).
+"""
+from datetime import date, datetime
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Q, Sum
+
+from vente.models import Vente
+from .models import VenteJournaliere
+
+
+def _as_date(value):
+    # views assign the raw POST string to date_vente before saving
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    return date.fromisoformat(str(value))
+
+
+def snapshot(vente):
+    """Return the rollup key and measures of a vente as a plain dict."""
+    return {
+        'jour': _as_date(vente.date_vente),
+        'stock_id': vente.stock_id,
+        'client_id': vente.client_id,
+        'montant': Decimal(str(vente.montant_total or 0)),
+        'quantite': float(vente.quantite_vendue or 0),
+    }
+
+
+def apply(snap, sign):
+    """Add (sign=1) or remove (sign=-1) one vente snapshot from the rollup."""
+    key = {'jour': snap['jour'], 'stock_id': snap['stock_id'], 'client_id': snap['client_id']}
+    with transaction.atomic():
+        updated = VenteJournaliere.objects.filter(**key).update(
+            chiffre_affaires=F('chiffre_affaires') + sign * snap['montant'],
+            quantite=F('quantite') + sign * snap['quantite'],
+            nombre_ventes=F('nombre_ventes') + sign,
+        )
+        if sign < 0:
+            # never insert on removal: the row may already be gone through a cascade
+            VenteJournaliere.objects.filter(nombre_ventes__lte=0, **key).delete()
+            return
+        if updated:
+            return
+        try:
+            with transaction.atomic():
+                VenteJournaliere.objects.create(
+                    chiffre_affaires=snap['montant'],
+                    quantite=snap['quantite'],
+                    nombre_ventes=1,
+                    **key,
+                )
+        except IntegrityError:
+            # another request created the row in the meantime
+            VenteJournaliere.objects.filter(**key).update(
+                chiffre_affaires=F('chiffre_affaires') + snap['montant'],
+                quantite=F('quantite') + snap['quantite'],
+                nombre_ventes=F('nombre_ventes') + 1,
+            )
+
+
+def _lignes(ventes, batch_size):
+    """Rollup rows of `ventes`, aggregated by the database."""
+    rows = (
+        ventes.values('date_vente', 'stock_id', 'client_id')
+        .annotate(total=Sum('montant_total'), qty=Sum('quantite_vendue'), n=Count('id'))
+        .order_by()
+    )
+    for row in rows.iterator(chunk_size=batch_size):
+        yield VenteJournaliere(
+            jour=row['date_vente'],
+            stock_id=row['stock_id'],
+            client_id=row['client_id'],
+            chiffre_affaires=row['total'] or 0,
+            quantite=row['qty'] or 0,
+            nombre_ventes=row['n'],
+        )
+
+
+def recalculer(ventes, batch_size=300):
+    """Recompute the rollup rows of the (jour, stock, client) keys of `ventes` (bulk writes).
+
+    `ventes` are instances, deleted ones included. A bulk update that moves
+    ventes to another key must also list them with their old values.
+    Returns the number of rollup rows written.
+    """
+    cles = sorted({(s['jour'], s['stock_id'], s['client_id']) for s in map(snapshot, ventes)})
+    written = 0
+    with transaction.atomic():
+        # 3 parameters per key, twice: stay under SQLite's limit
+        for start in range(0, len(cles), batch_size):
+            lignes, sources = Q(), Q()
+            for jour, stock_id, client_id in cles[start:start + batch_size]:
+                lignes |= Q(jour=jour, stock_id=stock_id, client_id=client_id)
+                sources |= Q(date_vente=jour, stock_id=stock_id, client_id=client_id)
+            VenteJournaliere.objects.filter(lignes).delete()
+            written += len(VenteJournaliere.objects.bulk_create(_lignes(Vente.objects.filter(sources), batch_size)))
+    return written
+
+
+def rebuild(start=None, end=None, batch_size=1000):
+    """Recompute the rollup from `Vente`, optionally limited to a day range.
+
+    Returns the number of rollup rows written.
+    """
+    ventes = Vente.objects.all()
+    existing = VenteJournaliere.objects.all()
+    if start:
+        ventes = ventes.filter(date_vente__gte=start)
+        existing = existing.filter(jour__gte=start)
+    if end:
+        ventes = ventes.filter(date_vente__lte=end)
+        existing = existing.filter(jour__lte=end)
+
+    written = 0
+    with transaction.atomic():
+        existing.delete()
+        batch = []
+        for ligne in _lignes(ventes, batch_size):
+            batch.append(ligne)
+            if len(batch) >= batch_size:
+                VenteJournaliere.objects.bulk_create(batch)
+                written += len(batch)
+                batch = []
+        if batch:
+            VenteJournaliere.objects.bulk_create(batch)
+            written += len(batch)
+    return written
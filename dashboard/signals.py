@@ -0,0 +1,137 @@
+import threading
+
+from django.apps import apps
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from core.signals import bulk_changed
+from producteurs import fruits
+from producteurs.models import Recolte
+from stock.models import StockMovement
+from vente.models import Vente
+from . import cache, events, rollup
+
+
+#---------------------------- Cumul journalier des ventes ---------------------------
+
+@receiver(pre_save, sender=Vente)
+def _remember_vente(sender, instance, raw=False, **kwargs):
+    """Keep the stored state of an updated vente so its old key can be decremented."""
+    instance._rollup_old = None
+    if raw or not instance.pk:
+        return
+    old = Vente.objects.filter(pk=instance.pk).first()
+    if old is not None:
+        instance._rollup_old = rollup.snapshot(old)
+
+
+@receiver(post_save, sender=Vente)
+def _rollup_vente_saved(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    with transaction.atomic():
+        old = getattr(instance, '_rollup_old', None)
+        if old is not None:
+            rollup.apply(old, -1)
+        rollup.apply(rollup.snapshot(instance), 1)
+    instance._rollup_old = None
+
+
+@receiver(post_delete, sender=Vente)
+def _rollup_vente_deleted(sender, instance, **kwargs):
+    rollup.apply(rollup.snapshot(instance), -1)
+
+
+@receiver(bulk_changed, sender=Vente)
+def _rollup_ventes_bulk(sender, instances, **kwargs):
+    rollup.recalculer(instances)
+
+
+#---------------------------- Générations du cache ---------------------------
+
+# labels changed in the current thread's transaction, not bumped yet; a
+# cascade delete sends one post_delete per row but needs a single bump
+_pending = threading.local()
+
+
+def _flush_generations():
+    labels = getattr(_pending, 'labels', None)
+    if labels:
+        _pending.labels = set()
+        with transaction.atomic():
+            cache.bump(*sorted(labels))
+
+
+def _bump_generation(sender, **kwargs):
+    if not hasattr(_pending, 'labels'):
+        _pending.labels = set()
+    _pending.labels.add(cache.model_label(sender))
+    # bump once the data is committed so a recompute cannot read the old rows;
+    # after a rollback the leftover labels are bumped with the next commit,
+    # which only costs an extra invalidation
+    transaction.on_commit(_flush_generations)
+
+
+for _label in cache.TRACKED_MODELS:
+    _model = apps.get_model(_label)
+    post_save.connect(_bump_generation, sender=_model, dispatch_uid=f'dashboard_gen_save_{_label}')
+    post_delete.connect(_bump_generation, sender=_model, dispatch_uid=f'dashboard_gen_delete_{_label}')
+    bulk_changed.connect(_bump_generation, sender=_model, dispatch_uid=f'dashboard_gen_bulk_{_label}')
+
+
+#---------------------------- Évènements live (SSE) ---------------------------
+
+def _publish_on_commit(event, data):
+    transaction.on_commit(lambda: events.broadcaster.publish(event, data))
+
+
+@receiver(post_save, sender=Vente)
+def _live_vente(sender, instance, created, raw=False, **kwargs):
+    if raw or not created:
+        return
+    _publish_on_commit('vente', {
+        'id': instance.id,
+        'date': rollup.snapshot(instance)['jour'].isoformat(),
+        'client': str(instance.client),
+        'produit': instance.stock.produit,
+        'montant': float(instance.montant_total or 0),
+        'quantite': float(instance.quantite_vendue or 0),
+    })
+
+
+@receiver(post_save, sender=StockMovement)
+def _live_stock_movement(sender, instance, created, raw=False, **kwargs):
+    if raw or not created:
+        return
+    stock = instance.stock
+    _publish_on_commit('stock', {
+        'stock_id': stock.id,
+        'produit': stock.produit,
+        'change': float(instance.change or 0),
+        'quantite_disponible': float(stock.quantite_disponible or 0),
+        'reason': instance.reason,
+    })
+
+
+def _recolte_event(recolte):
+    return {'id': recolte.id, 'fruit': fruits.nom(recolte.fruit_id), 'quantite': float(recolte.quantite or 0)}
+
+
+@receiver(post_save, sender=Recolte)
+def _live_recolte(sender, instance, created, raw=False, **kwargs):
+    if raw or not created:
+        return
+    _publish_on_commit('recolte', _recolte_event(instance))
+
+
+# beyond this many rows (imports) per-row events would only flood the clients
+LIVE_BULK_MAX = 50
+
+
+@receiver(bulk_changed, sender=Recolte)
+def _live_recoltes_bulk(sender, instances, action, **kwargs):
+    if action != 'create' or len(instances) > LIVE_BULK_MAX:
+        return
+    for recolte in instances:
+        _publish_on_commit('recolte', _recolte_event(recolte))
@@ -1,3 +1,377 @@
-from django.test import TestCase
+import asyncio
+import threading
+import time
+from datetime import date, timedelta
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from django.core.cache import cache as django_cache
+from django.db import connection, transaction
+from django.test import RequestFactory, TestCase, TransactionTestCase
+from django.urls import reverse
+
+from core.signals import bulk_changed
+from producteurs.models import Fruit, Parcelle, Producteur, Recolte
+from stock.models import Stock
+from transformation.models import Transformation
+from vente.models import Client, Vente
+
+from . import cache, events, rollup, signals, views, widgets
+from .models import VenteJournaliere
+
+
+def creer_stocks(n=2):
+    producteur = Producteur.objects.create(nom='Camara', prenom='Alpha', adresse='Kindia', telephone='622000001')
+    parcelle = Parcelle.objects.create(nom='P1', superficie=2, adresse='Kindia', producteur=producteur)
+    recolte = Recolte.objects.create(fruit=Fruit.objects.create(nom='Mangue'), quantite=500,
+                                     date_recolte=date(2026, 6, 1), producteur=producteur, parcelle=parcelle)
+    lot = Transformation.objects.create(code_lot='LOT-1', recolte=recolte, etape='CONDITIONNEMENT',
+                                        quantite_depart=500, quantite_finale=100,
+                                        date_debut=date(2026, 6, 2), date_fin=date(2026, 6, 5))
+    return [
+        Stock.objects.create(lot=lot, produit=f'Produit {i}', quantite_disponible=1000, unite_mesure='KG',
+                             date_mise_a_jour=date(2026, 6, 5))
+        for i in range(n)
+    ]
+
+
+def creer_clients(n=2):
+    return [
+        Client.objects.create(nom='Diallo', prenom='Fatou', adresse='Conakry',
+                              telephone=f'62400000{i}', email=f'client{i}@example.com')
+        for i in range(n)
+    ]
+
+
+def vente(stock, client, jour, quantite=2, prix=10):
+    return Vente(client=client, stock=stock, quantite_vendue=quantite, prix_unitaire=prix, date_vente=jour,
+                 montant_total=quantite * prix)
+
+
+#------ Cumul journalier des ventes ------
+
+class RollupTests(TestCase):
+
+    def setUp(self):
+        self.stocks = creer_stocks()
+        self.clients = creer_clients()
+
+    def _cumul(self):
+        return {
+            (r.jour, r.stock_id, r.client_id): (r.chiffre_affaires, r.quantite, r.nombre_ventes)
+            for r in VenteJournaliere.objects.all()
+        }
+
+    def assertCumulExact(self):
+        attendu = {}
+        for v in Vente.objects.all():
+            ca, qte, n = attendu.get((v.date_vente, v.stock_id, v.client_id), (Decimal(0), 0.0, 0))
+            attendu[(v.date_vente, v.stock_id, v.client_id)] = (ca + v.montant_total, qte + v.quantite_vendue, n + 1)
+        self.assertEqual(self._cumul(), attendu)
+
+    def test_creation(self):
+        jour = date(2026, 6, 10)
+        vente(self.stocks[0], self.clients[0], jour).save()
+        vente(self.stocks[0], self.clients[0], jour, quantite=3, prix=5).save()
+        vente(self.stocks[1], self.clients[0], jour).save()
+        self.assertEqual(self._cumul()[(jour, self.stocks[0].id, self.clients[0].id)], (Decimal('35'), 5.0, 2))
+        self.assertCumulExact()
+
+    def test_modification(self):
+        v = vente(self.stocks[0], self.clients[0], date(2026, 6, 10))
+        v.save()
+        autre = vente(self.stocks[0], self.clients[0], date(2026, 6, 10))
+        autre.save()
+        v.quantite_vendue, v.montant_total = 4, 40
+        v.save()
+        self.assertCumulExact()
+        # each field of the key moves the vente to another row
+        for champ, valeur in (('stock', self.stocks[1]), ('client', self.clients[1]), ('date_vente', date(2026, 6, 11))):
+            with self.subTest(champ=champ):
+                setattr(v, champ, valeur)
+                v.save()
+                self.assertCumulExact()
+        # the date as the views assign it, a raw POST string
+        v.date_vente = '2026-06-12'
+        v.save()
+        self.assertIn((date(2026, 6, 12), self.stocks[1].id, self.clients[1].id), self._cumul())
+        self.assertEqual(len(self._cumul()), 2)
+
+    def test_suppression(self):
+        ventes = [vente(self.stocks[0], self.clients[0], date(2026, 6, 10)) for _ in range(2)]
+        for v in ventes:
+            v.save()
+        ventes[0].delete()
+        self.assertCumulExact()
+        ventes[1].delete()
+        self.assertFalse(VenteJournaliere.objects.exists())
+
+    def test_suppression_en_cascade(self):
+        vente(self.stocks[0], self.clients[0], date(2026, 6, 10)).save()
+        vente(self.stocks[1], self.clients[1], date(2026, 6, 10)).save()
+        self.clients[0].delete()
+        self.assertCumulExact()
+        self.assertEqual(len(self._cumul()), 1)
+
+    def test_ecritures_en_masse(self):
+        vente(self.stocks[0], self.clients[0], date(2026, 6, 10)).save()
+        creees = Vente.objects.bulk_create([
+            vente(self.stocks[i % 2], self.clients[0], date(2026, 6, 10 + i % 3), quantite=i + 1)
+            for i in range(12)
+        ])
+        bulk_changed.send(sender=Vente, instances=creees, action='create')
+        self.assertCumulExact()
+
+        supprimees = list(Vente.objects.filter(stock=self.stocks[0]))
+        Vente.objects.filter(stock=self.stocks[0]).delete()
+        bulk_changed.send(sender=Vente, instances=supprimees, action='delete')
+        self.assertCumulExact()
+        self.assertFalse(VenteJournaliere.objects.filter(stock=self.stocks[0]).exists())
+
+    def test_recalculer_egale_rebuild(self):
+        for i in range(6):
+            vente(self.stocks[i % 2], self.clients[i % 2], date(2026, 6, 10 + i % 2), quantite=i + 1).save()
+        VenteJournaliere.objects.update(nombre_ventes=99)
+        rollup.recalculer(Vente.objects.all())
+        self.assertCumulExact()
+        VenteJournaliere.objects.all().delete()
+        rollup.rebuild()
+        self.assertCumulExact()
+
+
+#------ Cache versionné ------
+
+class CacheTests(TestCase):
+
+    def setUp(self):
+        django_cache.clear()
+
+    def _generation(self, label):
+        return cache.generations([label])[0]
+
+    def test_generation_au_commit(self):
+        avant = self._generation('vente.Client')
+        with self.captureOnCommitCallbacks(execute=True):
+            clients = creer_clients(3)
+            # not before the commit: a recompute would read the old rows
+            self.assertEqual(self._generation('vente.Client'), avant)
+        self.assertEqual(self._generation('vente.Client'), avant + 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            clients[0].delete()
+        self.assertEqual(self._generation('vente.Client'), avant + 2)
+
+    def test_pas_de_generation_apres_rollback(self):
+        self.addCleanup(lambda: getattr(signals._pending, 'labels', set()).clear())
+        avant = self._generation('vente.Client')
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            try:
+                with transaction.atomic():
+                    creer_clients(1)
+                    raise RuntimeError
+            except RuntimeError:
+                pass
+        self.assertEqual(callbacks, [])
+        self.assertEqual(self._generation('vente.Client'), avant)
+
+    def test_cle_suit_les_generations(self):
+        calculs = []
+
+        def calcul():
+            calculs.append(1)
+            return len(calculs)
+
+        self.assertEqual(cache.cached('test', (1,), calcul), 1)
+        self.assertEqual(cache.cached('test', (1,), calcul), 1)
+        self.assertEqual(cache.cached('test', (2,), calcul), 2)
+        cache.bump('vente.Vente')
+        self.assertEqual(cache.cached('test', (1,), calcul), 3)
+        # a model outside depends_on leaves the entry valid
+        self.assertEqual(cache.cached('autre', (), calcul, depends_on=['vente.Client']), 4)
+        cache.bump('vente.Vente')
+        self.assertEqual(cache.cached('autre', (), calcul, depends_on=['vente.Client']), 4)
+
+    def test_verrou_sert_la_valeur_precedente(self):
+        cache.cached('test', (), lambda: 'ancienne', version=(1,))
+        # another worker holds the lock of the new version
+        with mock.patch.object(cache.cache, 'add', return_value=False):
+            entree = cache.cached_entry('test', (), lambda: self.fail("recalcul en double"), version=(2,))
+        self.assertEqual(entree, ((1,), 'ancienne'))
+
+    def test_verrou_sans_valeur_precedente(self):
+        # nothing to serve: wait LOCK_WAIT, then compute without the lock
+        with mock.patch.object(cache.cache, 'add', return_value=False), mock.patch.object(cache, 'LOCK_WAIT', 0.1):
+            self.assertEqual(cache.cached('test', (), lambda: 'calculée', version=(1,)), 'calculée')
+
+    def test_un_seul_calcul_concurrent(self):
+        calculs, resultats = [], []
+
+        def calcul():
+            calculs.append(1)
+            time.sleep(0.3)
+            return 'valeur'
+
+        def lecteur():
+            resultats.append(cache.cached('lent', (), calcul, version=(1,)))
+
+        threads = [threading.Thread(target=lecteur) for _ in range(5)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(len(calculs), 1)
+        self.assertEqual(resultats, ['valeur'] * 5)
+
+
+#------ Widgets JSON et ETag ------
+
+class WidgetTests(TestCase):
+
+    def setUp(self):
+        django_cache.clear()
+        self.url = reverse('dashboard_widget', args=['counts'])
+
+    def test_etag_et_304(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['data']['clients'], 0)
+        etag = response['ETag']
+        self.assertTrue(etag)
+        self.assertIn('must-revalidate', response['Cache-Control'])
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+
+    def test_etag_change_apres_ecriture(self):
+        etag = self.client.get(self.url)['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            creer_clients(1)
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(response.json()['data']['clients'], 1)
+
+    def test_etag_depend_de_la_periode(self):
+        # top_products reads the selected period, counts does not
+        url = reverse('dashboard_widget', args=['top_products'])
+        self.assertNotEqual(self.client.get(url, {'period': '7d'})['ETag'],
+                            self.client.get(url, {'period': '90d'})['ETag'])
+        self.assertEqual(self.client.get(self.url, {'period': '7d'})['ETag'],
+                         self.client.get(self.url, {'period': '90d'})['ETag'])
+
+    def test_widget_inconnu(self):
+        self.assertEqual(self.client.get(reverse('dashboard_widget', args=['inconnu'])).status_code, 404)
+
+
+#------ Vue async : widgets en parallèle ------
+
+class GatherTests(TestCase):
+
+    def test_widgets_en_parallele(self):
+        # every widget waits for all the others: run one after the other they would time out
+        barriere = threading.Barrier(3, timeout=5)
+        threads = []
+
+        def widget(start_date, end_date):
+            threads.append(threading.get_ident())
+            barriere.wait()
+            return threading.get_ident()
+
+        faux = {name: (widget, [], False) for name in ('a', 'b', 'c')}
+        with mock.patch.dict(widgets.WIDGETS, faux, clear=True):
+            resultats = asyncio.run(widgets.gather_widgets(['a', 'b', 'c'], '30d', date(2026, 6, 1),
+                                                           date(2026, 6, 30), use_cache=False))
+        self.assertEqual(list(resultats), ['a', 'b', 'c'])
+        self.assertEqual(len(set(threads)), 3)
+        self.assertNotIn(threading.get_ident(), threads)
+
+
+class DashboardAsyncTests(TransactionTestCase):
+    """The widgets run on their own connections: the data must be committed."""
+
+    def setUp(self):
+        if connection.vendor == 'sqlite' and connection.is_in_memory_db():
+            self.skipTest("base de test en mémoire : une seule connexion")
+        django_cache.clear()
+        stocks, clients = creer_stocks(), creer_clients()
+        for i in range(5):
+            vente(stocks[i % 2], clients[i % 2], date.today(), quantite=i + 1).save()
+
+    def test_memes_resultats_que_la_vue_sync(self):
+        fin = date.today()
+        debut = fin - timedelta(days=30)
+        names = list(widgets.WIDGETS)
+        attendu = {name: widgets.WIDGETS[name][0](debut, fin) for name in names}
+        for use_cache in (False, True):
+            with self.subTest(use_cache=use_cache):
+                self.assertEqual(asyncio.run(widgets.gather_widgets(names, '30d', debut, fin, use_cache)), attendu)
+
+    async def test_vue(self):
+        response = await self.async_client.get(reverse('home_async'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(set(response.context['preloaded']), set(widgets.WIDGETS))
+        self.assertEqual(response.context['preloaded']['counts']['ventes'], 5)
+        self.assertTrue(response.context['live_stream'])
+
+
+#------ Évènements live (SSE) ------
+
+class EvenementsTests(TestCase):
+
+    def setUp(self):
+        self.stocks, self.clients = creer_stocks(1), creer_clients(1)
+        self.abonne = events.broadcaster.subscribe()
+        self.addCleanup(events.broadcaster.unsubscribe, self.abonne)
+
+    def test_ecriture_validee(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            v = vente(self.stocks[0], self.clients[0], date(2026, 6, 10))
+            v.save()
+            # nothing before the commit
+            self.assertIsNone(self.abonne.get(0))
+        message = self.abonne.get(0)
+        self.assertIn("event: vente\n", message)
+        self.assertIn(f'"id": {v.id}', message)
+        self.assertTrue(message.endswith("\n\n"))
+
+    def test_ecriture_annulee(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            try:
+                with transaction.atomic():
+                    vente(self.stocks[0], self.clients[0], date(2026, 6, 10)).save()
+                    raise RuntimeError
+            except RuntimeError:
+                pass
+        self.assertIsNone(self.abonne.get(0.05))
+
+    def test_format(self):
+        self.assertEqual(events.format_event('stock', {'change': -2}, 7),
+                         'id: 7\nevent: stock\ndata: {"change": -2}\n\n')
+
+    def test_vue_flux(self):
+        response = views.stream(RequestFactory().get(reverse('dashboard_stream')))
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        self.assertEqual(response['Cache-Control'], 'no-cache')
+        self.assertTrue(response.streaming)
+
+    def test_flux_wsgi(self):
+        abonnes = events.broadcaster.subscriber_count
+        flux = views._stream_sync()
+        with mock.patch.object(views, 'STREAM_HEARTBEAT', 0.05):
+            self.assertTrue(next(flux).startswith('retry: '))
+            self.assertEqual(events.broadcaster.subscriber_count, abonnes + 1)
+            events.broadcaster.publish('vente', {'id': 1})
+            self.assertIn('event: vente\ndata: {"id": 1}\n\n', next(flux))
+            self.assertEqual(next(flux), ': keep-alive\n\n')
+        flux.close()
+        self.assertEqual(events.broadcaster.subscriber_count, abonnes)
+
+    async def test_flux_asgi(self):
+        flux = views._stream_async()
+        self.assertEqual(await flux.__anext__(), "retry: 3000\n\n")
+        # published from a worker thread, as on_commit callbacks of sync views are
+        publication = threading.Thread(target=events.broadcaster.publish, args=('stock', {'stock_id': 3}))
+        publication.start()
+        publication.join()
+        self.assertIn('data: {"stock_id": 3}', await asyncio.wait_for(flux.__anext__(), 2))
+        await flux.aclose()
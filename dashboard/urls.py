@@ -5,4 +5,10 @@ from . import views
 urlpatterns = [
     # move dashboard to /dashboard/ so root ('/') can be used for login without conflict
     path('dashboard/', views.dashboard, name='home'),
+    # same page with every widget computed concurrently server-side (serve under ASGI)
+    path('dashboard/async/', views.dashboard_async, name='home_async'),
+    # one JSON endpoint per widget, fetched in parallel by the dashboard page
+    path('dashboard/api/<slug:name>/', views.widget, name='dashboard_widget'),
+    # Server-Sent Events pushing live deltas to the open dashboards
+    path('dashboard/stream/', views.stream, name='dashboard_stream'),
 ]
@@ -1,34 +1,30 @@
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
 from django.shortcuts import render
-from django.db.models import Sum, Count
-from django.db.models.functions import TruncMonth
-import calendar
+from django.http import Http404, JsonResponse, StreamingHttpResponse
+from django.utils.cache import patch_cache_control
+from django.utils.http import quote_etag
+from django.views.decorators.http import condition, require_GET
 from datetime import date, timedelta, datetime
-import json
-
-# Import models for dashboard metrics
-from producteurs.models import Producteur, Parcelle, Recolte
-from transformation.models import Transformation
-from stock.models import Stock
-from vente.models import Client, Vente, Facture
 
+from . import cache as dashboard_cache
+from . import events, widgets
 
-def dashboard(request):
-	"""Render a richer dashboard with detailed statistics and charts."""
-	counts = {
-		'producteurs': Producteur.objects.count(),
-		'parcelles': Parcelle.objects.count(),
-		'recoltes': Recolte.objects.count(),
-		'transformations': Transformation.objects.count(),
-		'stocks': Stock.objects.count(),
-		'ventes': Vente.objects.count(),
-		'clients': Client.objects.count(),
-		'factures': Facture.objects.count(),
-	}
+# keep-alive comment interval and maximum lifetime of a live stream (seconds);
+# EventSource reconnects by itself when the server closes the stream
+STREAM_HEARTBEAT = 15
+STREAM_MAX_AGE = getattr(settings, 'DASHBOARD_STREAM_MAX_AGE', 300)
+# under WSGI a stream holds a worker: the page polls the widgets instead
+# (ETag revalidations), and a stream opened anyway is short-lived
+STREAM_WSGI_MAX_AGE = getattr(settings, 'DASHBOARD_STREAM_WSGI_MAX_AGE', 20)
+POLL_INTERVAL = getattr(settings, 'DASHBOARD_POLL_INTERVAL', 60)
 
-	recent_ventes = Vente.objects.select_related('client', 'stock').order_by('-date_vente')[:8]
-	recent_transformations = Transformation.objects.select_related('recolte').order_by('-date_debut')[:8]
 
-	# determine period for top-products
+def _period_bounds(request):
+	"""Return (period, start_date, end_date) from the `period`/`start`/`end` GET params."""
 	period = request.GET.get('period', '30d')
 	start_param = request.GET.get('start')
 	end_param = request.GET.get('end')
@@ -54,131 +50,127 @@ def dashboard(request):
 		else:  # default 30d
 			start_date = end_date - timedelta(days=30)
 
-	# Top products by revenue and quantity within the selected period
-	sales_by_product_qs = (
-		Vente.objects.filter(date_vente__gte=start_date, date_vente__lte=end_date)
-		.values('stock__produit')
-		.annotate(total_revenue=Sum('montant_total'), total_qty=Sum('quantite_vendue'))
-		.order_by('-total_revenue')[:10]
-	)
-	sales_by_product = [
-		{
-			'produit': item['stock__produit'],
-			'revenue': float(item['total_revenue'] or 0),
-			'quantity': float(item['total_qty'] or 0),
-		}
-		for item in sales_by_product_qs
-	]
-
-	# Stocks aggregated by product
-	stock_by_product_qs = (
-		Stock.objects.values('produit')
-		.annotate(total_stock=Sum('quantite_disponible'))
-		.order_by('-total_stock')[:12]
-	)
-	stock_by_product = [
-		{'produit': item['produit'], 'stock': float(item['total_stock'] or 0)}
-		for item in stock_by_product_qs
-	]
-
-	# Transformations count by étape
-	transformations_by_step_qs = (
-		Transformation.objects.values('etape')
-		.annotate(count=Count('id'))
-	)
-	transformations_by_step = [
-		{'etape': item['etape'], 'count': item['count']}
-		for item in transformations_by_step_qs
-	]
-
-	# Harvests by fruit
-	harvests_by_fruit_qs = (
-		Recolte.objects.values('fruit')
-		.annotate(total=Sum('quantite'))
-		.order_by('-total')[:10]
-	)
-	harvests_by_fruit = [
-		{'fruit': item['fruit'], 'quantite': float(item['total'] or 0)}
-		for item in harvests_by_fruit_qs
-	]
-
-	# Monthly sales for last 12 months
-	today = date.today()
-	start_month = (today.replace(day=1) - timedelta(days=365)).replace(day=1)
-	monthly_qs = (
-		Vente.objects.filter(date_vente__gte=start_month)
-		.annotate(month=TruncMonth('date_vente'))
-		.values('month')
-		.annotate(total=Sum('montant_total'))
-		.order_by('month')
-	)
-	# Build full 12-month labels and values
-	months = []
-	values = []
-	# monthly_qs 'month' may be a datetime or a date depending on DB/backend.
-	# Normalize to date objects for consistent lookup against `cur` (a date).
-	month_map = {}
-	for item in monthly_qs:
-		m = item.get('month')
-		if m is None:
-			continue
-		# If it's a datetime, convert to date(); if it's already a date, keep as-is.
-		try:
-			month_key = m.date() if hasattr(m, 'date') else m
-		except Exception:
-			month_key = m
-		month_map[month_key] = float(item.get('total') or 0)
-	# create ordered month list
-	cur = start_month
-	while cur <= today:
-		months.append(cur.strftime('%b %Y'))
-		values.append(month_map.get(cur, 0.0))
-		# move to next month
-		if cur.month == 12:
-			cur = cur.replace(year=cur.year+1, month=1)
-		else:
-			cur = cur.replace(month=cur.month+1)
+	return period, start_date, end_date
 
-	# Top clients by revenue
-	top_clients_qs = (
-		Vente.objects.values('client__nom', 'client__prenom')
-		.annotate(total_revenue=Sum('montant_total'))
-		.order_by('-total_revenue')[:8]
-	)
-	top_clients = [
-		{'client': f"{c['client__nom']} {c['client__prenom']}", 'revenue': float(c['total_revenue'] or 0)}
-		for c in top_clients_qs
-	]
 
+def dashboard(request):
+	"""Render the dashboard shell; widgets are fetched in parallel from `dashboard_widget`."""
+	period, start_date, end_date = _period_bounds(request)
 	context = {
-		'counts': counts,
-		'recent_ventes': recent_ventes,
-		'recent_transformations': recent_transformations,
-		'sales_by_product': sales_by_product,
-		'stock_by_product': stock_by_product,
-		'transformations_by_step': transformations_by_step,
-		'harvests_by_fruit': harvests_by_fruit,
-		'monthly_sales_labels': months,
-		'monthly_sales_values': values,
-		'top_clients': top_clients,
-		# period info for UI
 		'period': period,
 		'start_date': start_date,
 		'end_date': end_date,
+		'widget_names': list(widgets.WIDGETS),
+		'live_stream': isinstance(request, ASGIRequest),
+		'poll_interval': POLL_INTERVAL,
 	}
+	return render(request, 'dashboard/dashboard.html', context)
 
-	# JSON serialized arrays for safe injection into JS
-	context.update({
-		'sales_labels_json': json.dumps([p['produit'] for p in sales_by_product]),
-		'sales_revenue_json': json.dumps([p['revenue'] for p in sales_by_product]),
-		'monthly_labels_json': json.dumps(months),
-		'monthly_values_json': json.dumps(values),
-		'stock_labels_json': json.dumps([s['produit'] for s in stock_by_product]),
-		'stock_values_json': json.dumps([s['stock'] for s in stock_by_product]),
-		'trans_labels_json': json.dumps([t['etape'] for t in transformations_by_step]),
-		'trans_values_json': json.dumps([t['count'] for t in transformations_by_step]),
-		'harvest_labels_json': json.dumps([h['fruit'] for h in harvests_by_fruit]),
-		'harvest_values_json': json.dumps([h['quantite'] for h in harvests_by_fruit]),
-	})
 
-	return render(request, 'dashboard/dashboard.html', context)
+def _widget_version(request, name):
+	"""Read (once per request) the cache parameters and generations of a widget."""
+	if not hasattr(request, '_widget_version'):
+		if name not in widgets.WIDGETS:
+			request._widget_version = None
+		else:
+			period, start_date, end_date = _period_bounds(request)
+			params = widgets.cache_params(name, period, start_date, end_date)
+			version = dashboard_cache.generations(widgets.WIDGETS[name][1])
+			request._widget_version = (params, version, start_date, end_date)
+	return request._widget_version
+
+
+def _widget_etag(request, name):
+	info = _widget_version(request, name)
+	if info is None:
+		return None
+	params, version = info[0], info[1]
+	return dashboard_cache.etag(name, params, version)
+
+
+@require_GET
+@condition(etag_func=_widget_etag)
+def widget(request, name):
+	"""JSON data of one dashboard widget, cached and served with an ETag (304 when unchanged)."""
+	info = _widget_version(request, name)
+	if info is None:
+		raise Http404("Widget inconnu")
+	params, version, start_date, end_date = info
+	func, depends_on, _ = widgets.WIDGETS[name]
+	served_version, data = dashboard_cache.cached_entry(
+		f'widget:{name}',
+		params,
+		lambda: func(start_date, end_date),
+		depends_on=depends_on,
+		version=version,
+	)
+	response = JsonResponse({'widget': name, 'data': data})
+	# a stale value served during a recompute must not carry the fresh ETag
+	response['ETag'] = quote_etag(dashboard_cache.etag(name, params, served_version))
+	# let browsers keep the body but revalidate it with the ETag every time
+	patch_cache_control(response, private=True, max_age=0, must_revalidate=True)
+	return response
+
+
+async def dashboard_async(request):
+	"""Async dashboard: every widget is computed concurrently and embedded in the page.
+
+	Meant to be served under ASGI (see AB/asgi.py); wall-clock latency then
+	tracks the slowest widget instead of the sum of all of them.
+	"""
+	period, start_date, end_date = _period_bounds(request)
+	names = list(widgets.WIDGETS)
+	preloaded = await widgets.gather_widgets(names, period, start_date, end_date)
+	context = {
+		'period': period,
+		'start_date': start_date,
+		'end_date': end_date,
+		'widget_names': names,
+		'preloaded': preloaded,
+		'live_stream': isinstance(request, ASGIRequest),
+		'poll_interval': POLL_INTERVAL,
+	}
+	# templates read request.user (session lookup), which must stay synchronous
+	return await sync_to_async(render)(request, 'dashboard/dashboard.html', context)
+
+
+def _stream_sync():
+	subscriber = events.broadcaster.subscribe()
+	deadline = time.monotonic() + STREAM_WSGI_MAX_AGE
+	try:
+		# short stream, slow reconnects: a worker is not parked on each open tab
+		yield f"retry: {POLL_INTERVAL * 1000}\n\n"
+		while time.monotonic() < deadline:
+			message = subscriber.get(STREAM_HEARTBEAT)
+			yield message if message is not None else ": keep-alive\n\n"
+	finally:
+		events.broadcaster.unsubscribe(subscriber)
+
+
+async def _stream_async():
+	subscriber = events.broadcaster.subscribe_async()
+	deadline = time.monotonic() + STREAM_MAX_AGE
+	try:
+		yield "retry: 3000\n\n"
+		while time.monotonic() < deadline:
+			message = await subscriber.get(STREAM_HEARTBEAT)
+			yield message if message is not None else ": keep-alive\n\n"
+	finally:
+		events.broadcaster.unsubscribe(subscriber)
+
+
+@require_GET
+def stream(request):
+	"""Server-Sent Events stream of live deltas (new sales, stock movements, harvests).
+
+	Under ASGI the stream is an async generator and costs no thread. Under
+	WSGI each open stream holds a worker, so the dashboard page does not
+	open it (it polls the widgets instead) and a stream opened anyway ends
+	after DASHBOARD_STREAM_WSGI_MAX_AGE seconds.
+	"""
+	generator = _stream_async() if isinstance(request, ASGIRequest) else _stream_sync()
+	response = StreamingHttpResponse(generator, content_type='text/event-stream')
+	response['Cache-Control'] = 'no-cache'
+	# disable proxy buffering (nginx / Render) so events are delivered immediately
+	response['X-Accel-Buffering'] = 'no'
+	return response
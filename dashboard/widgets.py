@@ -0,0 +1,210 @@
+"""Calcul des widgets du tableau de bord.
+
+Chaque widget est une fonction indépendante qui renvoie des données
+sérialisables en JSON. `WIDGETS` associe le nom du widget (utilisé dans
+l'URL `dashboard/api/<nom>/`) à sa fonction, aux modèles dont il dépend (pour
+l'invalidation du cache) et à l'usage ou non de la période sélectionnée.
+"""
+import asyncio
+from datetime import date, timedelta
+
+from asgiref.sync import sync_to_async
+from django.db import close_old_connections
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncMonth
+
+from producteurs import fruits
+from producteurs.models import Producteur, Parcelle, Recolte
+from transformation.models import Transformation
+from stock.models import Stock
+from vente.models import Client, Vente, Facture
+from .models import VenteJournaliere
+from . import cache as dashboard_cache
+
+
+def counts(start_date, end_date):
+    return {
+        'producteurs': Producteur.objects.count(),
+        'parcelles': Parcelle.objects.count(),
+        'recoltes': Recolte.objects.count(),
+        'transformations': Transformation.objects.count(),
+        'stocks': Stock.objects.count(),
+        'ventes': Vente.objects.count(),
+        'clients': Client.objects.count(),
+        'factures': Facture.objects.count(),
+    }
+
+
+def recent_ventes(start_date, end_date):
+    ventes = Vente.objects.select_related('client', 'stock').order_by('-date_vente')[:8]
+    return [
+        {
+            'id': v.id,
+            'date': v.date_vente.isoformat(),
+            'client': str(v.client),
+            'produit': v.stock.produit,
+            'montant': float(v.montant_total),
+        }
+        for v in ventes
+    ]
+
+
+def top_products(start_date, end_date):
+    # Sales aggregates read the daily rollup (one row per day/stock/client)
+    # instead of scanning the whole Vente table.
+    qs = (
+        VenteJournaliere.objects.filter(jour__gte=start_date, jour__lte=end_date)
+        .values('stock__produit')
+        .annotate(total_revenue=Sum('chiffre_affaires'), total_qty=Sum('quantite'))
+        .order_by('-total_revenue')[:10]
+    )
+    return [
+        {
+            'produit': item['stock__produit'],
+            'revenue': float(item['total_revenue'] or 0),
+            'quantity': float(item['total_qty'] or 0),
+        }
+        for item in qs
+    ]
+
+
+def stock_by_product(start_date, end_date):
+    qs = (
+        Stock.objects.values('produit')
+        .annotate(total_stock=Sum('quantite_disponible'))
+        .order_by('-total_stock')[:12]
+    )
+    return [{'produit': item['produit'], 'stock': float(item['total_stock'] or 0)} for item in qs]
+
+
+def transformations_by_step(start_date, end_date):
+    # distributions, outliers and throughput: transformation/statistiques.py
+    qs = Transformation.objects.values('etape').annotate(
+        count=Count('id'), depart=Sum('quantite_depart'), finale=Sum('quantite_finale'),
+    )
+    return [
+        {
+            'etape': item['etape'],
+            'count': item['count'],
+            'rendement': round(100 * item['finale'] / item['depart'], 1) if item['depart'] else None,
+        }
+        for item in qs
+    ]
+
+
+def harvests_by_fruit(start_date, end_date):
+    # grouped on the integer key (fruit, quantite index), names from the cached catalog
+    qs = (
+        Recolte.objects.values('fruit_id')
+        .annotate(total=Sum('quantite'))
+        .order_by('-total')[:10]
+    )
+    return [{'fruit': fruits.nom(item['fruit_id']), 'quantite': float(item['total'] or 0)} for item in qs]
+
+
+def monthly_sales(start_date, end_date):
+    """Sales totals for the last 12 months, with empty months filled with 0."""
+    today = date.today()
+    start_month = (today.replace(day=1) - timedelta(days=365)).replace(day=1)
+    qs = (
+        VenteJournaliere.objects.filter(jour__gte=start_month)
+        .annotate(month=TruncMonth('jour'))
+        .values('month')
+        .annotate(total=Sum('chiffre_affaires'))
+        .order_by('month')
+    )
+    # 'month' may be a datetime or a date depending on DB/backend.
+    month_map = {}
+    for item in qs:
+        m = item.get('month')
+        if m is None:
+            continue
+        month_key = m.date() if hasattr(m, 'date') else m
+        month_map[month_key] = float(item.get('total') or 0)
+
+    labels = []
+    values = []
+    cur = start_month
+    while cur <= today:
+        labels.append(cur.strftime('%b %Y'))
+        values.append(month_map.get(cur, 0.0))
+        if cur.month == 12:
+            cur = cur.replace(year=cur.year + 1, month=1)
+        else:
+            cur = cur.replace(month=cur.month + 1)
+    return {'labels': labels, 'values': values}
+
+
+def top_clients(start_date, end_date):
+    qs = (
+        VenteJournaliere.objects.values('client__nom', 'client__prenom')
+        .annotate(total_revenue=Sum('chiffre_affaires'))
+        .order_by('-total_revenue')[:8]
+    )
+    return [
+        {'client': f"{c['client__nom']} {c['client__prenom']}", 'revenue': float(c['total_revenue'] or 0)}
+        for c in qs
+    ]
+
+
+# name -> (function, models it depends on, uses the selected period)
+WIDGETS = {
+    'counts': (counts, [
+        'producteurs.Producteur', 'producteurs.Parcelle', 'producteurs.Recolte',
+        'transformation.Transformation', 'stock.Stock', 'vente.Client', 'vente.Vente', 'vente.Facture',
+    ], False),
+    'recent_ventes': (recent_ventes, ['vente.Vente', 'vente.Client', 'stock.Stock'], False),
+    'top_products': (top_products, ['vente.Vente', 'stock.Stock'], True),
+    'stock_by_product': (stock_by_product, ['stock.Stock'], False),
+    'transformations_by_step': (transformations_by_step, ['transformation.Transformation'], False),
+    'harvests_by_fruit': (harvests_by_fruit, ['producteurs.Recolte', 'producteurs.Fruit'], False),
+    'monthly_sales': (monthly_sales, ['vente.Vente'], False),
+    'top_clients': (top_clients, ['vente.Vente', 'vente.Client'], False),
+}
+
+
+def cache_params(name, period, start_date, end_date):
+    """Parameters that identify a widget result besides model generations."""
+    if WIDGETS[name][2]:
+        return (period, start_date, end_date)
+    # the monthly series is relative to today
+    return (date.today(),)
+
+
+def widget_data(name, period, start_date, end_date):
+    """Return the (cached) data of one widget."""
+    func, depends_on, _ = WIDGETS[name]
+    return dashboard_cache.cached(
+        f'widget:{name}',
+        cache_params(name, period, start_date, end_date),
+        lambda: func(start_date, end_date),
+        depends_on=depends_on,
+    )
+
+
+def _in_own_thread(func):
+    """Run a sync ORM call in a worker thread that owns its DB connection.
+
+    Django's async ORM (acount, aaggregate, async for) routes every query
+    through the same thread-sensitive executor, so gathering those coroutines
+    still runs the queries one after the other. Running each widget with
+    thread_sensitive=False gives it a separate thread and connection, which
+    is what lets independent aggregations overlap on the database.
+    """
+    def run(*args):
+        close_old_connections()
+        try:
+            return func(*args)
+        finally:
+            close_old_connections()
+    return sync_to_async(run, thread_sensitive=False)
+
+
+async def gather_widgets(names, period, start_date, end_date, use_cache=True):
+    """Compute the given widgets concurrently and return {name: data}."""
+    if use_cache:
+        calls = [_in_own_thread(widget_data)(name, period, start_date, end_date) for name in names]
+    else:
+        calls = [_in_own_thread(WIDGETS[name][0])(start_date, end_date) for name in names]
+    results = await asyncio.gather(*calls)
+    return dict(zip(names, results))
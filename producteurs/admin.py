@@ -1,7 +1,8 @@
 from django.contrib import admin
-from .models import Producteur, Parcelle, Recolte
+from .models import Producteur, Parcelle, Fruit, Recolte
 
 #----------------------------ENREGISTREMENT DES MODELS---------------------------------
 admin.site.register(Producteur)
 admin.site.register(Parcelle)
+admin.site.register(Fruit)
 admin.site.register(Recolte)
\ No newline at end of file
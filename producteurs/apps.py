@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class ProducteursConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'producteurs'
+
+    def ready(self):
+        # register the signal handlers that keep the producteur counters current
+        from . import signals  # noqa: F401
@@ -0,0 +1,119 @@
+"""Compteurs dénormalisés de `Producteur` : parcelles, récoltes, quantité récoltée.
+
+Chaque écriture unitaire sur `Parcelle` / `Recolte` applique un delta aux
+compteurs du producteur concerné par un `UPDATE ... SET n = n + 1` (pas de
+relecture des tables filles), dans la même transaction que l'écriture. Les
+écritures en masse (signal `bulk_changed`) recalculent leurs producteurs en
+une seule requête ensembliste ; `recalculer` sert aussi à la commande de
+réparation `recalculer_compteurs`.
+"""
+import threading
+
+from django.apps import apps
+from django.db import transaction
+from django.db.models import Count, F, FloatField, IntegerField, OuterRef, Q, Subquery, Sum, Value
+from django.db.models.functions import Abs, Coalesce
+
+
+def snapshot(instance):
+    """The producteur and measures a parcelle / récolte contributes."""
+    if instance._meta.model_name == 'parcelle':
+        return {'producteur_id': instance.producteur_id, 'nb_parcelles': 1, 'nb_recoltes': 0, 'quantite': 0.0}
+    return {'producteur_id': instance.producteur_id, 'nb_parcelles': 0, 'nb_recoltes': 1,
+            'quantite': float(instance.quantite or 0)}
+
+
+def apply(snap, sign):
+    """Add (sign=1) or remove (sign=-1) one snapshot from its producteur's counters."""
+    if snap['producteur_id'] is None or snap['producteur_id'] in _deleting():
+        return
+    Producteur = apps.get_model('producteurs.Producteur')
+    Producteur.objects.filter(pk=snap['producteur_id']).update(
+        nb_parcelles=F('nb_parcelles') + sign * snap['nb_parcelles'],
+        nb_recoltes=F('nb_recoltes') + sign * snap['nb_recoltes'],
+        quantite_recoltee=F('quantite_recoltee') + sign * snap['quantite'],
+    )
+
+
+def move(old, new):
+    """Replace snapshot `old` by `new` (an update), in one query when the producteur is unchanged."""
+    if old is None:
+        apply(new, 1)
+    elif old['producteur_id'] != new['producteur_id']:
+        apply(old, -1)
+        apply(new, 1)
+    elif old['quantite'] != new['quantite']:
+        apply({**new, 'nb_parcelles': 0, 'nb_recoltes': 0, 'quantite': new['quantite'] - old['quantite']}, 1)
+
+
+#---------------------------- Recalcul ensembliste ---------------------------
+
+def _expressions(get_model=apps.get_model):
+    Parcelle = get_model('producteurs.Parcelle')
+    Recolte = get_model('producteurs.Recolte')
+
+    def par_producteur(model, aggregate):
+        return Subquery(
+            model.objects.filter(producteur=OuterRef('pk')).order_by()
+            .values('producteur').annotate(v=aggregate).values('v')
+        )
+
+    return {
+        'nb_parcelles': Coalesce(par_producteur(Parcelle, Count('pk')), Value(0), output_field=IntegerField()),
+        'nb_recoltes': Coalesce(par_producteur(Recolte, Count('pk')), Value(0), output_field=IntegerField()),
+        'quantite_recoltee': Coalesce(par_producteur(Recolte, Sum('quantite')), Value(0.0), output_field=FloatField()),
+    }
+
+
+def recalculer(ids=None, batch_size=5000, get_model=apps.get_model):
+    """Recompute the counters from the parcelles / récoltes with UPDATE ... SET = (subquery).
+
+    `ids` limits it to some producteurs (one query); otherwise the whole
+    table is done by id ranges of `batch_size`, one transaction each.
+    `get_model` lets a data migration pass its historical models.
+    Returns the number of producteurs updated.
+    """
+    Producteur = get_model('producteurs.Producteur')
+    expressions = _expressions(get_model)
+    if ids is not None:
+        ids = set(ids) - _deleting()
+        return Producteur.objects.filter(pk__in=ids).update(**expressions) if ids else 0
+    total = 0
+    last = Producteur.objects.order_by('-pk').values_list('pk', flat=True).first() or 0
+    for start in range(0, last + 1, batch_size):
+        with transaction.atomic():
+            total += Producteur.objects.filter(pk__gte=start, pk__lt=start + batch_size).update(**expressions)
+    return total
+
+
+def incoherents(get_model=apps.get_model):
+    """Producteurs whose stored counters differ from the parcelles / récoltes."""
+    Producteur = get_model('producteurs.Producteur')
+    expressions = _expressions(get_model)
+    qs = Producteur.objects.annotate(**{f'_{name}': expr for name, expr in expressions.items()})
+    qs = qs.annotate(_ecart=Abs(F('quantite_recoltee') - F('_quantite_recoltee')))
+    # float sums depend on the addition order: tolerate rounding noise
+    return qs.filter(
+        ~Q(nb_parcelles=F('_nb_parcelles')) | ~Q(nb_recoltes=F('_nb_recoltes')) | Q(_ecart__gt=1e-6)
+    )
+
+
+#---------------------------- Suppressions en cascade ---------------------------
+
+# producteurs being deleted in this thread: their children's post_delete
+# would only update a row about to disappear (one query per child)
+_state = threading.local()
+
+
+def _deleting():
+    if not hasattr(_state, 'ids'):
+        _state.ids = set()
+    return _state.ids
+
+
+def deleting(producteur_id):
+    _deleting().add(producteur_id)
+
+
+def deleted(producteur_id):
+    _deleting().discard(producteur_id)
@@ -0,0 +1,123 @@
+"""Catalogue des fruits (table `Fruit`) et sa copie en mémoire.
+
+Les récoltes référencent un `Fruit` par clé étrangère ; la saisie reste
+libre : `resoudre()` ramène chaque nom saisi à sa fiche du catalogue par une
+clé normalisée (casse, accents, espaces), en créant les fruits inconnus.
+
+Le catalogue est petit et lu partout (filtres, dashboard, omnibox) : il est
+gardé en mémoire par processus, vidé quand un `Fruit` change dans ce
+processus et relu au plus tard après `TTL` secondes pour voir les fruits
+créés par les autres workers. Un nom absent de la copie est toujours
+cherché en base avant d'être créé.
+"""
+import time
+import unicodedata
+
+from django.db import IntegrityError, transaction
+
+TTL = 300
+# Fruit.nom / Fruit.cle max_length
+MAX_NOM = 50
+
+_cache = {'expire': 0.0, 'par_id': {}, 'par_cle': {}}
+
+
+def normaliser(nom):
+    """Matching key of a fruit name: 'Mangue ', 'MANGUE' and 'mangué' are one fruit."""
+    nom = unicodedata.normalize('NFKD', str(nom or ''))
+    nom = ''.join(c for c in nom if not unicodedata.combining(c))
+    return ' '.join(nom.split()).casefold()
+
+
+def _nom(saisi):
+    # the name as stored: blanks collapsed, cut to the column size
+    return ' '.join(str(saisi or '').split())[:MAX_NOM].rstrip()
+
+
+def _cle(nom):
+    # Fruit.cle as saved (normalising may lengthen a name, e.g. ligatures)
+    return normaliser(nom)[:MAX_NOM]
+
+
+def _charger():
+    global _cache
+    from .models import Fruit
+    par_id = dict(Fruit.objects.values_list('id', 'nom'))
+    loaded = {
+        'expire': time.monotonic() + TTL,
+        'par_id': par_id,
+        'par_cle': {_cle(nom): id_ for id_, nom in par_id.items()},
+    }
+    # rows read inside a transaction may still be rolled back: use them, keep them not
+    if not transaction.get_connection().in_atomic_block:
+        _cache = loaded
+    return loaded
+
+
+def _catalogue():
+    cache = _cache
+    if time.monotonic() >= cache['expire']:
+        cache = _charger()
+    return cache
+
+
+def invalider():
+    """Drop the in-process copy."""
+    global _cache
+    _cache = {'expire': 0.0, 'par_id': {}, 'par_cle': {}}
+
+
+def _changed(**kwargs):
+    # Fruit post_save / post_delete receiver: reload once the change is visible
+    transaction.on_commit(invalider)
+
+
+def choix():
+    """(id, nom) pairs of the whole catalog, sorted by name; no query while cached."""
+    return sorted(_catalogue()['par_id'].items(), key=lambda item: normaliser(item[1]))
+
+
+def nom(fruit_id):
+    """Display name of a fruit id."""
+    if fruit_id is None:
+        return ''
+    par_id = _catalogue()['par_id']
+    if fruit_id not in par_id:
+        par_id = _charger()['par_id']
+    return par_id.get(fruit_id, '')
+
+
+def resoudre(noms):
+    """Map each name of `noms` to its Fruit id, creating the unknown fruits.
+
+    Blank names are left out of the result. Call it inside the write's
+    transaction: the created fruits roll back with it.
+    """
+    from .models import Fruit
+    # names over MAX_NOM characters are cut once, before matching and creating
+    noms = {saisi: _nom(saisi) for saisi in noms}
+    cles = {}
+    for stocke in noms.values():
+        cle = _cle(stocke)
+        if cle:
+            cles.setdefault(cle, stocke)
+    par_cle = _catalogue()['par_cle']
+    manquants = {cle: stocke for cle, stocke in cles.items() if cle not in par_cle}
+    if manquants:
+        # created by another process since the last load?
+        par_cle = _charger()['par_cle']
+        manquants = {cle: stocke for cle, stocke in manquants.items() if cle not in par_cle}
+    if manquants:
+        for stocke in manquants.values():
+            try:
+                with transaction.atomic():
+                    Fruit.objects.create(nom=stocke)
+            except IntegrityError:
+                pass  # created concurrently: read back below
+        par_cle = _charger()['par_cle']
+    return {saisi: par_cle[_cle(stocke)] for saisi, stocke in noms.items() if _cle(stocke)}
+
+
+def resoudre_un(saisi):
+    """Fruit id of one name (created if unknown), None for a blank name."""
+    return resoudre([saisi]).get(saisi)
@@ -0,0 +1,156 @@
+"""Index spatial des parcelles sans PostGIS : cellules de grille en ordre Z.
+
+La position (latitude, longitude) est quantifiée sur une grille de 2^26 x
+2^26 cases (~60 cm) dont les deux coordonnées sont entrelacées bit à bit
+(code de Morton, comme un geohash mais en entier) dans la colonne indexée
+`Parcelle.cellule`. Une case de niveau L (2^L x 2^L sur le globe) est alors
+un intervalle contigu de codes : une zone se cherche par quelques
+`cellule BETWEEN a AND b` sur l'index B-tree, sur SQLite comme sur
+PostgreSQL, puis les lignes sont filtrées exactement sur lat / lon.
+
+- `filtre_bbox` : Q d'un rectangle (≤ MAX_CELLULES intervalles) ;
+- `proches` : k plus proches voisins, en élargissant le carré 3 x 3 de
+  cases autour du point jusqu'à ce que le résultat soit sûr.
+"""
+import math
+
+from django.db.models import Q
+
+BITS = 26
+TAILLE = 1 << BITS
+MAX_CELLULES = 16
+RAYON_TERRE = 6371008.8
+METRES_PAR_DEGRE = math.pi * RAYON_TERRE / 180
+# 3 x 3 search square of the first nearby lookup: cells of ~600 m
+NIVEAU_PROCHES = 16
+
+
+def _spread(v):
+    """Put the bits of v on the even positions (v < 2^32)."""
+    v = (v | (v << 16)) & 0x0000FFFF0000FFFF
+    v = (v | (v << 8)) & 0x00FF00FF00FF00FF
+    v = (v | (v << 4)) & 0x0F0F0F0F0F0F0F0F
+    v = (v | (v << 2)) & 0x3333333333333333
+    v = (v | (v << 1)) & 0x5555555555555555
+    return v
+
+
+def _morton(x, y):
+    # longitude on the odd bits, like a geohash
+    return (_spread(x) << 1) | _spread(y)
+
+
+def _grille(lat, lon):
+    x = int((lon + 180.0) / 360.0 * TAILLE)
+    y = int((lat + 90.0) / 180.0 * TAILLE)
+    return min(max(x, 0), TAILLE - 1), min(max(y, 0), TAILLE - 1)
+
+
+def valide(lat, lon):
+    return lat is not None and lon is not None and -90 <= lat <= 90 and -180 <= lon <= 180
+
+
+def cellule(lat, lon):
+    """Z-order code of a position, None when it has no (valid) coordinates."""
+    try:
+        lat, lon = float(lat), float(lon)
+    except (TypeError, ValueError):
+        return None
+    if not valide(lat, lon):
+        return None
+    return _morton(*_grille(lat, lon))
+
+
+def _plages(cx0, cx1, cy0, cy1, niveau):
+    """Merged code intervals [lo, hi) of the level-`niveau` cells of a block."""
+    shift = 2 * (BITS - niveau)
+    plages = sorted(
+        (_morton(cx, cy) << shift, (_morton(cx, cy) + 1) << shift)
+        for cx in range(cx0, cx1 + 1) for cy in range(cy0, cy1 + 1)
+    )
+    merged = [list(plages[0])]
+    for lo, hi in plages[1:]:
+        if lo == merged[-1][1]:
+            merged[-1][1] = hi
+        else:
+            merged.append([lo, hi])
+    return merged
+
+
+def _q(plages):
+    condition = Q()
+    for lo, hi in plages:
+        condition |= Q(cellule__gte=lo, cellule__lt=hi)
+    return condition
+
+
+def filtre_bbox(min_lat, min_lon, max_lat, max_lon):
+    """Q of the parcelles inside the rectangle (bounds included)."""
+    x0, y0 = _grille(min_lat, min_lon)
+    x1, y1 = _grille(max_lat, max_lon)
+    # finest level whose cells cover the box in at most MAX_CELLULES cells
+    niveau = BITS
+    while niveau > 0:
+        s = BITS - niveau
+        if ((x1 >> s) - (x0 >> s) + 1) * ((y1 >> s) - (y0 >> s) + 1) <= MAX_CELLULES:
+            break
+        niveau -= 1
+    s = BITS - niveau
+    plages = _plages(x0 >> s, x1 >> s, y0 >> s, y1 >> s, niveau)
+    return _q(plages) & Q(
+        latitude__gte=min_lat, latitude__lte=max_lat, longitude__gte=min_lon, longitude__lte=max_lon,
+    )
+
+
+def distance(lat1, lon1, lat2, lon2):
+    """Great-circle distance in metres (haversine)."""
+    p1, p2 = math.radians(lat1), math.radians(lat2)
+    dp, dl = p2 - p1, math.radians(lon2 - lon1)
+    a = math.sin(dp / 2) ** 2 + math.cos(p1) * math.cos(p2) * math.sin(dl / 2) ** 2
+    return 2 * RAYON_TERRE * math.asin(min(1.0, math.sqrt(a)))
+
+
+def _rayon_sur(lat, niveau):
+    """Distance from a point to the edge of the 3 x 3 block of level-`niveau` cells around it."""
+    if niveau <= 1:
+        return math.inf
+    hauteur = 180.0 / (1 << niveau)
+    largeur = 360.0 / (1 << niveau) * math.cos(math.radians(min(abs(lat) + hauteur, 90.0)))
+    return min(hauteur, largeur) * METRES_PAR_DEGRE
+
+
+def proches(queryset, lat, lon, limit, apres=None, max_distance=None):
+    """The `limit` parcelles of `queryset` nearest to (lat, lon), after `apres`.
+
+    `apres` is the (distance, id) of the last row of the previous page.
+    Returns [(distance_m, id)] sorted by distance then id. Each step reads
+    the (id, lat, lon) of a 3 x 3 block of cells around the point: the rows
+    closer than the block edge are exact. While they are too few the block
+    is widened, straight to the level whose edge passes the `limit`-th
+    candidate already seen when there are enough of them.
+    """
+    x, y = _grille(lat, lon)
+    niveau = NIVEAU_PROCHES
+    while True:
+        s = BITS - niveau
+        cx, cy = x >> s, y >> s
+        derniere = (1 << niveau) - 1
+        plages = _plages(max(cx - 1, 0), min(cx + 1, derniere), max(cy - 1, 0), min(cy + 1, derniere), niveau)
+        sur = _rayon_sur(lat, niveau)
+        if max_distance is not None:
+            sur = min(sur, max_distance)
+
+        candidats = []
+        for id_, plat, plon in queryset.filter(_q(plages)).values_list('id', 'latitude', 'longitude'):
+            cle = (distance(lat, lon, plat, plon), id_)
+            if apres is None or cle > apres:
+                candidats.append(cle)
+        candidats.sort()
+        trouves = [cle for cle in candidats if cle[0] <= sur]
+        if len(trouves) >= limit or sur == math.inf or sur == max_distance:
+            return trouves[:limit]
+        # the answer lies within the limit-th candidate: skip the levels too small to hold it
+        cible = candidats[limit - 1][0] if len(candidats) >= limit else sur * 2
+        niveau -= 1
+        while niveau > 1 and _rayon_sur(lat, niveau) < cible:
+            niveau -= 1
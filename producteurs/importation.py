@@ -0,0 +1,318 @@
+"""Import en masse de producteurs, parcelles et récoltes depuis un CSV / XLSX.
+
+Une ligne du fichier = un producteur (identifié par son téléphone unique),
+optionnellement une parcelle (identifiée par producteur + nom) et
+optionnellement une récolte sur cette parcelle. Colonnes reconnues :
+
+    telephone, nom, prenom, adresse,
+    parcelle_nom, parcelle_superficie, parcelle_adresse,
+    parcelle_latitude, parcelle_longitude,
+    fruit, quantite, date_recolte
+
+Le fichier est lu en flux et traité par lots : chaque lot résout ses
+producteurs et parcelles existants en une requête par table, puis crée le
+reste par `bulk_create` dans sa propre transaction. Rien n'est gardé d'un
+lot à l'autre, la mémoire reste constante quelle que soit la taille du
+fichier. Les lignes rejetées sont remontées une par une à `on_reject`.
+"""
+import codecs
+import csv
+import io
+import zipfile
+import zlib
+from datetime import date, datetime
+
+from django.db import DatabaseError, transaction
+
+from core.signals import bulk_changed
+from . import fruits, geo
+from .models import Producteur, Parcelle, Recolte
+
+COLONNES = (
+    'telephone', 'nom', 'prenom', 'adresse',
+    'parcelle_nom', 'parcelle_superficie', 'parcelle_adresse',
+    'parcelle_latitude', 'parcelle_longitude',
+    'fruit', 'quantite', 'date_recolte',
+)
+NOMBRES = ('parcelle_superficie', 'parcelle_latitude', 'parcelle_longitude', 'quantite')
+# accepted header spellings -> column
+ALIAS = {
+    'téléphone': 'telephone', 'tel': 'telephone', 'prénom': 'prenom',
+    'parcelle': 'parcelle_nom', 'superficie': 'parcelle_superficie',
+    'quantité': 'quantite', 'date': 'date_recolte', 'date_récolte': 'date_recolte',
+    'latitude': 'parcelle_latitude', 'lat': 'parcelle_latitude',
+    'longitude': 'parcelle_longitude', 'lon': 'parcelle_longitude', 'lng': 'parcelle_longitude',
+}
+MAX_LENGTHS = {
+    'telephone': 15, 'nom': 50, 'prenom': 100, 'adresse': 50,
+    'parcelle_nom': 50, 'parcelle_adresse': 50, 'fruit': 50,
+}
+DATE_FORMATS = ('%Y-%m-%d', '%d/%m/%Y', '%d-%m-%Y')
+
+
+class FichierInvalide(ValueError):
+    """The file itself cannot be read (format, missing columns)."""
+
+
+def _header(names):
+    columns = []
+    for name in names:
+        key = str(name or '').strip().lower().replace(' ', '_')
+        columns.append(ALIAS.get(key, key))
+    if 'telephone' not in columns:
+        raise FichierInvalide("Colonne « telephone » absente de l'en-tête")
+    return columns
+
+
+def _lignes_texte(fileobj):
+    """Decoded lines of a binary CSV: UTF-8, or Windows-1252 from the first line that is not.
+
+    Excel on Windows saves « CSV (séparateur : point-virgule) » in
+    Windows-1252; the lines read before the switch were ASCII, the same in
+    both encodings.
+    """
+    encoding = 'utf-8'
+    for numero, raw in enumerate(fileobj, start=1):
+        if numero == 1 and raw.startswith(codecs.BOM_UTF8):
+            raw = raw[len(codecs.BOM_UTF8):]
+        try:
+            line = raw.decode(encoding)
+        except UnicodeDecodeError:
+            if encoding == 'cp1252':
+                raise FichierInvalide(f"Ligne {numero} : encodage non reconnu (UTF-8 ou Windows-1252 attendu)")
+            encoding = 'cp1252'
+            try:
+                line = raw.decode(encoding)
+            except UnicodeDecodeError:
+                raise FichierInvalide(f"Ligne {numero} : encodage non reconnu (UTF-8 ou Windows-1252 attendu)")
+        yield line
+
+
+def lire_csv(fileobj, delimiter=None):
+    """Yield one dict per data row of a CSV file (binary or text file object)."""
+    text = fileobj if isinstance(fileobj, io.TextIOBase) else _lignes_texte(fileobj)
+    if delimiter is None:
+        first = next(iter(text), '')
+        delimiter = ';' if first.count(';') > first.count(',') else ','
+        lines = _chain([first], text)
+    else:
+        lines = text
+    reader = csv.reader(lines, delimiter=delimiter)
+    try:
+        columns = _header(next(reader, []))
+        for values in reader:
+            yield dict(zip(columns, values))
+    except csv.Error as e:
+        raise FichierInvalide(f"Ligne {reader.line_num} : CSV illisible ({e})")
+
+
+def _chain(head, rest):
+    yield from head
+    yield from rest
+
+
+def lire_xlsx(fileobj):
+    """Yield one dict per data row of the first sheet of an XLSX workbook."""
+    try:
+        from openpyxl import load_workbook
+        from openpyxl.utils.exceptions import InvalidFileException
+    except ImportError:
+        raise FichierInvalide("Le format XLSX nécessite le paquet openpyxl")
+    # a corrupt, truncated or renamed file: not a zip, missing parts, invalid XML
+    illisible = (zipfile.BadZipFile, InvalidFileException, KeyError, OSError, zlib.error)
+    try:
+        workbook = load_workbook(fileobj, read_only=True, data_only=True)
+    except (*illisible, ValueError) as e:
+        raise FichierInvalide(f"Fichier XLSX illisible ({e.__class__.__name__}) : est-ce bien un classeur Excel ?")
+    try:
+        rows = workbook.worksheets[0].iter_rows(values_only=True)
+        columns = _header(next(rows, ()))
+        for values in rows:
+            yield dict(zip(columns, values))
+    except illisible as e:
+        raise FichierInvalide(f"Fichier XLSX illisible ({e.__class__.__name__})")
+    finally:
+        workbook.close()
+
+
+def lire(fileobj, nom_fichier='', format=None):
+    """Pick the reader from `format` or the file extension."""
+    format = format or ('xlsx' if nom_fichier.lower().endswith(('.xlsx', '.xlsm')) else 'csv')
+    if format == 'xlsx':
+        return lire_xlsx(fileobj)
+    if format == 'csv':
+        return lire_csv(fileobj)
+    raise FichierInvalide(f"Format inconnu : {format}")
+
+
+# ------------------------------------------------------------------ validation
+
+def _text(value):
+    if value is None:
+        return ''
+    if isinstance(value, float) and value.is_integer():
+        # phone numbers typed as numbers in a spreadsheet
+        value = int(value)
+    return str(value).strip()
+
+
+def _number(value, champ, signed=False):
+    if value in (None, ''):
+        return None
+    if isinstance(value, (int, float)):
+        number = float(value)
+    else:
+        try:
+            number = float(str(value).strip().replace(' ', '').replace(',', '.'))
+        except ValueError:
+            raise ValueError(f"{champ} : « {value} » n'est pas un nombre")
+    if number < 0 and not signed:
+        raise ValueError(f"{champ} : valeur négative")
+    return number
+
+
+def _date(value):
+    if value in (None, ''):
+        return date.today()
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    raw = str(value).strip()
+    for fmt in DATE_FORMATS:
+        try:
+            return datetime.strptime(raw, fmt).date()
+        except ValueError:
+            continue
+    raise ValueError(f"date_recolte : « {raw} » invalide")
+
+
+def valider(raw):
+    """Normalize one raw row; raise ValueError with a readable message."""
+    row = {col: _text(raw.get(col)) for col in COLONNES if col not in NOMBRES + ('date_recolte',)}
+    if not row['telephone']:
+        raise ValueError("telephone manquant")
+    for col, length in MAX_LENGTHS.items():
+        if len(row[col]) > length:
+            raise ValueError(f"{col} : plus de {length} caractères")
+    row['parcelle_superficie'] = _number(raw.get('parcelle_superficie'), 'parcelle_superficie')
+    row['quantite'] = _number(raw.get('quantite'), 'quantite')
+    row['parcelle_latitude'] = _number(raw.get('parcelle_latitude'), 'parcelle_latitude', signed=True)
+    row['parcelle_longitude'] = _number(raw.get('parcelle_longitude'), 'parcelle_longitude', signed=True)
+    if (row['parcelle_latitude'] is None) != (row['parcelle_longitude'] is None):
+        raise ValueError("parcelle_latitude et parcelle_longitude vont ensemble")
+    if row['parcelle_latitude'] is not None and not geo.valide(row['parcelle_latitude'], row['parcelle_longitude']):
+        raise ValueError("coordonnées de la parcelle hors limites")
+    if row['fruit']:
+        if not row['parcelle_nom']:
+            raise ValueError("une récolte doit indiquer sa parcelle (parcelle_nom)")
+        row['date_recolte'] = _date(raw.get('date_recolte'))
+    return row
+
+
+# ------------------------------------------------------------------ import
+
+class Importateur:
+    """Stream rows into the database by chunks of `batch_size`.
+
+    `on_progress(stats)` is called after each chunk, `on_reject(ligne,
+    message)` for each rejected row (line numbers count the header as 1).
+    """
+
+    def __init__(self, batch_size=2000, on_progress=None, on_reject=None):
+        self.batch_size = batch_size
+        self.on_progress = on_progress or (lambda stats: None)
+        self.on_reject = on_reject or (lambda ligne, message: None)
+        self.stats = {'lignes': 0, 'rejets': 0, 'producteurs': 0, 'parcelles': 0, 'recoltes': 0}
+
+    def importer(self, rows):
+        chunk = []
+        for ligne, raw in enumerate(rows, start=2):
+            if not any(v not in (None, '') for v in raw.values()):
+                continue  # empty line
+            self.stats['lignes'] += 1
+            try:
+                chunk.append((ligne, valider(raw)))
+            except ValueError as e:
+                self._reject(ligne, str(e))
+            if len(chunk) >= self.batch_size:
+                self._chunk(chunk)
+                chunk = []
+        if chunk:
+            self._chunk(chunk)
+        return self.stats
+
+    def _reject(self, ligne, message):
+        self.stats['rejets'] += 1
+        self.on_reject(ligne, message)
+
+    def _chunk(self, chunk):
+        try:
+            with transaction.atomic():
+                counts = self._write(chunk)
+        except DatabaseError as e:
+            # the whole chunk is rolled back: report each of its rows
+            for ligne, _ in chunk:
+                self._reject(ligne, f"lot annulé : {e}")
+        else:
+            for key, value in counts.items():
+                self.stats[key] += value
+        self.on_progress(self.stats)
+
+    def _write(self, chunk):
+        # --- producteurs: dedupe on telephone, first row wins for a new one
+        phones = {row['telephone'] for _, row in chunk}
+        producteurs = dict(Producteur.objects.filter(telephone__in=phones).values_list('telephone', 'id'))
+        new = {}
+        for _, row in chunk:
+            phone = row['telephone']
+            if phone not in producteurs and phone not in new:
+                new[phone] = Producteur(telephone=phone, nom=row['nom'], prenom=row['prenom'], adresse=row['adresse'])
+        if new:
+            for obj in Producteur.objects.bulk_create(new.values()):
+                producteurs[obj.telephone] = obj.id
+
+        # --- parcelles: resolved by (producteur, nom)
+        keys = {(producteurs[row['telephone']], row['parcelle_nom']) for _, row in chunk if row['parcelle_nom']}
+        parcelles = {}
+        if keys:
+            existing = Parcelle.objects.filter(
+                producteur_id__in={pid for pid, _ in keys}, nom__in={nom for _, nom in keys},
+            ).values_list('producteur_id', 'nom', 'id').order_by('id')
+            for pid, nom, id_ in existing:
+                parcelles.setdefault((pid, nom), id_)
+        new_parcelles = {}
+        for _, row in chunk:
+            key = (producteurs[row['telephone']], row['parcelle_nom'])
+            if row['parcelle_nom'] and key not in parcelles and key not in new_parcelles:
+                new_parcelles[key] = Parcelle(
+                    producteur_id=key[0], nom=key[1],
+                    superficie=row['parcelle_superficie'] or 0, adresse=row['parcelle_adresse'],
+                    latitude=row['parcelle_latitude'], longitude=row['parcelle_longitude'],
+                    # bulk_create skips Parcelle.save()
+                    cellule=geo.cellule(row['parcelle_latitude'], row['parcelle_longitude']),
+                )
+        if new_parcelles:
+            for obj in Parcelle.objects.bulk_create(new_parcelles.values()):
+                parcelles[(obj.producteur_id, obj.nom)] = obj.id
+
+        # --- récoltes: fruit names resolved against the catalog (cached)
+        fruit_ids = fruits.resoudre({row['fruit'] for _, row in chunk if row['fruit']})
+        recoltes = [
+            Recolte(
+                producteur_id=producteurs[row['telephone']],
+                parcelle_id=parcelles[(producteurs[row['telephone']], row['parcelle_nom'])],
+                fruit_id=fruit_ids[row['fruit']], quantite=row['quantite'] or 0, date_recolte=row['date_recolte'],
+            )
+            for _, row in chunk if row['fruit']
+        ]
+        if recoltes:
+            recoltes = Recolte.objects.bulk_create(recoltes)
+
+        # bulk_create skips post_save
+        for model, created in (
+            (Producteur, list(new.values())), (Parcelle, list(new_parcelles.values())), (Recolte, recoltes),
+        ):
+            if created:
+                bulk_changed.send(sender=model, instances=created, action='create')
+        return {'producteurs': len(new), 'parcelles': len(new_parcelles), 'recoltes': len(recoltes)}
@@ -0,0 +1,59 @@
+import csv
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from producteurs.importation import FichierInvalide, Importateur, lire
+
+
+class Command(BaseCommand):
+    help = (
+        "Importe producteurs, parcelles et récoltes depuis un fichier CSV ou XLSX "
+        "(une ligne = producteur + parcelle + récolte optionnelles), lu en flux et "
+        "écrit par lots. Voir producteurs/importation.py pour les colonnes."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('fichier')
+        parser.add_argument('--format', choices=['csv', 'xlsx'], help="Par défaut: d'après l'extension")
+        parser.add_argument('--batch-size', type=int, default=2000,
+                            help="Lignes par lot ; chaque lot est une transaction")
+        parser.add_argument('--rejets', help="Écrit les lignes rejetées (ligne;message) dans ce fichier CSV")
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        rejets_file = open(options['rejets'], 'w', newline='', encoding='utf-8') if options['rejets'] else None
+        rejets = csv.writer(rejets_file, delimiter=';') if rejets_file else None
+        if rejets:
+            rejets.writerow(['ligne', 'message'])
+
+        def on_reject(ligne, message):
+            if rejets:
+                rejets.writerow([ligne, message])
+            elif options['verbosity'] > 1:
+                self.stderr.write(f"  ligne {ligne}: {message}")
+
+        def on_progress(stats):
+            self.stdout.write(
+                f"  {stats['lignes']} ligne(s) lues, {stats['rejets']} rejet(s) "
+                f"({time.monotonic() - started:.1f} s)"
+            )
+            self.stdout.flush()
+
+        importateur = Importateur(options['batch_size'], on_progress=on_progress, on_reject=on_reject)
+        try:
+            with open(options['fichier'], 'rb') as f:
+                stats = importateur.importer(lire(f, options['fichier'], options['format']))
+        except FileNotFoundError:
+            raise CommandError(f"Fichier introuvable: {options['fichier']}")
+        except FichierInvalide as e:
+            raise CommandError(str(e))
+        finally:
+            if rejets_file:
+                rejets_file.close()
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Terminé en {time.monotonic() - started:.1f} s : {stats['producteurs']} producteur(s), "
+            f"{stats['parcelles']} parcelle(s), {stats['recoltes']} récolte(s) créés, "
+            f"{stats['rejets']} ligne(s) rejetée(s) sur {stats['lignes']}"
+        ))
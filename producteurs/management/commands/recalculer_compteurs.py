@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+
+from producteurs import compteurs
+
+
+class Command(BaseCommand):
+    help = "Recalcule les compteurs dénormalisés des producteurs (parcelles, récoltes, quantité)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--verifier', action='store_true',
+                            help="Lister les producteurs incohérents sans rien écrire")
+        parser.add_argument('--batch-size', type=int, default=5000,
+                            help="Producteurs par UPDATE ; chaque lot est une transaction")
+
+    def handle(self, *args, **options):
+        if options['verifier']:
+            ids = list(compteurs.incoherents().values_list('pk', flat=True)[:1001])
+            if not ids:
+                self.stdout.write(self.style.SUCCESS("Tous les compteurs sont à jour."))
+                return
+            apercu = ', '.join(str(pk) for pk in ids[:20])
+            plus = " (au moins)" if len(ids) > 1000 else ""
+            self.stdout.write(self.style.WARNING(
+                f"{min(len(ids), 1000)}{plus} producteur(s) incohérent(s) : {apercu}{' ...' if len(ids) > 20 else ''}"
+            ))
+            return
+
+        updated = compteurs.recalculer(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"{updated} producteur(s) recalculé(s)."))
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.7 on 2026-10-18 19:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('producteurs', '0002_alter_parcelle_adresse'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='producteur',
+            index=models.Index(fields=['nom', 'prenom', 'id'], name='producteur_nom_prenom_id'),
+        ),
+    ]
@@ -0,0 +1,63 @@
+# Generated by Django 5.2.7 on 2026-10-18 19:41
+
+from django.db import migrations, models
+from django.db.models import Count, FloatField, IntegerField, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+
+def backfill(apps, schema_editor):
+    # historical models only, no application code: producteurs.compteurs may
+    # change, this migration must replay the same way
+    Producteur = apps.get_model('producteurs', 'Producteur')
+    Parcelle = apps.get_model('producteurs', 'Parcelle')
+    Recolte = apps.get_model('producteurs', 'Recolte')
+
+    def par_producteur(model, aggregate):
+        return Subquery(
+            model.objects.filter(producteur=OuterRef('pk')).order_by()
+            .values('producteur').annotate(v=aggregate).values('v')
+        )
+
+    Producteur.objects.update(
+        nb_parcelles=Coalesce(par_producteur(Parcelle, Count('pk')), Value(0), output_field=IntegerField()),
+        nb_recoltes=Coalesce(par_producteur(Recolte, Count('pk')), Value(0), output_field=IntegerField()),
+        quantite_recoltee=Coalesce(par_producteur(Recolte, Sum('quantite')), Value(0.0), output_field=FloatField()),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('producteurs', '0003_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='producteur',
+            name='nb_parcelles',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='producteur',
+            name='nb_recoltes',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='producteur',
+            name='quantite_recoltee',
+            field=models.FloatField(default=0, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='producteur',
+            index=models.Index(fields=['nb_parcelles', 'id'], name='producteur_nb_parcelles_id'),
+        ),
+        migrations.AddIndex(
+            model_name='producteur',
+            index=models.Index(fields=['nb_recoltes', 'id'], name='producteur_nb_recoltes_id'),
+        ),
+        migrations.AddIndex(
+            model_name='producteur',
+            index=models.Index(fields=['quantite_recoltee', 'id'], name='producteur_quantite_id'),
+        ),
+        migrations.RunPython(backfill, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,99 @@
+import unicodedata
+from collections import Counter, defaultdict
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def normaliser(nom):
+    # copy of producteurs.fruits.normaliser as of this migration: the keys
+    # written here must not change if the application code does
+    nom = unicodedata.normalize('NFKD', str(nom or ''))
+    nom = ''.join(c for c in nom if not unicodedata.combining(c))
+    return ' '.join(nom.split()).casefold()
+
+
+def creer_catalogue(apps, schema_editor):
+    """One Fruit per normalized spelling, named after its most used variant."""
+    Fruit = apps.get_model('producteurs', 'Fruit')
+    Recolte = apps.get_model('producteurs', 'Recolte')
+
+    variantes = defaultdict(Counter)
+    for saisi, n in Recolte.objects.values_list('fruit').annotate(n=models.Count('id')).order_by():
+        nom = ' '.join((saisi or '').split()) or 'Non renseigné'
+        variantes[normaliser(nom)][nom] += n
+    if not variantes:
+        return
+    # most frequent spelling first, then alphabetical for a stable choice
+    Fruit.objects.bulk_create([
+        Fruit(nom=min(noms, key=lambda nom: (-noms[nom], nom))[:50], cle=cle[:50])
+        for cle, noms in variantes.items()
+    ])
+    par_cle = dict(Fruit.objects.values_list('cle', 'id'))
+    # one set-based UPDATE per distinct spelling
+    for saisi in Recolte.objects.values_list('fruit', flat=True).distinct().order_by():
+        nom = ' '.join((saisi or '').split()) or 'Non renseigné'
+        Recolte.objects.filter(fruit=saisi).update(fruit_ref=par_cle[normaliser(nom)[:50]])
+
+
+def restaurer_texte(apps, schema_editor):
+    Fruit = apps.get_model('producteurs', 'Fruit')
+    Recolte = apps.get_model('producteurs', 'Recolte')
+    for id_, nom in Fruit.objects.values_list('id', 'nom'):
+        Recolte.objects.filter(fruit_ref=id_).update(fruit=nom)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('producteurs', '0004_compteurs'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Fruit',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('nom', models.CharField(max_length=50)),
+                ('cle', models.CharField(editable=False, max_length=50, unique=True)),
+            ],
+            options={
+                'ordering': ['nom'],
+            },
+        ),
+        migrations.AddField(
+            model_name='recolte',
+            name='fruit_ref',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.PROTECT, to='producteurs.fruit'),
+        ),
+        # nullable while both columns exist: the reverse re-adds the text
+        # column empty, restaurer_texte fills it, then NOT NULL comes back
+        migrations.AlterField(
+            model_name='recolte',
+            name='fruit',
+            field=models.CharField(max_length=50, null=True),
+        ),
+        migrations.RunPython(creer_catalogue, restaurer_texte),
+        migrations.RemoveField(
+            model_name='recolte',
+            name='fruit',
+        ),
+        migrations.RenameField(
+            model_name='recolte',
+            old_name='fruit_ref',
+            new_name='fruit',
+        ),
+        migrations.AlterField(
+            model_name='recolte',
+            name='fruit',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, to='producteurs.fruit'),
+        ),
+        migrations.AddIndex(
+            model_name='recolte',
+            index=models.Index(fields=['producteur', 'fruit'], name='recolte_producteur_fruit'),
+        ),
+        migrations.AddIndex(
+            model_name='recolte',
+            index=models.Index(fields=['fruit', 'quantite'], name='recolte_fruit_quantite'),
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.2.7 on 2026-10-18 19:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('producteurs', '0005_fruit'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='parcelle',
+            index=models.Index(fields=['nom', 'id'], name='parcelle_nom_id'),
+        ),
+        migrations.AddIndex(
+            model_name='parcelle',
+            index=models.Index(fields=['superficie', 'id'], name='parcelle_superficie_id'),
+        ),
+        migrations.AddIndex(
+            model_name='recolte',
+            index=models.Index(fields=['date_recolte', 'id'], name='recolte_date_id'),
+        ),
+        migrations.AddIndex(
+            model_name='recolte',
+            index=models.Index(fields=['fruit', 'date_recolte', 'id'], name='recolte_fruit_date_id'),
+        ),
+        migrations.AddIndex(
+            model_name='recolte',
+            index=models.Index(fields=['quantite', 'id'], name='recolte_quantite_id'),
+        ),
+        migrations.AddIndex(
+            model_name='recolte',
+            index=models.Index(fields=['parcelle', 'fruit', 'date_recolte'], name='recolte_parcelle_fruit_date'),
+        ),
+    ]
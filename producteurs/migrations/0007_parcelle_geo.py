@@ -0,0 +1,32 @@
+# Generated by Django 5.2.7 on 2026-10-18 19:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('producteurs', '0006_listing_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='parcelle',
+            name='cellule',
+            field=models.BigIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='parcelle',
+            name='latitude',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='parcelle',
+            name='longitude',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='parcelle',
+            index=models.Index(fields=['cellule', 'id'], name='parcelle_cellule_id'),
+        ),
+    ]
@@ -1,34 +1,114 @@
 from django.db import models
 
+from . import fruits, geo
+
 #----------------------------Table Producteur---------------------------
 class Producteur(models.Model):
     nom = models.CharField(max_length=50)
     prenom = models.CharField(max_length=100)
     adresse = models.CharField(max_length=50)
     telephone = models.CharField(max_length=15, unique=True)
+    # compteurs dénormalisés, tenus à jour par producteurs.compteurs
+    nb_parcelles = models.PositiveIntegerField(default=0, editable=False)
+    nb_recoltes = models.PositiveIntegerField(default=0, editable=False)
+    quantite_recoltee = models.FloatField(default=0, editable=False)
+
+    COMPTEURS = ('nb_parcelles', 'nb_recoltes', 'quantite_recoltee')
+
+    class Meta:
+        indexes = [
+            # keyset pagination of liste_producteurs
+            models.Index(fields=['nom', 'prenom', 'id'], name='producteur_nom_prenom_id'),
+            # filters (> 0) and sorts on the counters, id as tie-breaker
+            models.Index(fields=['nb_parcelles', 'id'], name='producteur_nb_parcelles_id'),
+            models.Index(fields=['nb_recoltes', 'id'], name='producteur_nb_recoltes_id'),
+            models.Index(fields=['quantite_recoltee', 'id'], name='producteur_quantite_id'),
+        ]
 
     def __str__(self):
         return f"{self.nom} {self.prenom} {self.telephone}"
 
+    def save(self, *args, **kwargs):
+        # a loaded instance carries counters that may be stale by now: an
+        # update never writes them back, only producteurs.compteurs does
+        if not self._state.adding and kwargs.get('update_fields') is None and not kwargs.get('force_insert'):
+            kwargs['update_fields'] = [
+                f.name for f in self._meta.concrete_fields
+                if not f.primary_key and f.name not in self.COMPTEURS
+            ]
+        super().save(*args, **kwargs)
+
 #----------------------------Table Parcelle---------------------------
 class Parcelle(models.Model):
     nom = models.CharField(max_length=50)
     superficie = models.FloatField()
     adresse = models.CharField(max_length =50)
     producteur = models.ForeignKey(Producteur, on_delete= models.CASCADE)
+    # position (WGS84) ou centroïde de la parcelle
+    latitude = models.FloatField(null=True, blank=True)
+    longitude = models.FloatField(null=True, blank=True)
+    # cellule de grille en ordre Z, calculée depuis lat / lon (voir producteurs.geo)
+    cellule = models.BigIntegerField(null=True, blank=True, editable=False)
+
+    class Meta:
+        indexes = [
+            # keyset sorts of liste_parcelles (the range filter on superficie too)
+            models.Index(fields=['nom', 'id'], name='parcelle_nom_id'),
+            models.Index(fields=['superficie', 'id'], name='parcelle_superficie_id'),
+            # spatial lookups: cell ranges, pages in cell order
+            models.Index(fields=['cellule', 'id'], name='parcelle_cellule_id'),
+        ]
 
     def __str__(self):
         return f"{self.nom} {self.superficie} {self.adresse}"
 
+    def save(self, *args, **kwargs):
+        self.cellule = geo.cellule(self.latitude, self.longitude)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and {'latitude', 'longitude'} & set(update_fields):
+            kwargs['update_fields'] = {*update_fields, 'cellule'}
+        super().save(*args, **kwargs)
+
+#----------------------------Table Fruit---------------------------
+class Fruit(models.Model):
+    nom = models.CharField(max_length=50)
+    # clé de rapprochement des saisies (casse, accents, espaces), voir producteurs.fruits
+    cle = models.CharField(max_length=50, unique=True, editable=False)
+
+    class Meta:
+        ordering = ['nom']
+
+    def __str__(self):
+        return self.nom
+
+    def save(self, *args, **kwargs):
+        self.nom = ' '.join(self.nom.split())
+        self.cle = fruits.normaliser(self.nom)[:50]
+        super().save(*args, **kwargs)
+
 #----------------------------Table Recolte---------------------------
 class Recolte (models.Model):
-    fruit = models.CharField(max_length=50)
+    fruit = models.ForeignKey(Fruit, on_delete=models.PROTECT)
     quantite = models.FloatField()
     date_recolte = models.DateField()
     producteur = models.ForeignKey(Producteur, on_delete=models.CASCADE)
     parcelle = models.ForeignKey(Parcelle, on_delete=models.CASCADE)
 
+    class Meta:
+        indexes = [
+            # fruit filter of liste_producteurs: EXISTS answered from the index
+            models.Index(fields=['producteur', 'fruit'], name='recolte_producteur_fruit'),
+            # harvest totals per fruit (dashboard) without reading the table
+            models.Index(fields=['fruit', 'quantite'], name='recolte_fruit_quantite'),
+            # keyset sorts of liste_recoltes, alone or under a fruit filter
+            models.Index(fields=['date_recolte', 'id'], name='recolte_date_id'),
+            models.Index(fields=['fruit', 'date_recolte', 'id'], name='recolte_fruit_date_id'),
+            models.Index(fields=['quantite', 'id'], name='recolte_quantite_id'),
+            # fruit / date filter of liste_parcelles: EXISTS per parcelle
+            models.Index(fields=['parcelle', 'fruit', 'date_recolte'], name='recolte_parcelle_fruit_date'),
+        ]
+
     def __str__(self):
-        return f"{self.fruit} {self.quantite}"
+        return f"{fruits.nom(self.fruit_id)} {self.quantite}"
 
 
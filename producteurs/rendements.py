@@ -0,0 +1,229 @@
+"""Rendements (kg / ha) par parcelle, fruit et saison, calculés avec NumPy.
+
+Les colonnes utiles des récoltes (parcelle, fruit, date, quantité) et des
+parcelles (superficie, producteur) sont lues en tableaux NumPy, sans
+instancier de modèle ; tout le reste est vectoriel :
+
+- totaux récoltés par (parcelle, fruit, saison) ;
+- rendement de chaque ligne = quantité totale / superficie de la parcelle ;
+- rang centile de la ligne parmi les parcelles du même fruit la même
+  saison (50 = médiane de la coopérative) ;
+- écart avec la saison précédente de la même parcelle et du même fruit ;
+- quartiles et P90 par (fruit, saison).
+
+La table obtenue est mise en cache (`dashboard.cache`) et recalculée
+après toute écriture sur les parcelles, récoltes ou fruits.
+"""
+import numpy as np
+from django.conf import settings
+from django.db import connections
+from django.db.models import CharField
+from django.db.models.functions import Cast
+
+from dashboard import cache as dashboard_cache
+
+from . import fruits
+from .models import Parcelle, Recolte
+
+# first month of a season: 1 = calendar year, 4 = April-March campaigns...
+SAISON_DEBUT_MOIS = getattr(settings, 'RENDEMENT_SAISON_DEBUT_MOIS', 1)
+DEPENDS_ON = ['producteurs.Parcelle', 'producteurs.Recolte', 'producteurs.Fruit']
+TIMEOUT = 24 * 3600
+CHUNK = 20000
+
+RECOLTE = np.dtype([('parcelle', 'i8'), ('fruit', 'i8'), ('date', 'M8[D]'), ('quantite', 'f8')])
+PARCELLE = np.dtype([('id', 'i8'), ('superficie', 'f8'), ('producteur', 'i8')])
+
+
+def lire(queryset, dtype):
+    """Rows of a values_list() queryset straight into a structured array.
+
+    The cursor is read directly, by chunks: the per-value converters of the
+    ORM cost more than the whole NumPy pass.
+    """
+    sql, params = queryset.query.sql_with_params()
+    morceaux = [np.empty(0, dtype=dtype)]
+    with connections[queryset.db].cursor() as cursor:
+        cursor.execute(sql, params)
+        while chunk := cursor.fetchmany(CHUNK):
+            morceaux.append(np.array(chunk, dtype=dtype))
+    return np.concatenate(morceaux)
+
+
+def _colonnes():
+    """The récoltes and parcelles columns needed by the report, as structured arrays."""
+    recoltes = lire(
+        Recolte.objects.order_by()
+        # ISO text: no date object built per row by the driver
+        .annotate(jour=Cast('date_recolte', CharField()))
+        .values_list('parcelle_id', 'fruit_id', 'jour', 'quantite'),
+        RECOLTE,
+    )
+    parcelles = lire(Parcelle.objects.order_by('id').values_list('id', 'superficie', 'producteur_id'), PARCELLE)
+    return recoltes, parcelles
+
+
+def _saisons(dates):
+    """Season (year of its first month) of each datetime64[D]."""
+    mois = dates.astype('M8[M]')
+    return (mois - (SAISON_DEBUT_MOIS - 1)).astype('M8[Y]').astype(np.int64) + 1970
+
+
+def _totaux(recoltes):
+    """Harvest totals per (parcelle, fruit, saison), sorted by that key."""
+    saison = _saisons(recoltes['date'])
+    ordre = np.lexsort((saison, recoltes['fruit'], recoltes['parcelle']))
+    p, f, s = recoltes['parcelle'][ordre], recoltes['fruit'][ordre], saison[ordre]
+    debut = np.ones(len(ordre), dtype=bool)
+    debut[1:] = (p[1:] != p[:-1]) | (f[1:] != f[:-1]) | (s[1:] != s[:-1])
+    groupe = np.cumsum(debut) - 1
+    return p[debut], f[debut], s[debut], np.bincount(groupe, weights=recoltes['quantite'][ordre])
+
+
+def _rangs_centiles(groupe, valeur):
+    """Mid-rank percentile (0-100) of each value within its group; ties share their rank."""
+    n = len(valeur)
+    ordre = np.lexsort((valeur, groupe))
+    g, v = groupe[ordre], valeur[ordre]
+    # runs of equal (group, value): every member gets the mean position of its run
+    debut_run = np.ones(n, dtype=bool)
+    debut_run[1:] = (g[1:] != g[:-1]) | (v[1:] != v[:-1])
+    run = np.cumsum(debut_run) - 1
+    debuts = np.flatnonzero(debut_run)
+    tailles = np.diff(np.append(debuts, n))
+    position = (debuts + (tailles - 1) / 2.0)[run]
+    # position within the group
+    debut_groupe = np.ones(n, dtype=bool)
+    debut_groupe[1:] = g[1:] != g[:-1]
+    starts = np.flatnonzero(debut_groupe)
+    effectifs = np.diff(np.append(starts, n))
+    idx_groupe = np.cumsum(debut_groupe) - 1
+    rang = position - starts[idx_groupe]
+    centile = np.empty(n)
+    centile[ordre] = 100.0 * (rang + 0.5) / effectifs[idx_groupe]
+    return centile
+
+
+def quantiles(groupe, valeur, qs):
+    """Linear-interpolated quantiles `qs` of `valeur` per group: (groups, counts, {q: array})."""
+    ordre = np.lexsort((valeur, groupe))
+    g, v = groupe[ordre], valeur[ordre]
+    groupes, starts, effectifs = np.unique(g, return_index=True, return_counts=True)
+    resultat = {}
+    for q in qs:
+        pos = starts + q * (effectifs - 1)
+        bas = np.floor(pos).astype(np.int64)
+        haut = np.minimum(bas + 1, starts + effectifs - 1)
+        resultat[q] = v[bas] + (v[haut] - v[bas]) * (pos - bas)
+    return groupes, effectifs, resultat
+
+
+def calculer():
+    """Uncached result table: {'lignes': column arrays, 'resume': list of dicts}."""
+    recoltes, parcelles = _colonnes()
+    parcelle, fruit, saison, quantite = _totaux(recoltes)
+    if len(parcelles):
+        # parcelles are sorted by id: position of each row's parcelle
+        pos = np.minimum(np.searchsorted(parcelles['id'], parcelle), len(parcelles) - 1)
+        # a zero area has no yield
+        garder = (parcelles['id'][pos] == parcelle) & (parcelles['superficie'][pos] > 0)
+    else:
+        pos, garder = np.zeros(len(parcelle), dtype=np.int64), np.zeros(len(parcelle), dtype=bool)
+    parcelle, fruit, saison, quantite, pos = parcelle[garder], fruit[garder], saison[garder], quantite[garder], pos[garder]
+    superficie, producteur = parcelles['superficie'][pos], parcelles['producteur'][pos]
+
+    rendement = quantite / superficie
+    # one group per (fruit, saison): the peers of a row
+    groupe = fruit * 10000 + (saison - saison.min() if len(saison) else saison)
+    centile = _rangs_centiles(groupe, rendement)
+
+    # previous season of the same parcelle and fruit: the previous row (sorted by _totaux)
+    precedent = np.full(len(rendement), np.nan)
+    suit = np.zeros(len(rendement), dtype=bool)
+    suit[1:] = (parcelle[1:] == parcelle[:-1]) & (fruit[1:] == fruit[:-1]) & (saison[1:] == saison[:-1] + 1)
+    precedent[suit] = rendement[np.flatnonzero(suit) - 1]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        evolution = np.where(precedent > 0, 100.0 * (rendement - precedent) / precedent, np.nan)
+
+    resume = []
+    if len(rendement):
+        groupes, effectifs, q = quantiles(groupe, rendement, (0.25, 0.5, 0.75, 0.9))
+        totaux = np.bincount(np.searchsorted(groupes, groupe), weights=quantite, minlength=len(groupes))
+        surfaces = np.bincount(np.searchsorted(groupes, groupe), weights=superficie, minlength=len(groupes))
+        _, premier = np.unique(groupe, return_index=True)
+        for i in range(len(groupes)):
+            resume.append({
+                'fruit_id': int(fruit[premier[i]]),
+                'fruit': fruits.nom(int(fruit[premier[i]])),
+                'saison': int(saison[premier[i]]),
+                'parcelles': int(effectifs[i]),
+                # harvest-weighted cooperative yield
+                'rendement_global': round(float(totaux[i] / surfaces[i]), 1),
+                'p25': round(float(q[0.25][i]), 1),
+                'mediane': round(float(q[0.5][i]), 1),
+                'p75': round(float(q[0.75][i]), 1),
+                'p90': round(float(q[0.9][i]), 1),
+            })
+        resume.sort(key=lambda r: (-r['saison'], r['fruit']))
+
+    return {
+        'lignes': {
+            'parcelle': parcelle, 'producteur': producteur, 'fruit': fruit,
+            'saison': saison, 'quantite': quantite, 'superficie': superficie,
+            'rendement': rendement, 'centile': centile, 'precedent': precedent, 'evolution': evolution,
+        },
+        'resume': resume,
+    }
+
+
+def table():
+    """The cached result table, recomputed after writes on parcelles, récoltes or fruits."""
+    return dashboard_cache.cached('rendements', (SAISON_DEBUT_MOIS,), calculer, depends_on=DEPENDS_ON, timeout=TIMEOUT)
+
+
+TRIS = {
+    'rendement': ('rendement', True),
+    'centile': ('centile', True),
+    'evolution': ('evolution', True),
+    'quantite': ('quantite', True),
+}
+
+
+def saisons(resultat):
+    return sorted({r['saison'] for r in resultat['resume']}, reverse=True)
+
+
+def lignes(resultat, fruit=None, saison=None, parcelle=None, producteur=None, tri='rendement', limit=100, offset=0):
+    """Filtered, sorted slice of the rows as dicts, plus the number of matching rows."""
+    col = resultat['lignes']
+    masque = np.ones(len(col['rendement']), dtype=bool)
+    for nom, valeur in (('fruit', fruit), ('saison', saison), ('parcelle', parcelle), ('producteur', producteur)):
+        if valeur is not None:
+            masque &= col[nom] == valeur
+    idx = np.flatnonzero(masque)
+    champ, desc = TRIS.get(tri, TRIS['rendement'])
+    cle = col[champ][idx]
+    # NaN (no previous season) last in both directions
+    cle = np.where(np.isnan(cle), -np.inf if desc else np.inf, cle)
+    ordre = np.lexsort((idx, -cle if desc else cle))
+    page = idx[ordre[offset:offset + limit]]
+
+    def nombre(v, n=1):
+        return None if np.isnan(v) else round(float(v), n)
+
+    return [
+        {
+            'parcelle_id': int(col['parcelle'][i]),
+            'producteur_id': int(col['producteur'][i]),
+            'fruit_id': int(col['fruit'][i]),
+            'fruit': fruits.nom(int(col['fruit'][i])),
+            'saison': int(col['saison'][i]),
+            'quantite': round(float(col['quantite'][i]), 1),
+            'superficie': round(float(col['superficie'][i]), 2),
+            'rendement': round(float(col['rendement'][i]), 1),
+            'centile': round(float(col['centile'][i]), 1),
+            'rendement_precedent': nombre(col['precedent'][i]),
+            'evolution_pct': nombre(col['evolution'][i]),
+        }
+        for i in page
+    ], len(idx)
@@ -0,0 +1,302 @@
+"""Saisie groupée des parcelles et récoltes d'un producteur.
+
+Les formulaires `ajouter_producteur` et `modifier_producteur` envoient des
+tableaux (`parcelle_nom[]`, `recolte_fruit[]`, ...). Toutes les lignes sont
+validées avant toute écriture ; les parcelles et récoltes concernées sont
+chargées en une requête par table, puis les écritures passent par
+`bulk_create` / `bulk_update` / un `delete()` filtré dans la transaction de
+l'appelant. Chaque ligne invalide produit une entrée du rapport d'erreurs.
+"""
+from datetime import date
+
+from core.signals import bulk_changed
+from . import fruits
+from .models import Parcelle, Recolte
+
+# column sizes, as in producteurs.importation.MAX_LENGTHS
+MAX_LENGTHS = {'parcelle_nom': 50, 'parcelle_adresse': 50, 'recolte_fruit': 50}
+
+
+def _column(data, key, index):
+    values = data.getlist(key)
+    return values[index].strip() if index < len(values) else ''
+
+
+def _error(kind, row, field, message):
+    return {'type': kind, 'ligne': row, 'champ': field, 'message': message}
+
+
+def _check_length(value, kind, row, field, errors):
+    if len(value) > MAX_LENGTHS[field]:
+        errors.append(_error(kind, row, field, f"Plus de {MAX_LENGTHS[field]} caractères"))
+
+
+def _parse_float(raw, kind, row, field, errors, default=0.0):
+    if not raw:
+        return default
+    try:
+        value = float(raw.replace(',', '.'))
+    except ValueError:
+        errors.append(_error(kind, row, field, f"« {raw} » n'est pas un nombre"))
+        return None
+    if value < 0:
+        errors.append(_error(kind, row, field, "La valeur doit être positive"))
+        return None
+    return value
+
+
+def _parse_date(raw, row, errors, default=None):
+    if not raw:
+        return default or date.today()
+    try:
+        return date.fromisoformat(raw)
+    except ValueError:
+        errors.append(_error('recolte', row, 'recolte_date', f"Date invalide « {raw} » (AAAA-MM-JJ)"))
+        return None
+
+
+def _parcelle_ref(ref, row, nouvelles, errors):
+    """Resolve a recolte_parcelle value to ('new', index), ('id', pk) or None (blank)."""
+    if not ref:
+        return None
+    if ref.startswith('new-'):
+        try:
+            index = int(ref.split('-', 1)[1])
+        except ValueError:
+            index = -1
+        if 0 <= index < nouvelles:
+            return ('new', index)
+        errors.append(_error('recolte', row, 'recolte_parcelle', "Nouvelle parcelle introuvable"))
+    elif ref.isdecimal():
+        return ('id', int(ref))
+    else:
+        errors.append(_error('recolte', row, 'recolte_parcelle', f"Parcelle « {ref} » invalide"))
+    return None
+
+
+def parse_lignes(data):
+    """Validate the submitted rows without touching the database.
+
+    Returns (parcelles, recoltes, errors): `parcelles` are unsaved Parcelle
+    kwargs, `recoltes` are (kwargs, parcelle_ref, row) triples where
+    parcelle_ref is ('new', index) or ('id', pk). Blank rows are ignored like before; row
+    numbers in the report start at 1 and follow the form order.
+    """
+    errors = []
+    parcelles = []
+    for i in range(len(data.getlist('parcelle_nom'))):
+        nom = _column(data, 'parcelle_nom', i)
+        if not nom:
+            continue
+        adresse = _column(data, 'parcelle_adresse', i)
+        _check_length(nom, 'parcelle', i + 1, 'parcelle_nom', errors)
+        _check_length(adresse, 'parcelle', i + 1, 'parcelle_adresse', errors)
+        superficie = _parse_float(_column(data, 'parcelle_superficie', i), 'parcelle', i + 1,
+                                  'parcelle_superficie', errors)
+        parcelles.append({
+            'nom': nom,
+            'superficie': superficie,
+            'adresse': adresse,
+        })
+
+    recoltes = []
+    for i in range(len(data.getlist('recolte_fruit'))):
+        fruit = _column(data, 'recolte_fruit', i)
+        if not fruit:
+            continue
+        row = i + 1
+        _check_length(fruit, 'recolte', row, 'recolte_fruit', errors)
+        quantite = _parse_float(_column(data, 'recolte_quantite', i), 'recolte', row,
+                                'recolte_quantite', errors)
+        date_recolte = _parse_date(_column(data, 'recolte_date', i), row, errors)
+
+        ref = _column(data, 'recolte_parcelle', i)
+        parcelle_ref = _parcelle_ref(ref, row, len(parcelles), errors)
+        if not ref:
+            errors.append(_error('recolte', row, 'recolte_parcelle', "Parcelle obligatoire"))
+
+        recoltes.append(({
+            'fruit': fruit,
+            'quantite': quantite,
+            'date_recolte': date_recolte,
+        }, parcelle_ref, row))
+    return parcelles, recoltes, errors
+
+
+def creer_parcelles_recoltes(producteur, data):
+    """Create the parcelles and récoltes submitted for `producteur`.
+
+    Must run inside `transaction.atomic()`. Returns (parcelles, recoltes,
+    errors); when `errors` is not empty nothing has been written.
+    """
+    parcelle_rows, recolte_rows, errors = parse_lignes(data)
+
+    # every existing parcelle referenced by the récoltes, in one query
+    ids = {ref[1] for _, ref, _ in recolte_rows if ref and ref[0] == 'id'}
+    existing = Parcelle.objects.in_bulk(ids) if ids else {}
+    for _, ref, row in recolte_rows:
+        if ref and ref[0] == 'id' and ref[1] not in existing:
+            errors.append(_error('recolte', row, 'recolte_parcelle', f"Parcelle #{ref[1]} introuvable"))
+    if errors:
+        errors.sort(key=lambda e: (e['type'] != 'parcelle', e['ligne']))
+        return [], [], errors
+
+    parcelles = Parcelle.objects.bulk_create(
+        [Parcelle(producteur=producteur, **fields) for fields in parcelle_rows]
+    )
+    # typed fruit names -> catalog ids (unknown fruits are created)
+    fruit_ids = fruits.resoudre({fields['fruit'] for fields, _, _ in recolte_rows})
+    recoltes = Recolte.objects.bulk_create([
+        Recolte(
+            producteur=producteur,
+            parcelle=parcelles[ref[1]] if ref[0] == 'new' else existing[ref[1]],
+            fruit_id=fruit_ids[fields['fruit']],
+            quantite=fields['quantite'],
+            date_recolte=fields['date_recolte'],
+        )
+        for fields, ref, _ in recolte_rows
+    ])
+
+    # bulk_create does not send post_save
+    if parcelles:
+        bulk_changed.send(sender=Parcelle, instances=parcelles, action='create')
+    if recoltes:
+        bulk_changed.send(sender=Recolte, instances=recoltes, action='create')
+    return parcelles, recoltes, []
+
+
+def modifier_parcelles_recoltes(producteur, data):
+    """Apply the edit form of `producteur` as a diff against its stored children.
+
+    Parcelles and récoltes are loaded once; each posted row becomes an insert,
+    an update (only when a value changed) or a delete. Rows with an id that
+    does not belong to the producteur are ignored, blank values keep the
+    stored ones. Must run inside `transaction.atomic()`; returns a dict of
+    counters and the error list (nothing is written when it is not empty).
+    """
+    errors = []
+    parcelles = {p.id: p for p in producteur.parcelle_set.all()}
+    recoltes = {r.id: r for r in producteur.recolte_set.all()}
+
+    # --- Parcelles ---
+    delete_parcelles = {int(v) for v in data.getlist('parcelle_delete') if v.isdecimal()} & parcelles.keys()
+    update_parcelles = []
+    new_parcelles = []
+    for i in range(len(data.getlist('parcelle_nom'))):
+        row = i + 1
+        pid = _column(data, 'parcelle_id', i)
+        nom = _column(data, 'parcelle_nom', i)
+        adresse = _column(data, 'parcelle_adresse', i)
+        _check_length(nom, 'parcelle', row, 'parcelle_nom', errors)
+        _check_length(adresse, 'parcelle', row, 'parcelle_adresse', errors)
+        if pid:
+            parcelle = parcelles.get(int(pid)) if pid.isdecimal() else None
+            if parcelle is None or parcelle.id in delete_parcelles:
+                continue
+            values = {
+                'nom': nom or parcelle.nom,
+                'superficie': _parse_float(_column(data, 'parcelle_superficie', i), 'parcelle', row,
+                                           'parcelle_superficie', errors, default=parcelle.superficie),
+                'adresse': adresse or parcelle.adresse,
+            }
+            if any(getattr(parcelle, f) != v for f, v in values.items()):
+                for f, v in values.items():
+                    setattr(parcelle, f, v)
+                update_parcelles.append(parcelle)
+        elif nom:
+            superficie = _parse_float(_column(data, 'parcelle_superficie', i), 'parcelle', row,
+                                      'parcelle_superficie', errors)
+            new_parcelles.append(Parcelle(producteur=producteur, nom=nom, superficie=superficie, adresse=adresse))
+
+    # --- Récoltes ---
+    delete_recoltes = {int(v) for v in data.getlist('recolte_delete') if v.isdecimal()} & recoltes.keys()
+    rows = []
+    for i in range(len(data.getlist('recolte_fruit'))):
+        row = i + 1
+        rid = _column(data, 'recolte_id', i)
+        recolte = None
+        if rid:
+            recolte = recoltes.get(int(rid)) if rid.isdecimal() else None
+            if recolte is None or recolte.id in delete_recoltes:
+                continue
+        fruit = _column(data, 'recolte_fruit', i)
+        if recolte is None and not fruit:
+            continue
+        _check_length(fruit, 'recolte', row, 'recolte_fruit', errors)
+        ref = _parcelle_ref(_column(data, 'recolte_parcelle', i), row, len(new_parcelles), errors)
+        if recolte is not None and recolte.parcelle_id in delete_parcelles and ref in (None, ('id', recolte.parcelle_id)):
+            continue  # removed with its parcelle (CASCADE)
+        rows.append((row, recolte, {
+            # typed name, resolved to a catalog id once the rows are valid
+            'fruit': fruit,
+            'quantite': _parse_float(_column(data, 'recolte_quantite', i), 'recolte', row, 'recolte_quantite',
+                                     errors, default=recolte.quantite if recolte else 0.0),
+            'date_recolte': _parse_date(_column(data, 'recolte_date', i), row, errors,
+                                        default=recolte.date_recolte if recolte else None),
+        }, ref))
+
+    # parcelles of other producteurs picked by id: one query for all of them
+    foreign = {ref[1] for *_, ref in rows if ref and ref[0] == 'id'} - parcelles.keys()
+    known = dict(parcelles)
+    if foreign:
+        known.update(Parcelle.objects.in_bulk(foreign))
+    for row, recolte, _, ref in rows:
+        if ref and ref[0] == 'id' and (ref[1] not in known or ref[1] in delete_parcelles):
+            errors.append(_error('recolte', row, 'recolte_parcelle', f"Parcelle #{ref[1]} introuvable"))
+        elif recolte is None and ref is None:
+            errors.append(_error('recolte', row, 'recolte_parcelle', "Parcelle obligatoire"))
+
+    stats = {'crees': 0, 'modifies': 0, 'supprimes': 0}
+    if errors:
+        errors.sort(key=lambda e: (e['type'] != 'parcelle', e['ligne']))
+        return stats, errors
+
+    # deletes go through the collector: cascades (transformations, stocks...)
+    # and post_delete receivers still run
+    if delete_recoltes:
+        Recolte.objects.filter(producteur=producteur, id__in=delete_recoltes).delete()
+    if update_parcelles:
+        Parcelle.objects.bulk_update(update_parcelles, ['nom', 'superficie', 'adresse'])
+    if new_parcelles:
+        new_parcelles = Parcelle.objects.bulk_create(new_parcelles)
+
+    # typed fruit names -> catalog ids (unknown fruits are created)
+    fruit_ids = fruits.resoudre({values['fruit'] for _, _, values, _ in rows if values['fruit']})
+    update_recoltes = []
+    new_recoltes = []
+    for row, recolte, values, ref in rows:
+        fruit = values.pop('fruit')
+        values['fruit_id'] = fruit_ids[fruit] if fruit else recolte.fruit_id
+        if ref is not None:
+            values['parcelle'] = new_parcelles[ref[1]] if ref[0] == 'new' else known[ref[1]]
+        if recolte is None:
+            new_recoltes.append(Recolte(producteur=producteur, **values))
+            continue
+        changed = False
+        for f, v in values.items():
+            current = recolte.parcelle_id if f == 'parcelle' else getattr(recolte, f)
+            if current != (v.pk if f == 'parcelle' else v):
+                setattr(recolte, f, v)
+                changed = True
+        if changed:
+            update_recoltes.append(recolte)
+    if update_recoltes:
+        Recolte.objects.bulk_update(update_recoltes, ['fruit', 'quantite', 'date_recolte', 'parcelle'])
+    if new_recoltes:
+        new_recoltes = Recolte.objects.bulk_create(new_recoltes)
+    if delete_parcelles:
+        # after the récolte updates so a récolte moved away is not cascaded
+        Parcelle.objects.filter(producteur=producteur, id__in=delete_parcelles).delete()
+
+    # bulk_create / bulk_update do not send post_save
+    for model, instances, action in (
+        (Parcelle, new_parcelles, 'create'), (Parcelle, update_parcelles, 'update'),
+        (Recolte, new_recoltes, 'create'), (Recolte, update_recoltes, 'update'),
+    ):
+        if instances:
+            bulk_changed.send(sender=model, instances=instances, action=action)
+
+    stats['crees'] = len(new_parcelles) + len(new_recoltes)
+    stats['modifies'] = len(update_parcelles) + len(update_recoltes)
+    stats['supprimes'] = len(delete_parcelles) + len(delete_recoltes)
+    return stats, []
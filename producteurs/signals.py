@@ -0,0 +1,58 @@
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from core.signals import bulk_changed
+from . import compteurs, fruits
+from .models import Fruit, Parcelle, Producteur, Recolte
+
+
+#---------------------------- Compteurs du producteur ---------------------------
+
+def _remember(sender, instance, raw=False, **kwargs):
+    """Keep the stored state of an updated row so its old contribution can be removed."""
+    instance._compteurs_old = None
+    if raw or not instance.pk:
+        return
+    old = sender.objects.filter(pk=instance.pk).first()
+    if old is not None:
+        instance._compteurs_old = compteurs.snapshot(old)
+
+
+def _saved(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    compteurs.move(getattr(instance, '_compteurs_old', None), compteurs.snapshot(instance))
+    instance._compteurs_old = None
+
+
+def _deleted(sender, instance, **kwargs):
+    compteurs.apply(compteurs.snapshot(instance), -1)
+
+
+def _bulk_changed(sender, instances, **kwargs):
+    # bulk_update gives no old state: recompute the producteurs touched
+    compteurs.recalculer({obj.producteur_id for obj in instances})
+
+
+for _model in (Parcelle, Recolte):
+    _name = _model._meta.model_name
+    pre_save.connect(_remember, sender=_model, dispatch_uid=f'compteurs_pre_save_{_name}')
+    post_save.connect(_saved, sender=_model, dispatch_uid=f'compteurs_save_{_name}')
+    post_delete.connect(_deleted, sender=_model, dispatch_uid=f'compteurs_delete_{_name}')
+    bulk_changed.connect(_bulk_changed, sender=_model, dispatch_uid=f'compteurs_bulk_{_name}')
+
+
+@receiver(pre_delete, sender=Producteur)
+def _producteur_deleting(sender, instance, **kwargs):
+    compteurs.deleting(instance.pk)
+
+
+@receiver(post_delete, sender=Producteur)
+def _producteur_deleted(sender, instance, **kwargs):
+    compteurs.deleted(instance.pk)
+
+
+#---------------------------- Catalogue des fruits ---------------------------
+
+post_save.connect(fruits._changed, sender=Fruit, dispatch_uid='fruits_catalogue_save')
+post_delete.connect(fruits._changed, sender=Fruit, dispatch_uid='fruits_catalogue_delete')
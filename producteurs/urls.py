@@ -5,6 +5,7 @@ urlpatterns = [
     #----------------------- Routes Producteur -----------------------------------------
     path('producteurs/', views.liste_producteurs, name='liste_producteurs'),
     path('producteurs/ajouter/', views.ajouter_producteur, name='ajouter_producteur'),
+    path('producteurs/importer/', views.importer_producteurs, name='importer_producteurs'),
     path('producteurs/<int:id>/', views.details_producteur, name='details_producteur'),
     path('producteurs/<int:id>/modifier/', views.modifier_producteur, name='modifier_producteur'),
     path('producteurs/<int:id>/supprimer/', views.supprimer_producteur, name='supprimer_producteur'),
@@ -12,6 +13,8 @@ urlpatterns = [
     #----------------------- Routes Parcelle -----------------------------------------
     path('parcelles/', views.liste_parcelles, name='liste_parcelles'),
     path('parcelles/ajouter/', views.ajouter_parcelle, name='ajouter_parcelle'),
+    path('parcelles/geo/bbox/', views.parcelles_bbox, name='parcelles_bbox'),
+    path('parcelles/geo/proches/', views.parcelles_proches, name='parcelles_proches'),
     path('parcelles/<int:id>/', views.details_parcelle, name='details_parcelle'),
     path('parcelles/<int:id>/modifier/', views.modifier_parcelle, name='modifier_parcelle'),
     path('parcelles/<int:id>/supprimer/', views.supprimer_parcelle, name='supprimer_parcelle'),
@@ -22,4 +25,8 @@ urlpatterns = [
     path('recoltes/<int:id>/', views.details_recolte, name='details_recolte'),
     path('recoltes/<int:id>/modifier/', views.modifier_recolte, name='modifier_recolte'),
     path('recoltes/<int:id>/supprimer/', views.supprimer_recolte, name='supprimer_recolte'),
+
+    #----------------------- Routes Rendements -----------------------------------------
+    path('rendements/', views.rapport_rendements, name='rapport_rendements'),
+    path('rendements/api/', views.api_rendements, name='api_rendements'),
 ]
@@ -1,11 +1,29 @@
+import uuid
+from datetime import date
+
+from django.core import signing
 from django.shortcuts import render, get_object_or_404, redirect
+from django.urls import reverse
 from django.http import JsonResponse
+from django.db import transaction
 from .models import Producteur, Parcelle, Recolte
+from .services import creer_parcelles_recoltes, modifier_parcelles_recoltes
+from .importation import FichierInvalide, Importateur, lire
+from . import fruits, geo, rendements
+from core import lookup, search
+from core.pagination import KeysetPaginator, approximate_count, query_string
 
 #---------------------------------- VUES POUR LES PRODUCTEURS ---------------------------------
 
-from django.core.paginator import Paginator
-from django.db.models import Q, Count
+from django.db.models import Exists, OuterRef, Prefetch
+
+# tri -> keyset ordering; each one has its composite index (producteurs.models)
+TRIS_PRODUCTEURS = {
+    'nom': ('nom', 'prenom', 'id'),
+    'parcelles': ('-nb_parcelles', '-id'),
+    'recoltes': ('-nb_recoltes', '-id'),
+    'quantite': ('-quantite_recoltee', '-id'),
+}
 
 
 def liste_producteurs(request):
@@ -15,311 +33,205 @@ def liste_producteurs(request):
     - q: search across nom, prenom, telephone
     - has_parcelle: '1' to require at least one parcelle, '0' to require none
     - has_recolte: '1' to require at least one recolte, '0' to require none
-    - page: page number for pagination
+    - tri: 'nom' (default), 'parcelles', 'recoltes' or 'quantite' (largest first)
+    - cursor: opaque keyset cursor on the sort key, see core/pagination.py
+    - total: '1' to show an approximate total
     """
     qs = Producteur.objects.all()
 
-    # annotate counts to allow filtering without extra queries later
-    qs = qs.annotate(_parcelle_count=Count('parcelle'), _recolte_count=Count('recolte'))
-
     # search q can be applied to a specific field when 'field' param is present
+    # (trigram index, see core/search.py)
     q = request.GET.get('q', '').strip()
     field = request.GET.get('field', '').strip()
     allowed_fields = {'nom', 'prenom', 'adresse', 'telephone'}
     if q:
-        if field in allowed_fields:
-            qs = qs.filter(**{f"{field}__icontains": q})
-        else:
-            qs = qs.filter(
-                Q(nom__icontains=q) | Q(prenom__icontains=q) | Q(telephone__icontains=q)
-            )
+        champs = (field,) if field in allowed_fields else ('nom', 'prenom', 'telephone')
+        qs = search.filtrer(qs, q, champs)
 
+    # denormalized counters (producteurs.compteurs): indexed, no join at all
     has_parcelle = request.GET.get('has_parcelle')
-    if has_parcelle == '1':
-        qs = qs.filter(_parcelle_count__gt=0)
-    elif has_parcelle == '0':
-        qs = qs.filter(_parcelle_count=0)
+    if has_parcelle in ('0', '1'):
+        qs = qs.filter(nb_parcelles__gt=0) if has_parcelle == '1' else qs.filter(nb_parcelles=0)
 
     has_recolte = request.GET.get('has_recolte')
-    if has_recolte == '1':
-        qs = qs.filter(_recolte_count__gt=0)
-    elif has_recolte == '0':
-        qs = qs.filter(_recolte_count=0)
+    if has_recolte in ('0', '1'):
+        qs = qs.filter(nb_recoltes__gt=0) if has_recolte == '1' else qs.filter(nb_recoltes=0)
 
-    # filter by fruits (multi-select)
-    selected_fruits = request.GET.getlist('fruits')
+    # filter by fruits (multi-select of catalog ids), on the (producteur, fruit) index
+    selected_fruits = [int(v) for v in request.GET.getlist('fruits') if v.isdecimal()]
     if selected_fruits:
-        qs = qs.filter(recolte__fruit__in=selected_fruits).distinct()
-
-    # prefetch related small sets to avoid N+1 when rendering parcelles/recoltes
-    qs = qs.prefetch_related('parcelle_set', 'recolte_set')
-
-    # pagination
+        qs = qs.filter(Exists(Recolte.objects.filter(producteur=OuterRef('pk'), fruit_id__in=selected_fruits)))
+
+    # only the first two parcelles / recoltes are shown, the totals come from the counters
+    qs = qs.prefetch_related(
+        Prefetch('parcelle_set', queryset=Parcelle.objects.order_by('id')[:2], to_attr='apercu_parcelles'),
+        Prefetch('recolte_set', queryset=Recolte.objects.select_related('fruit').order_by('-date_recolte', '-id')[:2],
+                 to_attr='apercu_recoltes'),
+    )
+
+    # keyset pagination: deep pages cost the same as the first one
+    tri = request.GET.get('tri', 'nom')
+    if tri not in TRIS_PRODUCTEURS:
+        tri = 'nom'
     page_size = 12
-    paginator = Paginator(qs.order_by('nom', 'prenom'), page_size)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    page_obj = KeysetPaginator(qs, TRIS_PRODUCTEURS[tri], page_size).page(request.GET.get('cursor'))
+    total, total_exact = approximate_count(qs) if request.GET.get('total') == '1' else (None, False)
 
     context = {
         'producteurs': page_obj.object_list,
         'page_obj': page_obj,
-        'paginator': paginator,
+        'total': total,
+        'total_exact': total_exact,
+        # current filters without the cursor, for the navigation links
+        'qstr': query_string(request, 'cursor'),
         'query': q,
         'has_parcelle': has_parcelle,
         'has_recolte': has_recolte,
         'field': field,
+        'tri': tri,
         'selected_fruits': selected_fruits,
-        # supply available fruits to populate the multi-select
-        'fruits_choices': list(Recolte.objects.order_by('fruit').values_list('fruit', flat=True).distinct()),
+        # the fruit catalog, from the in-process cache (no query)
+        'fruits_choices': fruits.choix(),
     }
     return render(request, 'producteur/liste.html', context)
 
 
 def ajouter_producteur(request):
-    parcelles = Parcelle.objects.all()
+    """Create a producteur with its parcelles and recoltes in one transaction.
+
+    The rows are validated before anything is written; if any row is invalid
+    nothing is saved and the per-row report is returned (`errors` in the
+    template context, or a 400 JSON body for AJAX calls).
+    """
     if request.method == "POST":
+        ajax = request.headers.get('x-requested-with') == 'XMLHttpRequest' or request.POST.get('ajax') == '1'
+        has_rows = bool(request.POST.getlist('parcelle_nom') or request.POST.getlist('recolte_fruit'))
         try:
-            # if producteur already created via AJAX, reuse it
-            existing_id = request.POST.get('producteur_id') or request.POST.get('producteur')
-            if existing_id:
-                try:
-                    producteur = Producteur.objects.get(id=int(existing_id))
-                except Exception:
-                    producteur = None
-            else:
+            with transaction.atomic():
+                # if producteur already created via AJAX, reuse it
+                existing_id = request.POST.get('producteur_id') or request.POST.get('producteur')
                 producteur = None
-
-            if not producteur:
-                # create the producteur
-                nom = request.POST.get('nom', '').strip()
-                prenom = request.POST.get('prenom', '').strip()
-                adresse = request.POST.get('adresse', '').strip()
-                telephone = request.POST.get('telephone', '').strip()
-                
-                # Générer un téléphone unique si vide (pour éviter l'erreur unique constraint)
-                if not telephone:
-                    import uuid
-                    telephone = f"temp-{uuid.uuid4().hex[:8]}"
-
-                producteur = Producteur.objects.create(
-                    nom=nom,
-                    prenom=prenom,
-                    adresse=adresse,
-                    telephone=telephone
-                )
-
-            # If this is an AJAX call asking to create only the producteur (from ajouter page), return JSON
-            if request.headers.get('x-requested-with') == 'XMLHttpRequest' or request.POST.get('ajax') == '1':
-                return JsonResponse({'id': producteur.id, 'nom': f"{producteur.nom} {producteur.prenom}"})
-
-            # Create any new parcelles submitted (arrays)
-            parcelle_noms = request.POST.getlist('parcelle_nom')
-            parcelle_superficies = request.POST.getlist('parcelle_superficie')
-            parcelle_adresses = request.POST.getlist('parcelle_adresse')
-
-            new_parcelles = []
-            for i, pnom in enumerate(parcelle_noms):
-                pnom = pnom.strip()
-                if not pnom:
-                    continue
-                superficie = parcelle_superficies[i] if i < len(parcelle_superficies) else ''
-                adresse_p = parcelle_adresses[i] if i < len(parcelle_adresses) else ''
-                try:
-                    superficie_val = float(superficie) if superficie else 0
-                except ValueError:
-                    superficie_val = 0
-                parc = Parcelle.objects.create(
-                    nom=pnom,
-                    superficie=superficie_val,
-                    adresse=adresse_p,
-                    producteur=producteur
-                )
-                new_parcelles.append(parc)
-
-            # Create recoltes (can reference existing parcelles by id or new-parcelle indexes 'new-0')
-            recolte_fruits = request.POST.getlist('recolte_fruit')
-            recolte_quantites = request.POST.getlist('recolte_quantite')
-            recolte_dates = request.POST.getlist('recolte_date')
-            recolte_parcelles = request.POST.getlist('recolte_parcelle')
-
-            from datetime import date as date_module
-            for i, fruit in enumerate(recolte_fruits):
-                fruit = fruit.strip()
-                if not fruit:
-                    continue
-                quantite = recolte_quantites[i] if i < len(recolte_quantites) else ''
-                date_recolte = recolte_dates[i] if i < len(recolte_dates) else ''
-                parcelle_ref = recolte_parcelles[i] if i < len(recolte_parcelles) else ''
-
-                # determine the Parcelle instance
-                parcelle_obj = None
-                if parcelle_ref and parcelle_ref.startswith('new-'):
-                    try:
-                        idx = int(parcelle_ref.split('-', 1)[1])
-                        parcelle_obj = new_parcelles[idx]
-                    except Exception:
-                        parcelle_obj = None
-                elif parcelle_ref:
-                    try:
-                        parcelle_obj = Parcelle.objects.get(id=int(parcelle_ref))
-                    except Exception:
-                        parcelle_obj = None
-
-                # Ne créer la récolte que si on a une parcelle valide (le modèle l'exige)
-                if parcelle_obj:
-                    try:
-                        quantite_val = float(quantite) if quantite else 0
-                    except ValueError:
-                        quantite_val = 0
-                    
-                    # Utiliser la date du jour si vide
-                    date_recolte_val = date_recolte if date_recolte else date_module.today()
-                    
-                    Recolte.objects.create(
-                        fruit=fruit,
-                        quantite=quantite_val,
-                        date_recolte=date_recolte_val,
-                        producteur=producteur,
-                        parcelle=parcelle_obj
+                if existing_id and existing_id.isdecimal():
+                    producteur = Producteur.objects.filter(id=int(existing_id)).first()
+
+                if not producteur:
+                    # create the producteur
+                    telephone = request.POST.get('telephone', '').strip()
+                    # Générer un téléphone unique si vide (pour éviter l'erreur unique constraint)
+                    if not telephone:
+                        telephone = f"temp-{uuid.uuid4().hex[:8]}"
+                    producteur = Producteur.objects.create(
+                        nom=request.POST.get('nom', '').strip(),
+                        prenom=request.POST.get('prenom', '').strip(),
+                        adresse=request.POST.get('adresse', '').strip(),
+                        telephone=telephone
                     )
 
-            return redirect('details_producteur', producteur.id)
+                # AJAX call asking to create only the producteur (from ajouter page)
+                if ajax and not has_rows:
+                    return JsonResponse({'id': producteur.id, 'nom': f"{producteur.nom} {producteur.prenom}"})
+
+                # parcelles + recoltes (arrays, recolte_parcelle = id or 'new-<index>')
+                parcelles_crees, recoltes_creees, erreurs = creer_parcelles_recoltes(producteur, request.POST)
+                if erreurs:
+                    # rien n'est écrit, pas même le producteur créé ci-dessus
+                    transaction.set_rollback(True)
         except Exception as e:
             # En cas d'erreur, afficher la page avec un message d'erreur
-            return render(request, 'producteur/ajouter.html', {'parcelles': parcelles, 'error': str(e)})
+            if ajax:
+                return JsonResponse({'errors': [{'type': 'producteur', 'ligne': None, 'champ': None, 'message': str(e)}]}, status=400)
+            return render(request, 'producteur/ajouter.html', {'error': str(e)})
+
+        if erreurs:
+            if ajax:
+                return JsonResponse({'errors': erreurs}, status=400)
+            return render(request, 'producteur/ajouter.html', {'errors': erreurs}, status=400)
+        if ajax:
+            return JsonResponse({
+                'id': producteur.id,
+                'parcelles': [p.id for p in parcelles_crees],
+                'recoltes': [r.id for r in recoltes_creees],
+            })
+        return redirect('details_producteur', producteur.id)
 
-    return render(request, 'producteur/ajouter.html', {'parcelles': parcelles})
+    # a new producteur has no parcelle yet: the recolte selects only list the
+    # ones saved from this page (added by the script), not the whole table
+    return render(request, 'producteur/ajouter.html')
 
 
 
 
 def modifier_producteur(request, id):
+    """Edit a producteur and its parcelles/recoltes.
+
+    The posted rows are diffed against the stored children
+    (`services.modifier_parcelles_recoltes`) and written with bulk operations
+    in one transaction: a fixed number of queries whatever the row count.
+    """
     producteur = get_object_or_404(Producteur, id=id)
-    # fetch related objects for the form
-    parcelles_existantes = list(producteur.parcelle_set.all())
-    recoltes_existantes = list(producteur.recolte_set.all())
 
+    error = None
     if request.method == "POST":
-        # Update basic producteur info
-        producteur.nom = request.POST.get('nom', producteur.nom).strip()
-        producteur.prenom = request.POST.get('prenom', producteur.prenom).strip()
-        producteur.adresse = request.POST.get('adresse', producteur.adresse).strip()
-        producteur.telephone = request.POST.get('telephone', producteur.telephone).strip()
-        producteur.save()
-
-        # --- Parcelles ---
-        parcelle_ids = request.POST.getlist('parcelle_id')
-        parcelle_noms = request.POST.getlist('parcelle_nom')
-        parcelle_superficies = request.POST.getlist('parcelle_superficie')
-        parcelle_adresses = request.POST.getlist('parcelle_adresse')
-        parcelle_deletes = request.POST.getlist('parcelle_delete')  # list of ids to delete
-
-        new_parcelles = []
-        for i, nom in enumerate(parcelle_noms):
-            nom = nom.strip()
-            pid = parcelle_ids[i] if i < len(parcelle_ids) else ''
-            superficie = parcelle_superficies[i] if i < len(parcelle_superficies) else 0
-            adresse_p = parcelle_adresses[i] if i < len(parcelle_adresses) else ''
-
-            if pid:  # existing parcelle
-                try:
-                    parc = Parcelle.objects.get(id=int(pid), producteur=producteur)
-                except Exception:
-                    continue
-                if str(parc.id) in parcelle_deletes:
-                    parc.delete()
-                    continue
-                parc.nom = nom or parc.nom
-                try:
-                    parc.superficie = float(superficie) if superficie != '' else parc.superficie
-                except Exception:
-                    pass
-                parc.adresse = adresse_p or parc.adresse
-                parc.save()
-            else:
-                # new parcelle
-                if not nom:
-                    continue
-                try:
-                    superficie_val = float(superficie) if superficie != '' else 0
-                except Exception:
-                    superficie_val = 0
-                parc = Parcelle.objects.create(
-                    nom=nom,
-                    superficie=superficie_val,
-                    adresse=adresse_p,
-                    producteur=producteur
-                )
-                new_parcelles.append(parc)
-
-        # --- Récoltes ---
-        recolte_ids = request.POST.getlist('recolte_id')
-        recolte_fruits = request.POST.getlist('recolte_fruit')
-        recolte_quantites = request.POST.getlist('recolte_quantite')
-        recolte_dates = request.POST.getlist('recolte_date')
-        recolte_parcelles = request.POST.getlist('recolte_parcelle')
-        recolte_deletes = request.POST.getlist('recolte_delete')
-
-        for i, fruit in enumerate(recolte_fruits):
-            fruit = fruit.strip()
-            rid = recolte_ids[i] if i < len(recolte_ids) else ''
-            quantite = recolte_quantites[i] if i < len(recolte_quantites) else 0
-            date_r = recolte_dates[i] if i < len(recolte_dates) else None
-            parc_ref = recolte_parcelles[i] if i < len(recolte_parcelles) else ''
-
-            # Resolve parcelle: existing id or newly created referenced by new-<index>
-            parcelle_obj = None
-            if parc_ref:
-                if isinstance(parc_ref, str) and parc_ref.startswith('new-'):
-                    try:
-                        idx = int(parc_ref.split('-', 1)[1])
-                        parcelle_obj = new_parcelles[idx]
-                    except Exception:
-                        parcelle_obj = None
-                else:
-                    try:
-                        parcelle_obj = Parcelle.objects.get(id=int(parc_ref))
-                    except Exception:
-                        parcelle_obj = None
-
-            if rid:  # existing recolte
-                try:
-                    recolte = Recolte.objects.get(id=int(rid), producteur=producteur)
-                except Exception:
-                    continue
-                if str(recolte.id) in recolte_deletes:
-                    recolte.delete()
-                    continue
-                recolte.fruit = fruit or recolte.fruit
-                try:
-                    recolte.quantite = float(quantite) if quantite != '' else recolte.quantite
-                except Exception:
-                    pass
-                recolte.date_recolte = date_r or recolte.date_recolte
-                recolte.parcelle = parcelle_obj or recolte.parcelle
-                recolte.save()
-            else:
-                # new recolte
-                if not fruit:
-                    continue
-                try:
-                    quant_val = float(quantite) if quantite != '' else 0
-                except Exception:
-                    quant_val = 0
-                Recolte.objects.create(
-                    fruit=fruit,
-                    quantite=quant_val,
-                    date_recolte=(date_r or None),
-                    producteur=producteur,
-                    parcelle=parcelle_obj
-                )
+        erreurs = []
+        try:
+            with transaction.atomic():
+                # Update basic producteur info
+                producteur.nom = request.POST.get('nom', producteur.nom).strip()
+                producteur.prenom = request.POST.get('prenom', producteur.prenom).strip()
+                producteur.adresse = request.POST.get('adresse', producteur.adresse).strip()
+                producteur.telephone = request.POST.get('telephone', producteur.telephone).strip()
+                producteur.save()
+
+                _, erreurs = modifier_parcelles_recoltes(producteur, request.POST)
+                if erreurs:
+                    transaction.set_rollback(True)
+        except Exception as e:
+            # comme ajouter_producteur : rien n'est écrit, le formulaire affiche l'erreur
+            error = str(e)
+
+        if not erreurs and error is None:
+            return redirect('details_producteur', producteur.id)
+        producteur.refresh_from_db()
+
+    # GET (or invalid POST): render form with existing parcelles and recoltes
+    parcelles = list(Parcelle.objects.filter(producteur=producteur))
+    recoltes = list(Recolte.objects.filter(producteur=producteur).select_related('fruit'))
+    context = {'producteur': producteur, 'parcelles': parcelles, 'recoltes': recoltes}
+    if request.method == "POST":
+        context['errors'] = erreurs
+        context['error'] = error
+        return render(request, 'producteur/modifier.html', context, status=400)
+    return render(request, 'producteur/modifier.html', context)
 
-        return redirect('details_producteur', producteur.id)
 
-    # GET: render form with existing parcelles and recoltes
-    parcelles = Parcelle.objects.filter(producteur=producteur)
-    recoltes = Recolte.objects.filter(producteur=producteur)
-    return render(request, 'producteur/modifier.html', {'producteur': producteur, 'parcelles': parcelles, 'recoltes': recoltes})
+MAX_REJETS_AFFICHES = 200
+
+
+def importer_producteurs(request):
+    """Upload a CSV/XLSX of producteurs / parcelles / recoltes (see producteurs.importation)."""
+    context = {}
+    if request.method == "POST" and request.FILES.get('fichier'):
+        upload = request.FILES['fichier']
+        rejets = []
+
+        def on_reject(ligne, message):
+            # only the first ones are kept: the page has to stay readable
+            if len(rejets) < MAX_REJETS_AFFICHES:
+                rejets.append({'ligne': ligne, 'message': message})
+
+        importateur = Importateur(on_reject=on_reject)
+        try:
+            context['stats'] = importateur.importer(lire(upload.file, upload.name))
+        except FichierInvalide as e:
+            context['error'] = str(e)
+            if importateur.stats['lignes']:
+                # unreadable past the start: the batches before are already saved
+                context['stats'] = importateur.stats
+        context['rejets'] = rejets
+        context['fichier'] = upload.name
+    elif request.method == "POST":
+        context['error'] = "Aucun fichier envoyé"
+    return render(request, 'producteur/importer.html', context)
 
 
 def supprimer_producteur(request, id):
@@ -329,19 +241,137 @@ def supprimer_producteur(request, id):
 
 
 def details_producteur(request, id):
-    producteur = get_object_or_404(Producteur, id=id)
+    producteur = get_object_or_404(
+        Producteur.objects.prefetch_related(Prefetch('recolte_set', queryset=Recolte.objects.select_related('fruit'))),
+        id=id,
+    )
     return render(request, 'producteur/details.html', {'producteur': producteur})
 
 
 #---------------------------------- VUES POUR LES PARCELLES ---------------------------------
 
+def _float_param(request, name):
+    try:
+        return float(request.GET.get(name, '').replace(',', '.'))
+    except ValueError:
+        return None
+
+
+def _date_param(request, name):
+    try:
+        return date.fromisoformat(request.GET.get(name, ''))
+    except ValueError:
+        return None
+
+
+def _filtres_communs(request, qs, prefix=''):
+    """Producteur / superficie filters shared by the parcelle and recolte listings.
+
+    `prefix` is the path from the listed model to the parcelle ('' or 'parcelle__').
+    Returns (queryset, context entries).
+    """
+    producteur_id = request.GET.get('producteur', '')
+    producteur = None
+    if producteur_id.isdecimal():
+        producteur = Producteur.objects.filter(id=int(producteur_id)).first()
+        qs = qs.filter(producteur_id=int(producteur_id))
+
+    # producteur search through its trigram index, as a subquery
+    producteur_q = request.GET.get('producteur_q', '').strip()
+    if producteur_q:
+        producteurs = search.filtrer(Producteur.objects.all(), producteur_q, ('nom', 'prenom', 'telephone'))
+        qs = qs.filter(producteur__in=producteurs.values('id'))
+
+    superficie_min = _float_param(request, 'superficie_min')
+    superficie_max = _float_param(request, 'superficie_max')
+    if superficie_min is not None:
+        qs = qs.filter(**{f'{prefix}superficie__gte': superficie_min})
+    if superficie_max is not None:
+        qs = qs.filter(**{f'{prefix}superficie__lte': superficie_max})
+
+    date_debut = _date_param(request, 'date_debut')
+    date_fin = _date_param(request, 'date_fin')
+    selected_fruits = [int(v) for v in request.GET.getlist('fruits') if v.isdecimal()]
+    return qs, {
+        'producteur': producteur,
+        'producteur_q': producteur_q,
+        'superficie_min': superficie_min,
+        'superficie_max': superficie_max,
+        'date_debut': date_debut,
+        'date_fin': date_fin,
+        'selected_fruits': selected_fruits,
+        'fruits_choices': fruits.choix(),
+    }
+
+
+# tri -> keyset ordering, each backed by an index of producteurs.models
+TRIS_PARCELLES = {
+    'nom': ('nom', 'id'),
+    'superficie': ('-superficie', '-id'),
+}
+
+
 def liste_parcelles(request):
-    parcelles = Parcelle.objects.all()
-    return render(request, 'parcelle/liste.html', {'parcelles': parcelles})
+    """List parcelles with filters and keyset pagination.
+
+    Supported GET params:
+    - producteur: producteur id; producteur_q: search on the producteur
+    - q: parcelle name contains
+    - superficie_min / superficie_max: area range (ha)
+    - fruits, date_debut, date_fin: parcelles with a recolte of these fruits
+      in this date range
+    - tri: 'nom' (default) or 'superficie' (largest first)
+    - cursor / total: as in liste_producteurs
+    """
+    qs, context = _filtres_communs(request, Parcelle.objects.select_related('producteur'))
+
+    q = request.GET.get('q', '').strip()
+    if q:
+        qs = qs.filter(nom__icontains=q)
+
+    # one EXISTS on the recolte (parcelle, fruit, date) index
+    recoltes = {}
+    if context['selected_fruits']:
+        recoltes['fruit_id__in'] = context['selected_fruits']
+    if context['date_debut']:
+        recoltes['date_recolte__gte'] = context['date_debut']
+    if context['date_fin']:
+        recoltes['date_recolte__lte'] = context['date_fin']
+    if recoltes:
+        qs = qs.filter(Exists(Recolte.objects.filter(parcelle=OuterRef('pk'), **recoltes)))
+
+    tri = request.GET.get('tri', 'nom')
+    if tri not in TRIS_PARCELLES:
+        tri = 'nom'
+    page_obj = KeysetPaginator(qs, TRIS_PARCELLES[tri], 20).page(request.GET.get('cursor'))
+    total, total_exact = approximate_count(qs) if request.GET.get('total') == '1' else (None, False)
+
+    context.update({
+        'parcelles': page_obj.object_list,
+        'page_obj': page_obj,
+        'total': total,
+        'total_exact': total_exact,
+        'qstr': query_string(request, 'cursor'),
+        'query': q,
+        'tri': tri,
+    })
+    return render(request, 'parcelle/liste.html', context)
+
+
+def _coordonnees(data):
+    """(latitude, longitude) posted with a parcelle, (None, None) when blank or invalid."""
+    try:
+        latitude = float(data.get('latitude', '').replace(',', '.'))
+        longitude = float(data.get('longitude', '').replace(',', '.'))
+    except ValueError:
+        return None, None
+    return (latitude, longitude) if geo.valide(latitude, longitude) else (None, None)
 
 
+# the single-row write views are atomic: the producteur counters
+# (producteurs.signals) are updated in the same transaction as the row
+@transaction.atomic
 def ajouter_parcelle(request):
-    producteurs = Producteur.objects.all()
     if request.method == "POST":
         nom = request.POST['nom']
         superficie = request.POST['superficie']
@@ -349,11 +379,14 @@ def ajouter_parcelle(request):
         producteur_id = request.POST['producteur']
         producteur = get_object_or_404(Producteur, id=producteur_id)
 
+        latitude, longitude = _coordonnees(request.POST)
         Parcelle.objects.create(
             nom=nom,
             superficie=superficie,
             adresse=adresse,
-            producteur=producteur
+            producteur=producteur,
+            latitude=latitude,
+            longitude=longitude,
         )
         # if AJAX request, return JSON with created parcelle id and name
         if request.headers.get('x-requested-with') == 'XMLHttpRequest' or request.POST.get('ajax') == '1':
@@ -362,12 +395,13 @@ def ajouter_parcelle(request):
                 return JsonResponse({'id': parc.id, 'nom': parc.nom})
             return JsonResponse({'error': 'Création failed'}, status=400)
         return redirect('liste_parcelles')
-    return render(request, 'parcelle/ajouter.html', {'producteurs': producteurs})
+    # the producteur is picked with the typeahead lookup (core.lookup)
+    return render(request, 'parcelle/ajouter.html')
 
 
+@transaction.atomic
 def modifier_parcelle(request, id):
-    parcelle = get_object_or_404(Parcelle, id=id)
-    producteurs = Producteur.objects.all()
+    parcelle = get_object_or_404(Parcelle.objects.select_related('producteur'), id=id)
 
     if request.method == "POST":
         parcelle.nom = request.POST['nom']
@@ -375,11 +409,16 @@ def modifier_parcelle(request, id):
         parcelle.adresse = request.POST['adresse']
         producteur_id = request.POST['producteur']
         parcelle.producteur = get_object_or_404(Producteur, id=producteur_id)
+        if 'latitude' in request.POST or 'longitude' in request.POST:
+            parcelle.latitude, parcelle.longitude = _coordonnees(request.POST)
 
         parcelle.save()
         return redirect('liste_parcelles')
 
-    return render(request, 'parcelle/modifier.html', {'parcelle': parcelle, 'producteurs': producteurs})
+    return render(request, 'parcelle/modifier.html', {
+        'parcelle': parcelle,
+        'producteur_label': lookup.libelle('producteur', parcelle.producteur),
+    })
 
 
 def supprimer_parcelle(request, id):
@@ -393,17 +432,165 @@ def details_parcelle(request, id):
     return render(request, 'parcelle/details.html', {'parcelle': parcelle})
 
 
+#---------------------------------- CARTE DES PARCELLES (GeoJSON) ---------------------------------
+
+GEO_PAGE = 500
+GEO_PAGE_MAX = 2000
+GEO_SALT = 'producteurs.geo'
+
+
+def _feature(parcelle, distance=None):
+    properties = {
+        'id': parcelle.id,
+        'nom': parcelle.nom,
+        'superficie': parcelle.superficie,
+        'adresse': parcelle.adresse,
+        'producteur_id': parcelle.producteur_id,
+        'producteur': f"{parcelle.producteur.nom} {parcelle.producteur.prenom}",
+        'url': reverse('details_parcelle', args=[parcelle.id]),
+    }
+    if distance is not None:
+        properties['distance_m'] = round(distance, 1)
+    return {
+        'type': 'Feature',
+        'geometry': {'type': 'Point', 'coordinates': [parcelle.longitude, parcelle.latitude]},
+        'properties': properties,
+    }
+
+
+def _geo_limit(request, default):
+    limit = request.GET.get('limit', '')
+    return min(int(limit), GEO_PAGE_MAX) if limit.isdecimal() and int(limit) > 0 else default
+
+
+def _geo_queryset(request):
+    qs = Parcelle.objects.select_related('producteur')
+    producteur_id = request.GET.get('producteur', '')
+    if producteur_id.isdecimal():
+        qs = qs.filter(producteur_id=int(producteur_id))
+    return qs
+
+
+def _next_url(request, cursor):
+    if not cursor:
+        return None
+    params = request.GET.copy()
+    params['cursor'] = cursor
+    return f"{request.path}?{params.urlencode()}"
+
+
+def parcelles_bbox(request):
+    """GeoJSON of the parcelles inside ?bbox=min_lon,min_lat,max_lon,max_lat.
+
+    Pages of ?limit= rows (default 500, at most 2000) in grid-cell order;
+    `next` is the URL of the following page. Optional filter: producteur (id).
+    """
+    try:
+        min_lon, min_lat, max_lon, max_lat = (float(v) for v in request.GET.get('bbox', '').split(','))
+    except ValueError:
+        return JsonResponse({'error': "bbox attendu : min_lon,min_lat,max_lon,max_lat"}, status=400)
+    if not (geo.valide(min_lat, min_lon) and geo.valide(max_lat, max_lon)) or min_lat > max_lat or min_lon > max_lon:
+        return JsonResponse({'error': "bbox invalide"}, status=400)
+
+    qs = _geo_queryset(request).filter(geo.filtre_bbox(min_lat, min_lon, max_lat, max_lon))
+    page_obj = KeysetPaginator(qs, ('cellule', 'id'), _geo_limit(request, GEO_PAGE)).page(request.GET.get('cursor'))
+    return JsonResponse({
+        'type': 'FeatureCollection',
+        'features': [_feature(p) for p in page_obj.object_list],
+        'next': _next_url(request, page_obj.next_cursor),
+    })
+
+
+def parcelles_proches(request):
+    """GeoJSON of the parcelles nearest to ?lat=&lon=, closest first.
+
+    ?limit= parcelles per page (default 20, at most 2000), optional
+    ?max_distance= in metres and producteur (id); `next` continues the
+    walk outwards from the last parcelle returned.
+    """
+    try:
+        lat, lon = float(request.GET.get('lat', '')), float(request.GET.get('lon', ''))
+        max_distance = float(request.GET['max_distance']) if request.GET.get('max_distance') else None
+    except ValueError:
+        return JsonResponse({'error': "lat et lon (degrés) sont requis"}, status=400)
+    if not geo.valide(lat, lon):
+        return JsonResponse({'error': "position invalide"}, status=400)
+
+    apres = None
+    if request.GET.get('cursor'):
+        try:
+            apres = tuple(signing.loads(request.GET['cursor'], salt=GEO_SALT))
+        except (signing.BadSignature, TypeError, ValueError):
+            apres = None
+
+    limit = _geo_limit(request, 20)
+    qs = _geo_queryset(request)
+    voisins = geo.proches(qs, lat, lon, limit, apres=apres, max_distance=max_distance)
+    parcelles = qs.in_bulk([id_ for _, id_ in voisins])
+    cursor = signing.dumps(list(voisins[-1]), salt=GEO_SALT) if len(voisins) == limit else None
+    return JsonResponse({
+        'type': 'FeatureCollection',
+        'features': [_feature(parcelles[id_], d) for d, id_ in voisins if id_ in parcelles],
+        'next': _next_url(request, cursor),
+    })
+
+
 #---------------------------------- VUES POUR LES RECOLTES ---------------------------------
 
+TRIS_RECOLTES = {
+    'date': ('-date_recolte', '-id'),
+    'quantite': ('-quantite', '-id'),
+}
+
+
 def liste_recoltes(request):
-    recoltes = Recolte.objects.all()
-    return render(request, 'recolte/liste.html', {'recoltes': recoltes})
+    """List recoltes with filters and keyset pagination.
+
+    Supported GET params:
+    - producteur: producteur id; producteur_q: search on the producteur
+    - parcelle: parcelle id
+    - fruits: catalog ids (multi-select)
+    - date_debut / date_fin: harvest date range
+    - superficie_min / superficie_max: area range of the parcelle (ha)
+    - tri: 'date' (default, latest first) or 'quantite' (largest first)
+    - cursor / total: as in liste_producteurs
+    """
+    # producteur, parcelle and fruit in the same query: one query per page
+    qs, context = _filtres_communs(
+        request, Recolte.objects.select_related('producteur', 'parcelle', 'fruit'), prefix='parcelle__',
+    )
+
+    parcelle_id = request.GET.get('parcelle', '')
+    context['parcelle'] = None
+    if parcelle_id.isdecimal():
+        context['parcelle'] = Parcelle.objects.filter(id=int(parcelle_id)).first()
+        qs = qs.filter(parcelle_id=int(parcelle_id))
+    if context['selected_fruits']:
+        qs = qs.filter(fruit_id__in=context['selected_fruits'])
+    if context['date_debut']:
+        qs = qs.filter(date_recolte__gte=context['date_debut'])
+    if context['date_fin']:
+        qs = qs.filter(date_recolte__lte=context['date_fin'])
+
+    tri = request.GET.get('tri', 'date')
+    if tri not in TRIS_RECOLTES:
+        tri = 'date'
+    page_obj = KeysetPaginator(qs, TRIS_RECOLTES[tri], 20).page(request.GET.get('cursor'))
+    total, total_exact = approximate_count(qs) if request.GET.get('total') == '1' else (None, False)
+
+    context.update({
+        'recoltes': page_obj.object_list,
+        'page_obj': page_obj,
+        'total': total,
+        'total_exact': total_exact,
+        'qstr': query_string(request, 'cursor'),
+        'tri': tri,
+    })
+    return render(request, 'recolte/liste.html', context)
 
 
+@transaction.atomic
 def ajouter_recolte(request):
-    producteurs = Producteur.objects.all()
-    parcelles = Parcelle.objects.all()
-
     if request.method == "POST":
         try:
             fruit = request.POST.get('fruit', '').strip()
@@ -445,7 +632,7 @@ def ajouter_recolte(request):
                 date_recolte_val = date.today()
 
             recolte = Recolte.objects.create(
-                fruit=fruit,
+                fruit_id=fruits.resoudre_un(fruit),
                 quantite=quantite_val,
                 date_recolte=date_recolte_val,
                 producteur=producteur,
@@ -453,24 +640,24 @@ def ajouter_recolte(request):
             )
             # if AJAX, return JSON
             if request.headers.get('x-requested-with') == 'XMLHttpRequest' or request.POST.get('ajax') == '1':
-                return JsonResponse({'id': recolte.id, 'fruit': recolte.fruit, 'parcelle_id': parcelle.id})
+                return JsonResponse({'id': recolte.id, 'fruit': fruits.nom(recolte.fruit_id), 'parcelle_id': parcelle.id})
             return redirect('liste_recoltes')
         except Exception as e:
             if request.headers.get('x-requested-with') == 'XMLHttpRequest' or request.POST.get('ajax') == '1':
                 return JsonResponse({'error': str(e)}, status=400)
             return redirect('liste_recoltes')
 
-    return render(request, 'recolte/ajouter.html', {'producteurs': producteurs, 'parcelles': parcelles})
+    # producteur and parcelle are picked with the typeahead lookups (core.lookup)
+    return render(request, 'recolte/ajouter.html')
 
 
 
+@transaction.atomic
 def modifier_recolte(request, id):
-    recolte = get_object_or_404(Recolte, id=id)
-    producteurs = Producteur.objects.all()
-    parcelles = Parcelle.objects.all()
+    recolte = get_object_or_404(Recolte.objects.select_related('producteur', 'parcelle', 'fruit'), id=id)
 
     if request.method == "POST":
-        recolte.fruit = request.POST['fruit']
+        recolte.fruit_id = fruits.resoudre_un(request.POST['fruit'])
         recolte.quantite = request.POST['quantite']
         recolte.date_recolte = request.POST['date_recolte']
         recolte.producteur = get_object_or_404(Producteur, id=request.POST['producteur'])
@@ -479,7 +666,11 @@ def modifier_recolte(request, id):
         recolte.save()
         return redirect('liste_recoltes')
 
-    return render(request, 'recolte/modifier.html', {'recolte': recolte, 'producteurs': producteurs, 'parcelles': parcelles})
+    return render(request, 'recolte/modifier.html', {
+        'recolte': recolte,
+        'producteur_label': lookup.libelle('producteur', recolte.producteur),
+        'parcelle_label': lookup.libelle('parcelle', recolte.parcelle),
+    })
 
 
 def supprimer_recolte(request, id):
@@ -491,3 +682,76 @@ def supprimer_recolte(request, id):
 def details_recolte(request, id):
     recolte = get_object_or_404(Recolte, id=id)
     return render(request, 'recolte/details.html', {'recolte': recolte})
+
+
+#---------------------------------- RENDEMENTS (kg / ha) ---------------------------------
+
+RENDEMENTS_PAGE = 50
+RENDEMENTS_PAGE_MAX = 1000
+
+
+def _int_param(request, name):
+    try:
+        return int(request.GET.get(name, ''))
+    except ValueError:
+        return None
+
+
+def _rendements(request, limit):
+    """Filters of the yield report / API applied to the cached table."""
+    resultat = rendements.table()
+    filtres = {name: _int_param(request, name) for name in ('fruit', 'saison', 'parcelle', 'producteur')}
+    tri = request.GET.get('tri', 'rendement')
+    if tri not in rendements.TRIS:
+        tri = 'rendement'
+    offset = max(_int_param(request, 'offset') or 0, 0)
+    lignes, total = rendements.lignes(resultat, tri=tri, limit=limit, offset=offset, **filtres)
+    resume = [
+        r for r in resultat['resume']
+        if filtres['fruit'] in (None, r['fruit_id']) and filtres['saison'] in (None, r['saison'])
+    ]
+    return resultat, filtres, tri, offset, lignes, total, resume
+
+
+def rapport_rendements(request):
+    """Yield per hectare by parcelle, fruit and season, with percentile ranks.
+
+    GET params: fruit (id), saison (year), parcelle, producteur (ids),
+    tri ('rendement', 'centile', 'evolution', 'quantite'), offset.
+    """
+    resultat, filtres, tri, offset, lignes, total, resume = _rendements(request, RENDEMENTS_PAGE)
+    parcelles = Parcelle.objects.select_related('producteur').in_bulk([l['parcelle_id'] for l in lignes])
+    for ligne in lignes:
+        ligne['parcelle'] = parcelles.get(ligne['parcelle_id'])
+    context = {
+        'resume': resume,
+        'lignes': lignes,
+        'total': total,
+        'tri': tri,
+        'filtres': filtres,
+        'saisons': rendements.saisons(resultat),
+        'fruits_choices': fruits.choix(),
+        'offset': offset,
+        'precedent': max(offset - RENDEMENTS_PAGE, 0) if offset else None,
+        'suivant': offset + RENDEMENTS_PAGE if offset + RENDEMENTS_PAGE < total else None,
+        'qstr': query_string(request, 'offset'),
+    }
+    return render(request, 'rendement/rapport.html', context)
+
+
+def api_rendements(request):
+    """JSON of the yield report: `resume` per (fruit, saison) and a page of `lignes`.
+
+    Same filters as rapport_rendements, plus ?limit= (default 50, at most 1000).
+    """
+    limit = _int_param(request, 'limit')
+    limit = min(limit, RENDEMENTS_PAGE_MAX) if limit and limit > 0 else RENDEMENTS_PAGE
+    _, _, tri, offset, lignes, total, resume = _rendements(request, limit)
+    return JsonResponse({
+        'resume': resume,
+        'lignes': lignes,
+        'total': total,
+        'offset': offset,
+        'limit': limit,
+        'tri': tri,
+    })
@@ -0,0 +1,30 @@
+import time
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+
+from stock import registre
+
+
+class Command(BaseCommand):
+    help = (
+        "Clôture les stocks à une date : un point de contrôle par stock (stock.StockCheckpoint) "
+        "avec son solde d'après les mouvements. Les états à une date partent ensuite du dernier "
+        "point au lieu de rejouer tout l'historique. À lancer après chaque fin de mois."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--date', type=date.fromisoformat,
+                            help="Dernier jour de la période close, AAAA-MM-JJ (défaut : fin du mois dernier)")
+        parser.add_argument('--batch-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        jour = options['date'] or date.today().replace(day=1) - timedelta(days=1)
+        started = time.monotonic()
+        try:
+            total = registre.cloturer(registre.fin_du_jour(jour), batch_size=options['batch_size'])
+        except ValueError as e:
+            raise CommandError(str(e))
+        self.stdout.write(self.style.SUCCESS(
+            f"{total} point(s) de contrôle au {jour.isoformat()} en {time.monotonic() - started:.1f} s"
+        ))
@@ -0,0 +1,45 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from stock import registre
+from stock.models import StockMovement
+
+
+class Command(BaseCommand):
+    help = (
+        "Rapproche quantite_disponible de chaque stock de son solde d'après le registre "
+        "(dernier point de contrôle + mouvements), en une requête pour tous les stocks. "
+        "Un écart vient d'une écriture sans mouvement (admin, import...)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tolerance', type=float, default=1e-3, help="Écart ignoré (défaut : 0.001)")
+        parser.add_argument('--afficher', type=int, default=50, help="Nombre d'écarts affichés")
+        parser.add_argument('--corriger', action='store_true',
+                            help="Enregistrer un mouvement d'ajustement par écart (la quantité affichée fait foi)")
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        ecarts = list(
+            registre.ecarts(options['tolerance']).order_by('pk')
+            .values_list('pk', 'produit', 'quantite_disponible', 'solde', 'ecart')
+        )
+        for pk, produit, quantite, solde, ecart in ecarts[:options['afficher']]:
+            self.stdout.write(f"Stock #{pk} {produit} : {quantite:g} disponible, {solde:g} au registre ({ecart:+g})")
+        if len(ecarts) > options['afficher']:
+            self.stdout.write(f"... et {len(ecarts) - options['afficher']} autre(s)")
+        duree = time.monotonic() - started
+
+        if not ecarts:
+            self.stdout.write(self.style.SUCCESS(f"Aucun écart ({duree:.1f} s)"))
+            return
+        if not options['corriger']:
+            raise CommandError(f"{len(ecarts)} stock(s) en écart avec le registre (--corriger pour les ajuster)")
+        with transaction.atomic():
+            StockMovement.objects.bulk_create([
+                StockMovement(stock_id=pk, change=ecart, reason='AJUST', note='Rapprochement du registre')
+                for pk, _, _, _, ecart in ecarts
+            ], batch_size=2000)
+        self.stdout.write(self.style.SUCCESS(f"{len(ecarts)} ajustement(s) enregistré(s) ({duree:.1f} s)"))
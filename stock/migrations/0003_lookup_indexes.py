@@ -0,0 +1,18 @@
+# Generated by Django 5.2.7 on 2026-10-18 19:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stock', '0002_stockmovement'),
+        ('transformation', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='stock',
+            index=models.Index(fields=['produit', 'id'], name='stock_produit_id'),
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.2.7 on 2026-10-18 20:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stock', '0003_lookup_indexes'),
+        ('transformation', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='stock',
+            index=models.Index(fields=['date_mise_a_jour', 'id'], name='stock_date_id'),
+        ),
+        migrations.AddIndex(
+            model_name='stock',
+            index=models.Index(fields=['quantite_disponible', 'id'], name='stock_quantite_id'),
+        ),
+        migrations.AddIndex(
+            model_name='stock',
+            index=models.Index(fields=['unite_mesure', 'quantite_disponible', 'id'], name='stock_unite_quantite_id'),
+        ),
+    ]
@@ -0,0 +1,60 @@
+# Generated by Django 5.2.7 on 2026-10-18 20:25
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Min, Sum
+from django.utils import timezone
+
+
+def ouvrir_registre(apps, schema_editor):
+    # opening checkpoint of the existing stocks, just before their first
+    # movement: quantite_disponible minus everything recorded since
+    Stock = apps.get_model('stock', 'Stock')
+    StockCheckpoint = apps.get_model('stock', 'StockCheckpoint')
+    maintenant = timezone.now()
+    points = [
+        StockCheckpoint(stock_id=pk, date=premier or maintenant, quantite=(quantite or 0) - (total or 0))
+        for pk, quantite, premier, total in Stock.objects.annotate(
+            premier=Min('movements__created_at'), total=Sum('movements__change'),
+        ).values_list('pk', 'quantite_disponible', 'premier', 'total').iterator(chunk_size=2000)
+    ]
+    StockCheckpoint.objects.bulk_create(points, batch_size=2000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stock', '0004_listing_indexes'),
+        ('vente', '0004_lookup_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StockCheckpoint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateTimeField()),
+                ('quantite', models.FloatField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AlterField(
+            model_name='stockmovement',
+            name='reason',
+            field=models.CharField(choices=[('VENTE', 'Vente'), ('RESTORE', 'Restauration'), ('AJUST', 'Ajustement'), ('MODIF', 'Modification'), ('INITIAL', 'Stock initial')], default='VENTE', max_length=20),
+        ),
+        migrations.AddIndex(
+            model_name='stockmovement',
+            index=models.Index(fields=['stock', 'created_at'], name='movement_stock_created'),
+        ),
+        migrations.AddField(
+            model_name='stockcheckpoint',
+            name='stock',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='checkpoints', to='stock.stock'),
+        ),
+        migrations.AddConstraint(
+            model_name='stockcheckpoint',
+            constraint=models.UniqueConstraint(fields=('stock', 'date'), name='stock_checkpoint_unique'),
+        ),
+        migrations.RunPython(ouvrir_registre, migrations.RunPython.noop),
+    ]
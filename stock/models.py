@@ -15,6 +15,17 @@ class Stock (models.Model):
     unite_mesure = models.CharField(max_length=10, choices = UNITE_CHOICES)
     date_mise_a_jour = models.DateField()
 
+    class Meta:
+        indexes = [
+            # alphabetical typeahead lookups (core.lookup)
+            models.Index(fields=['produit', 'id'], name='stock_produit_id'),
+            # keyset sorts of liste_stocks; low stock = a range on the quantity,
+            # alone or within a unit
+            models.Index(fields=['date_mise_a_jour', 'id'], name='stock_date_id'),
+            models.Index(fields=['quantite_disponible', 'id'], name='stock_quantite_id'),
+            models.Index(fields=['unite_mesure', 'quantite_disponible', 'id'], name='stock_unite_quantite_id'),
+        ]
+
     def __str__(self):
         return f"{self.produit} disponible: {self.quantite_disponible}  {self.unite_mesure}" 
 
@@ -26,6 +37,7 @@ class StockMovement(models.Model):
         ('RESTORE', 'Restauration'),
         ('AJUST', 'Ajustement'),
         ('MODIF', 'Modification'),
+        ('INITIAL', 'Stock initial'),
     ]
 
     stock = models.ForeignKey(Stock, on_delete=models.CASCADE, related_name='movements')
@@ -35,6 +47,32 @@ class StockMovement(models.Model):
     note = models.CharField(max_length=200, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            # balance as of a date: the movements of a stock since its checkpoint (stock/registre.py)
+            models.Index(fields=['stock', 'created_at'], name='movement_stock_created'),
+        ]
+
     def __str__(self):
         return f"{self.get_reason_display()} {self.change} on {self.stock.produit} ({self.created_at})"
-    
+
+
+class StockCheckpoint(models.Model):
+    """Solde d'un stock à `date` : la somme de ses mouvements antérieurs.
+
+    Le solde à une date quelconque part du dernier point de contrôle et
+    n'ajoute que les mouvements suivants (voir stock/registre.py).
+    """
+    stock = models.ForeignKey(Stock, on_delete=models.CASCADE, related_name='checkpoints')
+    date = models.DateTimeField()
+    quantite = models.FloatField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            # also the (stock, date) index of the latest checkpoint lookup
+            models.UniqueConstraint(fields=['stock', 'date'], name='stock_checkpoint_unique'),
+        ]
+
+    def __str__(self):
+        return f"{self.stock.produit} : {self.quantite} au {self.date}"
@@ -0,0 +1,106 @@
+"""Registre des stocks : solde à une date, points de contrôle, rapprochement.
+
+`Stock.quantite_disponible` est écrasé à chaque écriture ; l'historique est
+dans `StockMovement`. Le solde d'un stock à l'instant `a` est :
+
+    dernier point de contrôle avant `a` + mouvements depuis ce point
+
+Les points de contrôle (`StockCheckpoint`, un par stock et par clôture,
+voir la commande `cloturer_stocks`) évitent de rejouer tout l'historique :
+un état de fin de mois lit un point et les mouvements d'un mois, par
+l'index (stock, created_at). Sans point de contrôle, le solde part de 0.
+
+Tout est calculé par la base, en une requête pour l'ensemble des stocks.
+"""
+from datetime import datetime, time, timedelta, timezone as dt_timezone
+
+from django.db import transaction
+from django.db.models import Count, F, FloatField, OuterRef, Q, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import Stock, StockCheckpoint, StockMovement
+
+# before any movement: start of the ledger of a stock without checkpoint
+ORIGINE = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+
+
+def fin_du_jour(jour):
+    """Instant closing `jour` (a date): midnight of the next day, current time zone."""
+    return timezone.make_aware(datetime.combine(jour + timedelta(days=1), time.min))
+
+
+def soldes(a=None, stocks=None):
+    """Stocks annotated with their ledger balance `solde` at `a` (default: now).
+
+    `solde` counts the movements created strictly before `a`, from the last
+    checkpoint at or before `a` (`point_date`, `point_quantite`; None when
+    there is none). `stocks` narrows the queryset (default: all stocks).
+    """
+    a = a or timezone.now()
+    point = StockCheckpoint.objects.filter(stock=OuterRef('pk'), date__lte=a).order_by('-date')
+    depuis = (
+        StockMovement.objects
+        .filter(stock=OuterRef('pk'), created_at__lt=a,
+                created_at__gte=Coalesce(OuterRef('point_date'), Value(ORIGINE)))
+        .order_by().values('stock').annotate(total=Sum('change')).values('total')
+    )
+    return (
+        (Stock.objects.all() if stocks is None else stocks)
+        .annotate(
+            point_date=Subquery(point.values('date')[:1]),
+            point_quantite=Subquery(point.values('quantite')[:1]),
+        )
+        .annotate(solde=Coalesce(F('point_quantite'), Value(0.0)) + Coalesce(Subquery(depuis), Value(0.0),
+                                                                         output_field=FloatField()))
+    )
+
+
+def solde(stock, a=None):
+    """Ledger balance of one stock at `a` (default: now)."""
+    return soldes(a, Stock.objects.filter(pk=stock.pk)).values_list('solde', flat=True).get()
+
+
+def totaux(a=None, stocks=None):
+    """Balances at `a` summed per (produit, unite_mesure): the stock valuation of a date."""
+    return (
+        soldes(a, stocks).order_by()
+        .values('produit', 'unite_mesure').annotate(quantite=Sum('solde'), stocks=Count('pk'))
+        .order_by('produit', 'unite_mesure')
+    )
+
+
+def cloturer(a, batch_size=2000):
+    """Checkpoint every stock at `a` (a past instant); returns the number of checkpoints written.
+
+    Stocks already checkpointed at `a` are left as they are. A movement
+    created before `a` but committed after the closing would be missed:
+    close periods that are over, not the current instant.
+    """
+    if a > timezone.now():
+        raise ValueError("Impossible de clôturer une période qui n'est pas terminée")
+    total = 0
+    with transaction.atomic():
+        points = []
+        a_cloturer = soldes(a, Stock.objects.exclude(checkpoints__date=a))
+        for stock_id, quantite in a_cloturer.values_list('pk', 'solde').iterator(chunk_size=batch_size):
+            points.append(StockCheckpoint(stock_id=stock_id, date=a, quantite=quantite))
+            if len(points) >= batch_size:
+                total += len(StockCheckpoint.objects.bulk_create(points, ignore_conflicts=True))
+                points = []
+        if points:
+            total += len(StockCheckpoint.objects.bulk_create(points, ignore_conflicts=True))
+    return total
+
+
+def ecarts(tolerance=1e-3, stocks=None):
+    """Stocks whose `quantite_disponible` differs from the ledger by more than `tolerance`.
+
+    One query for all stocks, annotated with `solde` and `ecart`
+    (quantite_disponible - solde).
+    """
+    return (
+        soldes(None, stocks)
+        .annotate(ecart=F('quantite_disponible') - F('solde'))
+        .filter(Q(ecart__gt=tolerance) | Q(ecart__lt=-tolerance))
+    )
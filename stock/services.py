@@ -0,0 +1,194 @@
+"""Mouvements de stock sûrs en concurrence, et enregistrement des ventes.
+
+Les vues lisaient `quantite_disponible`, retranchaient en Python puis
+sauvegardaient toute la ligne : deux caisses vendant le même produit au
+même moment perdaient une des deux sorties. Ici chaque sortie est un
+`UPDATE ... SET quantite = quantite - x WHERE quantite >= x` : la base
+applique les décréments l'un après l'autre et aucun n'est perdu. Quand le
+stock ne suffit pas :
+
+- en mode strict, rien n'est retiré et `StockInsuffisant` est levée ;
+- sinon ce qui reste est retiré (jamais plus que la quantité demandée), la
+  ligne étant verrouillée (`select_for_update`) entre la lecture du reste
+  et l'écriture.
+
+Une quantité nulle ou négative lève `QuantiteInvalide`.
+
+Toute écriture de la quantité passe par un mouvement (y compris le stock
+initial et les corrections manuelles) : c'est le registre dont
+stock/registre.py tire le solde à une date.
+
+`enregistrer_vente` et `modifier_vente` écrivent la vente, les mouvements
+et la facture éventuelle dans une seule transaction : une erreur n'en
+laisse aucune partie.
+"""
+from django.db import transaction
+from django.db.models import F, Sum
+
+from core.signals import bulk_changed
+from .models import Stock, StockMovement
+
+
+class StockInsuffisant(Exception):
+    def __init__(self, stock, demande, disponible):
+        self.stock = stock
+        self.demande = demande
+        self.disponible = disponible
+        super().__init__(f"Stock insuffisant pour '{stock.produit}' (disponible: {disponible}, demandé: {demande})")
+
+
+class QuantiteInvalide(ValueError):
+    def __init__(self, quantite):
+        self.quantite = quantite
+        super().__init__(f"La quantité doit être positive (reçu : {quantite})")
+
+
+def _changed(stock):
+    # QuerySet.update() sends no post_save: tell the derived data (cache generations, omnibox)
+    bulk_changed.send(sender=Stock, instances=[stock], action='update')
+
+
+def _decrementer(stock, quantite, strict):
+    """Conditional decrement of `stock`; returns the quantity taken. Call inside a transaction."""
+    if quantite <= 0:
+        # a negative quantity would pass the conditional UPDATE and add stock
+        raise QuantiteInvalide(quantite)
+    if Stock.objects.filter(pk=stock.pk, quantite_disponible__gte=quantite).update(
+        quantite_disponible=F('quantite_disponible') - quantite,
+    ):
+        retire = quantite
+    else:
+        # short stock: lock the row, then take what is left of it. A restock
+        # committed since the UPDATE above may cover the whole quantity now:
+        # never more than `quantite`, and a decrement rather than a reset to 0
+        disponible = Stock.objects.select_for_update().values_list('quantite_disponible', flat=True).get(pk=stock.pk)
+        if strict and (disponible or 0) < quantite:
+            raise StockInsuffisant(stock, quantite, disponible)
+        retire = min(max(disponible or 0, 0.0), quantite)
+        Stock.objects.filter(pk=stock.pk).update(quantite_disponible=F('quantite_disponible') - retire)
+    # the row is ours until the commit: the value read is the one written
+    stock.refresh_from_db(fields=['quantite_disponible'])
+    return retire
+
+
+@transaction.atomic
+def retirer(stock, quantite, strict=False, vente=None, reason='AJUST', note=''):
+    """Take `quantite` out of `stock` and record the movement; returns the quantity taken.
+
+    Strict: all or nothing, StockInsuffisant when the stock is short.
+    Otherwise a short stock is emptied. QuantiteInvalide when `quantite` <= 0.
+    """
+    retire = _decrementer(stock, float(quantite or 0), strict)
+    StockMovement.objects.create(stock=stock, vente=vente, change=-retire, reason=reason, note=note)
+    _changed(stock)
+    return retire
+
+
+@transaction.atomic
+def creer(quantite_disponible, **champs):
+    """Create a stock and the INITIAL movement its quantity comes from (the ledger starts at 0)."""
+    stock = Stock.objects.create(quantite_disponible=float(quantite_disponible), **champs)
+    StockMovement.objects.create(stock=stock, change=stock.quantite_disponible, reason='INITIAL', note='Stock initial')
+    return stock
+
+
+@transaction.atomic
+def fixer(stock, quantite, reason='MODIF', note=''):
+    """Set the quantity of `stock` (a manual count, an edit) and record the difference as a movement."""
+    ancienne = Stock.objects.select_for_update().values_list('quantite_disponible', flat=True).get(pk=stock.pk)
+    difference = float(quantite) - (ancienne or 0)
+    if difference:
+        Stock.objects.filter(pk=stock.pk).update(quantite_disponible=F('quantite_disponible') + difference)
+        StockMovement.objects.create(stock=stock, change=difference, reason=reason, note=note)
+        _changed(stock)
+    stock.refresh_from_db(fields=['quantite_disponible'])
+    return difference
+
+
+@transaction.atomic
+def remettre(stock, quantite, vente=None, reason='RESTORE', note=''):
+    """Put `quantite` back into `stock` (atomic increment) and record the movement."""
+    quantite = float(quantite or 0)
+    if quantite:
+        Stock.objects.filter(pk=stock.pk).update(quantite_disponible=F('quantite_disponible') + quantite)
+        stock.refresh_from_db(fields=['quantite_disponible'])
+        StockMovement.objects.create(stock=stock, vente=vente, change=quantite, reason=reason, note=note)
+        _changed(stock)
+    return quantite
+
+
+def _facture(vente, facture):
+    """Create or update the facture of `vente` from its fields (dict, without `vente`)."""
+    from vente.models import Facture
+    existante = Facture.objects.filter(vente=vente).first()
+    if existante is None:
+        return Facture.objects.create(vente=vente, **facture)
+    for champ, valeur in facture.items():
+        setattr(existante, champ, valeur)
+    existante.save()
+    return existante
+
+
+@transaction.atomic
+def enregistrer_vente(client, stock, quantite_vendue, prix_unitaire, date_vente, strict=False, facture=None):
+    """Create a vente, take it out of the stock and create its facture, all or nothing.
+
+    `facture` is None or the Facture fields besides `vente` (numero_facture,
+    date_emission, montant, mode_paiement, statut). Returns (vente, quantity
+    taken out of the stock); raises StockInsuffisant in strict mode and
+    QuantiteInvalide for a quantity <= 0.
+    """
+    from vente.models import Vente
+    # the decrement first: a short strict stock fails before any insert, and
+    # the row lock is taken by the first statement of the transaction
+    retire = _decrementer(stock, float(quantite_vendue or 0), strict)
+    vente = Vente.objects.create(
+        client=client,
+        stock=stock,
+        quantite_vendue=quantite_vendue,
+        prix_unitaire=prix_unitaire,
+        date_vente=date_vente,
+        montant_total=quantite_vendue * prix_unitaire,
+    )
+    StockMovement.objects.create(stock=stock, vente=vente, change=-retire, reason='VENTE', note=f'Vente #{vente.id}')
+    _changed(stock)
+    if facture is not None:
+        _facture(vente, facture)
+    return vente, retire
+
+
+def _pris_par(vente, stock):
+    """Net quantity `vente` currently holds out of `stock`, from its movements."""
+    mouvements = StockMovement.objects.filter(vente=vente, stock=stock)
+    total = mouvements.aggregate(total=Sum('change'))['total']
+    if total is None:
+        # vente recorded before the movements existed: its sold quantity
+        return vente.quantite_vendue or 0
+    return -total
+
+
+@transaction.atomic
+def modifier_vente(vente, client, stock, quantite_vendue, prix_unitaire, date_vente, strict=False, facture=None):
+    """Update a vente and move its quantity between stocks, all or nothing.
+
+    What the vente took from its previous stock is put back, then the new
+    quantity is taken from the new stock (the same one or not). Returns the
+    quantity taken; raises StockInsuffisant in strict mode or
+    QuantiteInvalide, leaving everything as it was.
+    """
+    ancien = vente.stock
+    remettre(ancien, _pris_par(vente, ancien), vente=vente, note=f'Restore from vente #{vente.id} modification')
+    retire = _decrementer(stock, float(quantite_vendue or 0), strict)
+    StockMovement.objects.create(stock=stock, vente=vente, change=-retire, reason='VENTE', note=f'Vente #{vente.id} updated')
+    _changed(stock)
+
+    vente.client = client
+    vente.stock = stock
+    vente.quantite_vendue = quantite_vendue
+    vente.prix_unitaire = prix_unitaire
+    vente.date_vente = date_vente
+    vente.montant_total = quantite_vendue * prix_unitaire
+    vente.save()
+    if facture is not None:
+        _facture(vente, facture)
+    return retire
@@ -1,3 +1,257 @@
-from django.test import TestCase
+import threading
+from datetime import date, timedelta
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.db.models import QuerySet, Sum
+from django.test import TestCase, TransactionTestCase
+from django.urls import reverse
+
+from producteurs.models import Fruit, Parcelle, Producteur, Recolte
+from transformation.models import Transformation
+from vente.models import Client, Vente
+
+from . import registre, services
+from .models import Stock, StockCheckpoint, StockMovement
+
+
+def creer_stock(quantite):
+    producteur = Producteur.objects.create(nom='Camara', prenom='Alpha', adresse='Kindia', telephone='622000001')
+    parcelle = Parcelle.objects.create(nom='P1', superficie=2, adresse='Kindia', producteur=producteur)
+    fruit = Fruit.objects.create(nom='Mangue')
+    recolte = Recolte.objects.create(fruit=fruit, quantite=500, date_recolte=date(2026, 6, 1),
+                                     producteur=producteur, parcelle=parcelle)
+    lot = Transformation.objects.create(code_lot='LOT-1', recolte=recolte, etape='CONDITIONNEMENT', quantite_depart=500,
+                                        quantite_finale=100, date_debut=date(2026, 6, 2), date_fin=date(2026, 6, 5))
+    return services.creer(quantite, lot=lot, produit='Mangue séchée', unite_mesure='KG', date_mise_a_jour=date.today())
+
+
+def creer_client(n=1):
+    return Client.objects.create(nom='Diallo', prenom='Fatou', adresse='Conakry',
+                                 telephone=f'62400000{n}', email=f'client{n}@example.com')
+
+
+def mouvements(stock):
+    return StockMovement.objects.filter(stock=stock).aggregate(total=Sum('change'))['total']
+
+
+#------ Décréments de stock ------
+
+class DecrementerTests(TestCase):
+
+    def setUp(self):
+        self.stock = creer_stock(10)
+        self.client_vente = creer_client()
+
+    def _vendre(self, quantite, strict=False):
+        return services.enregistrer_vente(self.client_vente, self.stock, quantite, 1, date.today(), strict=strict)
+
+    def test_stock_suffisant(self):
+        _, retire = self._vendre(4)
+        self.stock.refresh_from_db()
+        self.assertEqual(retire, 4)
+        self.assertEqual(self.stock.quantite_disponible, 6)
+        self.assertEqual(mouvements(self.stock), 6)
+
+    def test_stock_court_vide_le_stock(self):
+        _, retire = self._vendre(15)
+        self.stock.refresh_from_db()
+        self.assertEqual(retire, 10)
+        self.assertEqual(self.stock.quantite_disponible, 0)
+        self.assertEqual(mouvements(self.stock), 0)
+
+    def test_stock_court_strict(self):
+        with self.assertRaises(services.StockInsuffisant):
+            self._vendre(15, strict=True)
+        self.stock.refresh_from_db()
+        self.assertEqual(self.stock.quantite_disponible, 10)
+        self.assertFalse(Vente.objects.exists())
+
+    def test_reassort_concurrent(self):
+        # a restock commits between the failed conditional UPDATE and the
+        # locked read of the remainder: the sale takes what it sold, no more
+        verrou = QuerySet.select_for_update
+
+        def reassort_puis_verrou(qs, *args, **kwargs):
+            Stock.objects.filter(pk=self.stock.pk).update(quantite_disponible=100)
+            StockMovement.objects.create(stock=self.stock, change=90, reason='AJUST', note='réassort')
+            return verrou(qs, *args, **kwargs)
+
+        for strict in (False, True):
+            with self.subTest(strict=strict):
+                Stock.objects.filter(pk=self.stock.pk).update(quantite_disponible=10)
+                StockMovement.objects.filter(reason='AJUST').delete()
+                with mock.patch.object(QuerySet, 'select_for_update', reassort_puis_verrou):
+                    _, retire = self._vendre(15, strict=strict)
+                self.stock.refresh_from_db()
+                self.assertEqual(retire, 15)
+                self.assertEqual(self.stock.quantite_disponible, 85)
+
+    def test_quantite_negative_ou_nulle(self):
+        for quantite in (-5, 0):
+            with self.subTest(quantite=quantite):
+                with self.assertRaises(services.QuantiteInvalide):
+                    self._vendre(quantite)
+                self.stock.refresh_from_db()
+                self.assertEqual(self.stock.quantite_disponible, 10)
+        self.assertFalse(Vente.objects.exists())
+
+    def test_modifier_vente_rend_puis_reprend(self):
+        vente, _ = self._vendre(4)
+        retire = services.modifier_vente(vente, self.client_vente, self.stock, 6, 1, date.today())
+        self.stock.refresh_from_db()
+        self.assertEqual(retire, 6)
+        self.assertEqual(self.stock.quantite_disponible, 4)
+        self.assertEqual(mouvements(self.stock), 4)
+
+
+#------ Liste des stocks ------
+
+class ListeStocksTests(TestCase):
+
+    def setUp(self):
+        self.lot = creer_stock(5).lot
+        self.lyophilise = Transformation.objects.create(
+            code_lot='LOT-2', recolte=self.lot.recolte, etape='LYOPHILISATION', quantite_depart=100,
+            quantite_finale=20, date_debut=date(2026, 6, 2), date_fin=date(2026, 6, 5))
+        self._creer(4)
+
+    def _creer(self, n):
+        for _ in range(n):
+            i = Stock.objects.count()
+            services.creer(i * 3, lot=self.lyophilise if i % 2 else self.lot,
+                           produit=('Mangue séchée', 'Ananas séché', 'Jus de mangue')[i % 3],
+                           unite_mesure=('KG', 'SACHET')[i % 2], date_mise_a_jour=date(2026, 6, 1 + i % 28))
+
+    def _ids(self, **params):
+        response = self.client.get(reverse('liste_stocks'), params)
+        self.assertEqual(response.status_code, 200)
+        return {s.id for s in response.context['stocks']}
+
+    def test_requetes_constantes(self):
+        # the lot comes with the page
+        for n in (20, 30):
+            self._creer(n)
+            with self.subTest(stocks=Stock.objects.count()):
+                with self.assertNumQueries(1):
+                    response = self.client.get(reverse('liste_stocks'))
+                with self.assertNumQueries(1):
+                    self.client.get(reverse('liste_stocks'), {'cursor': response.context['page_obj'].next_cursor})
+
+    def test_filtres(self):
+        stocks = list(Stock.objects.select_related('lot'))
+        self.assertEqual(self._ids(produit='mang'), {s.id for s in stocks if 'mang' in s.produit.lower()})
+        self.assertEqual(self._ids(produit='Ja'), {s.id for s in stocks if s.produit.startswith('Ja')})
+        self.assertEqual(self._ids(unite='SACHET'), {s.id for s in stocks if s.unite_mesure == 'SACHET'})
+        self.assertEqual(self._ids(etape='LYOPHILISATION'), {s.id for s in stocks if s.lot_id == self.lyophilise.id})
+        self.assertEqual(self._ids(bas='1'), {s.id for s in stocks if s.quantite_disponible <= 10})
+        self.assertEqual(self._ids(bas='1', seuil='3,5'), {s.id for s in stocks if s.quantite_disponible <= 3.5})
+        self.assertEqual(self._ids(date_debut='2026-06-02', date_fin='2026-06-03'),
+                         {s.id for s in stocks if date(2026, 6, 2) <= s.date_mise_a_jour <= date(2026, 6, 3)})
+        self.assertEqual(self._ids(unite='LITRE', etape='SECHAGE', seuil='beaucoup'), {s.id for s in stocks})
+        response = self.client.get(reverse('liste_stocks'), {'tri': 'quantite'})
+        self.assertEqual([s.quantite_disponible for s in response.context['stocks']],
+                         sorted(s.quantite_disponible for s in stocks))
+
+
+#------ État des stocks à une date ------
+
+class EtatStocksTests(TestCase):
+
+    def test_stock_parametre(self):
+        stock = creer_stock(10)
+        url = reverse('etat_stocks')
+        response = self.client.get(url, {'stock': stock.pk})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['solde'], 10)
+        for valeur in ('abc', '1.5', '1e3', '²'):
+            with self.subTest(stock=valeur):
+                response = self.client.get(url, {'stock': valeur})
+                self.assertEqual(response.status_code, 400)
+                self.assertIn('error', response.json())
+        self.assertEqual(self.client.get(url, {'stock': stock.pk + 1}).status_code, 404)
+        self.assertEqual(self.client.get(url, {'date': 'hier'}).status_code, 400)
+
+
+#------ Commandes du registre ------
+
+class CommandesRegistreTests(TestCase):
+
+    def test_rapprocher_puis_cloturer(self):
+        stock = creer_stock(10)
+        # a write without movement: the ledger still says 10
+        Stock.objects.filter(pk=stock.pk).update(quantite_disponible=7)
+        with self.assertRaisesMessage(CommandError, '1 stock(s) en écart'):
+            call_command('rapprocher_stocks', stdout=StringIO())
+        call_command('rapprocher_stocks', '--corriger', stdout=StringIO())
+        self.assertEqual(mouvements(stock), 7)
+        sortie = StringIO()
+        call_command('rapprocher_stocks', stdout=sortie)
+        self.assertIn('Aucun écart', sortie.getvalue())
+
+        # the movements are from today: closed at 0 yesterday, the balance still adds up
+        hier = date.today() - timedelta(days=1)
+        call_command('cloturer_stocks', '--date', hier.isoformat(), stdout=StringIO())
+        self.assertEqual(list(StockCheckpoint.objects.values_list('stock_id', 'quantite')), [(stock.pk, 0)])
+        self.assertFalse(registre.ecarts().exists())
+        with self.assertRaises(CommandError):
+            call_command('cloturer_stocks', '--date', date.today().isoformat(), stdout=StringIO())
+
+
+#------ Ventes concurrentes ------
+
+class VentesConcurrentesTests(TransactionTestCase):
+    """Real concurrent sales and restocks, one connection per thread."""
+
+    VENDEURS = 6
+    VENTES = 15
+
+    def setUp(self):
+        # an in-memory SQLite database is private to its connection
+        if connection.vendor == 'sqlite' and connection.is_in_memory_db():
+            self.skipTest("base de test en mémoire : une seule connexion")
+
+    def test_aucune_sortie_perdue(self):
+        stock = creer_stock(40)
+        clients = [creer_client(n) for n in range(self.VENDEURS)]
+        retraits, reassorts, erreurs = [], [], []
+        verrou = threading.Lock()
+
+        def vendeur(client):
+            try:
+                for _ in range(self.VENTES):
+                    _, retire = services.enregistrer_vente(client, Stock(pk=stock.pk), 1.5, 1, date.today())
+                    with verrou:
+                        retraits.append(retire)
+            except Exception as e:
+                erreurs.append(e)
+            finally:
+                connection.close()
+
+        def reassort():
+            try:
+                for _ in range(10):
+                    services.remettre(Stock(pk=stock.pk), 2, reason='AJUST', note='réassort')
+                    with verrou:
+                        reassorts.append(2)
+            except Exception as e:
+                erreurs.append(e)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=vendeur, args=(c,)) for c in clients]
+        threads.append(threading.Thread(target=reassort))
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        self.assertEqual(erreurs, [])
+        stock.refresh_from_db()
+        self.assertTrue(all(0 <= r <= 1.5 for r in retraits))
+        self.assertGreaterEqual(stock.quantite_disponible, 0)
+        self.assertAlmostEqual(stock.quantite_disponible, 40 + sum(reassorts) - sum(retraits))
+        self.assertAlmostEqual(stock.quantite_disponible, mouvements(stock))
+        self.assertEqual(Vente.objects.count(), self.VENDEURS * self.VENTES)
@@ -3,6 +3,7 @@ from . import views
 
 urlpatterns = [
     path('stocks/', views.liste_stocks, name='liste_stocks'),
+    path('stocks/etat/', views.etat_stocks, name='etat_stocks'),
     path('stocks/ajouter/', views.ajouter_stock, name='ajouter_stock'),
     path('stocks/<int:id>/', views.details_stock, name='details_stock'),
     path('stocks/<int:id>/modifier/', views.modifier_stock, name='modifier_stock'),
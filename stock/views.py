@@ -1,12 +1,113 @@
+from datetime import date
+
+from django.conf import settings
+from django.db import transaction
+from django.http import JsonResponse
 from django.shortcuts import render, get_object_or_404, redirect
-from .models import Stock
-from transformation.models import Transformation
+from core.lookup import par_texte
+from core.pagination import KeysetPaginator, approximate_count, query_string
+from . import registre, services
+from .models import Stock, UNITE_CHOICES
+from transformation.models import ETAPES_CHOICES, Transformation
 
 #---------------------------------- VUES POUR LES STOCKS ---------------------------------
 
+# quantity at or under which a stock is low (?bas=1), unless ?seuil= is given
+SEUIL_BAS = getattr(settings, 'STOCK_SEUIL_BAS', 10)
+
+# tri -> keyset ordering, each backed by an index of stock.models
+TRIS_STOCKS = {
+    'date': ('-date_mise_a_jour', '-id'),
+    'produit': ('produit', 'id'),
+    'quantite': ('quantite_disponible', 'id'),
+}
+
+
+def _date_param(request, name):
+    try:
+        return date.fromisoformat(request.GET.get(name, ''))
+    except ValueError:
+        return None
+
+
+def _float_param(request, name):
+    try:
+        return float(request.GET.get(name, '').replace(',', '.'))
+    except ValueError:
+        return None
+
+
+def _int_param(request, name):
+    try:
+        return int(request.GET.get(name, ''))
+    except ValueError:
+        return None
+
+
 def liste_stocks(request):
-    stocks = Stock.objects.all()
-    return render(request, 'stock/liste.html', {'stocks': stocks})
+    """List stocks with filters and keyset pagination.
+
+    Supported GET params:
+    - produit: product name (prefix under 3 characters, trigram search beyond)
+    - unite: one of UNITE_CHOICES
+    - etape: étape of the lot
+    - bas=1: low stocks only, quantity <= seuil (default settings.STOCK_SEUIL_BAS)
+    - date_debut / date_fin: range of the last update
+    - tri: 'date' (default, latest first), 'produit' or 'quantite' (lowest first)
+    - cursor / total: as in liste_producteurs
+    """
+    # the lot in the same query: one query per page
+    qs = Stock.objects.select_related('lot')
+
+    produit = request.GET.get('produit', '').strip()
+    if produit:
+        qs = par_texte(qs, produit, ('produit',))
+    unite = request.GET.get('unite', '')
+    if unite in dict(UNITE_CHOICES):
+        qs = qs.filter(unite_mesure=unite)
+    else:
+        unite = ''
+    etape = request.GET.get('etape', '')
+    if etape in dict(ETAPES_CHOICES):
+        qs = qs.filter(lot__etape=etape)
+    else:
+        etape = ''
+    bas = request.GET.get('bas') == '1'
+    seuil = _float_param(request, 'seuil')
+    if seuil is None:
+        seuil = SEUIL_BAS
+    if bas:
+        qs = qs.filter(quantite_disponible__lte=seuil)
+    date_debut = _date_param(request, 'date_debut')
+    date_fin = _date_param(request, 'date_fin')
+    if date_debut:
+        qs = qs.filter(date_mise_a_jour__gte=date_debut)
+    if date_fin:
+        qs = qs.filter(date_mise_a_jour__lte=date_fin)
+
+    tri = request.GET.get('tri', 'date')
+    if tri not in TRIS_STOCKS:
+        tri = 'date'
+    page_obj = KeysetPaginator(qs, TRIS_STOCKS[tri], 20).page(request.GET.get('cursor'))
+    total, total_exact = approximate_count(qs) if request.GET.get('total') == '1' else (None, False)
+
+    return render(request, 'stock/liste.html', {
+        'stocks': page_obj.object_list,
+        'page_obj': page_obj,
+        'total': total,
+        'total_exact': total_exact,
+        'qstr': query_string(request, 'cursor'),
+        'tri': tri,
+        'produit': produit,
+        'unite': unite,
+        'etape': etape,
+        'bas': bas,
+        'seuil': seuil,
+        'date_debut': date_debut,
+        'date_fin': date_fin,
+        'unites_choices': UNITE_CHOICES,
+        'etapes_choices': ETAPES_CHOICES,
+    })
 
 
 def ajouter_stock(request):
@@ -19,10 +120,10 @@ def ajouter_stock(request):
         unite_mesure = request.POST['unite_mesure']
         date_mise_a_jour = request.POST['date_mise_a_jour']
 
-        Stock.objects.create(
+        services.creer(
+            quantite_disponible,
             lot=lot,
             produit=produit,
-            quantite_disponible=quantite_disponible,
             unite_mesure=unite_mesure,
             date_mise_a_jour=date_mise_a_jour
         )
@@ -37,11 +138,13 @@ def modifier_stock(request, id):
     if request.method == "POST":
         stock.lot = get_object_or_404(Transformation, id=request.POST['lot'])
         stock.produit = request.POST['produit']
-        stock.quantite_disponible = request.POST['quantite_disponible']
         stock.unite_mesure = request.POST['unite_mesure']
         stock.date_mise_a_jour = request.POST['date_mise_a_jour']
 
-        stock.save()
+        with transaction.atomic():
+            stock.save(update_fields=['lot', 'produit', 'unite_mesure', 'date_mise_a_jour'])
+            # the quantity moves through the ledger: the difference is a movement
+            services.fixer(stock, request.POST['quantite_disponible'], note='Modification du stock')
         return redirect('liste_stocks')
 
     return render(request, 'stock/modifier.html', {'stock': stock, 'transformations': transformations})
@@ -56,3 +159,42 @@ def supprimer_stock(request, id):
 def details_stock(request, id):
     stock = get_object_or_404(Stock, id=id)
     return render(request, 'stock/details.html', {'stock': stock})
+
+
+def etat_stocks(request):
+    """JSON of the stock balances as of a date, from the ledger (stock/registre.py).
+
+    Supported GET params:
+    - date: AAAA-MM-JJ, balances at the end of that day (default: now)
+    - produit / unite: as in liste_stocks
+    - stock: a stock id, for its balance and last checkpoint only
+
+    Without `stock`: the totals per product and unit, e.g. a month-end valuation.
+    """
+    jour = _date_param(request, 'date')
+    if request.GET.get('date') and jour is None:
+        return JsonResponse({'error': "date attendue : AAAA-MM-JJ"}, status=400)
+    a = registre.fin_du_jour(jour) if jour else None
+
+    stocks = Stock.objects.all()
+    if request.GET.get('stock'):
+        stock_id = _int_param(request, 'stock')
+        if stock_id is None:
+            return JsonResponse({'error': "stock attendu : un identifiant numérique"}, status=400)
+        stock = get_object_or_404(Stock, id=stock_id)
+        ligne = registre.soldes(a, stocks.filter(pk=stock.pk)).values(
+            'id', 'produit', 'unite_mesure', 'quantite_disponible', 'solde', 'point_date', 'point_quantite',
+        ).get()
+        return JsonResponse({'date': jour.isoformat() if jour else None, **ligne})
+
+    produit = request.GET.get('produit', '').strip()
+    if produit:
+        stocks = par_texte(stocks, produit, ('produit',))
+    unite = request.GET.get('unite', '')
+    if unite in dict(UNITE_CHOICES):
+        stocks = stocks.filter(unite_mesure=unite)
+    totaux = [
+        {**t, 'quantite': round(t['quantite'] or 0, 3)}
+        for t in registre.totaux(a, stocks)
+    ]
+    return JsonResponse({'date': jour.isoformat() if jour else None, 'totaux': totaux})
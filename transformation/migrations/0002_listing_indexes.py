@@ -0,0 +1,26 @@
+# Generated by Django 5.2.7 on 2026-10-18 20:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('producteurs', '0007_parcelle_geo'),
+        ('transformation', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='transformation',
+            index=models.Index(fields=['date_debut', 'id'], name='transfo_date_id'),
+        ),
+        migrations.AddIndex(
+            model_name='transformation',
+            index=models.Index(fields=['etape', 'date_debut', 'id'], name='transfo_etape_date_id'),
+        ),
+        migrations.AddIndex(
+            model_name='transformation',
+            index=models.Index(fields=['code_lot', 'id'], name='transfo_code_lot_id'),
+        ),
+    ]
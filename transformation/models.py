@@ -16,5 +16,14 @@ class Transformation(models.Model):
     date_debut = models.DateField()
     date_fin = models.DateField()
 
+    class Meta:
+        indexes = [
+            # keyset sorts of liste_transformations, alone or under an étape filter
+            models.Index(fields=['date_debut', 'id'], name='transfo_date_id'),
+            models.Index(fields=['etape', 'date_debut', 'id'], name='transfo_etape_date_id'),
+            # code_lot prefix search and sort
+            models.Index(fields=['code_lot', 'id'], name='transfo_code_lot_id'),
+        ]
+
     def __str__(self):          
         return f"LOT {self.code_lot}"
@@ -0,0 +1,237 @@
+"""Rendements, pertes et débit des transformations, calculés avec NumPy.
+
+Les colonnes des transformations (étape, quantités, dates) et le fruit de
+leur récolte sont lus en tableaux NumPy, sans instancier de modèle :
+
+- rendement de chaque lot = quantité finale / quantité de départ ;
+- distribution des rendements (P10 à P90) par étape, et par étape et fruit ;
+- lots aberrants : hors des barrières de Tukey (1,5 écart interquartile) de
+  leur étape et fruit, ou incohérents (départ nul, finale > départ, fin
+  avant le début) ;
+- débit journalier par étape : la quantité de départ d'un lot est répartie
+  sur ses jours de traitement, d'où les kg traités et le nombre de lots en
+  cours chaque jour — ce qu'il faut pour dimensionner les lyophilisateurs.
+
+Le résultat est mis en cache (`dashboard.cache`) et recalculé après toute
+écriture sur les transformations, récoltes ou fruits.
+"""
+import numpy as np
+from django.db.models import CharField
+from django.db.models.functions import Cast
+
+from dashboard import cache as dashboard_cache
+from producteurs import fruits
+from producteurs.rendements import lire, quantiles
+
+from .models import ETAPES_CHOICES, Transformation
+
+DEPENDS_ON = ['transformation.Transformation', 'producteurs.Recolte', 'producteurs.Fruit']
+TIMEOUT = 24 * 3600
+QUANTILES = (0.1, 0.25, 0.5, 0.75, 0.9)
+# Tukey fences: q1 - k * iqr, q3 + k * iqr
+TUKEY = 1.5
+# fewer lots than this in an (étape, fruit) group: no fences
+TUKEY_MIN_LOTS = 8
+
+ETAPES = [code for code, _ in ETAPES_CHOICES]
+ETAPES_LABELS = dict(ETAPES_CHOICES)
+
+TRANSFORMATION = np.dtype([
+    ('id', 'i8'), ('etape', 'U20'), ('fruit', 'i8'),
+    ('depart', 'f8'), ('finale', 'f8'), ('debut', 'M8[D]'), ('fin', 'M8[D]'),
+])
+
+
+def _colonnes():
+    return lire(
+        Transformation.objects.order_by()
+        # ISO text: no date object built per row by the driver
+        .annotate(debut=Cast('date_debut', CharField()), fin=Cast('date_fin', CharField()))
+        .values_list('id', 'etape', 'recolte__fruit_id', 'quantite_depart', 'quantite_finale', 'debut', 'fin'),
+        TRANSFORMATION,
+    )
+
+
+def _etapes(codes):
+    """Index of each étape code in the returned names: ETAPES first, then unknown codes."""
+    uniques, inverse = np.unique(codes, return_inverse=True)
+    noms = ETAPES + [u for u in uniques.tolist() if u not in ETAPES]
+    index = np.array([noms.index(u) for u in uniques.tolist()], dtype=np.int64)
+    return index[inverse].reshape(-1), noms
+
+
+def _distribution(groupe, rendement, depart, finale, duree, aberrant):
+    """Summary of each group: {group: dict} (yields and losses in %)."""
+    groupes, effectifs, q = quantiles(groupe, rendement, QUANTILES)
+    pos = np.searchsorted(groupes, groupe)
+    sommes = {
+        nom: np.bincount(pos, weights=valeur, minlength=len(groupes))
+        for nom, valeur in (('depart', depart), ('finale', finale), ('duree', duree), ('aberrants', aberrant))
+    }
+    resultat = {}
+    for i, g in enumerate(groupes.tolist()):
+        global_ = sommes['finale'][i] / sommes['depart'][i] if sommes['depart'][i] > 0 else np.nan
+        resultat[g] = {
+            'lots': int(effectifs[i]),
+            'quantite_depart': round(float(sommes['depart'][i]), 1),
+            'quantite_finale': round(float(sommes['finale'][i]), 1),
+            # weighted by the quantities: what the étape really returns
+            'rendement_global': None if np.isnan(global_) else round(100 * float(global_), 1),
+            'perte_globale': None if np.isnan(global_) else round(100 * (1 - float(global_)), 1),
+            'p10': round(100 * float(q[0.1][i]), 1),
+            'p25': round(100 * float(q[0.25][i]), 1),
+            'mediane': round(100 * float(q[0.5][i]), 1),
+            'p75': round(100 * float(q[0.75][i]), 1),
+            'p90': round(100 * float(q[0.9][i]), 1),
+            'duree_moyenne': round(float(sommes['duree'][i] / effectifs[i]), 1),
+            'aberrants': int(sommes['aberrants'][i]),
+        }
+    return resultat
+
+
+def _debits(etape, nb_etapes, debut, fin, depart):
+    """Daily kg processed and lots in progress per étape, from the first to the last day.
+
+    Each lot spreads its starting quantity evenly over its days (both ends
+    included): a difference array per étape, summed with cumsum.
+    """
+    jour0 = debut.min()
+    start = (debut - jour0).astype(np.int64)
+    end = np.maximum((fin - jour0).astype(np.int64), start)
+    span = int(end.max()) + 2
+    taux = depart / (end - start + 1)
+    kg = np.zeros((nb_etapes, span))
+    lots = np.zeros((nb_etapes, span), dtype=np.int64)
+    np.add.at(kg, (etape, start), taux)
+    np.add.at(kg, (etape, end + 1), -taux)
+    np.add.at(lots, (etape, start), 1)
+    np.add.at(lots, (etape, end + 1), -1)
+    kg, lots = np.cumsum(kg, axis=1)[:, :-1], np.cumsum(lots, axis=1)[:, :-1]
+    # rounding residue of the running sum on idle days
+    kg[lots == 0] = 0
+    return jour0, kg, lots
+
+
+def calculer():
+    """Uncached statistics: {'etapes', 'fruits', 'aberrants', 'debits'}."""
+    t = _colonnes()
+    if not len(t):
+        return {'etapes': [], 'fruits': [], 'aberrants': None, 'debits': None}
+    etape, codes = _etapes(t['etape'])
+    depart, finale = t['depart'], t['finale']
+    duree = (t['fin'] - t['debut']).astype(np.int64)
+
+    incoherent = (depart <= 0) | (finale < 0) | (finale > depart) | (duree < 0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        rendement = np.where(depart > 0, finale / np.where(depart > 0, depart, 1), np.nan)
+    # incoherent lots are only reported as outliers, out of the distributions
+    valide = ~incoherent
+
+    # Tukey fences per (étape, fruit), on the coherent lots
+    groupe = etape * (int(t['fruit'].max()) + 1) + t['fruit']
+    ecart = np.zeros(len(t))
+    if valide.any():
+        groupes, effectifs, q = quantiles(groupe[valide], rendement[valide], (0.25, 0.75))
+        pos = np.minimum(np.searchsorted(groupes, groupe), len(groupes) - 1)
+        connu = valide & (groupes[pos] == groupe) & (effectifs[pos] >= TUKEY_MIN_LOTS)
+        q1, q3 = q[0.25][pos], q[0.75][pos]
+        iqr = np.maximum(q3 - q1, 1e-9)
+        with np.errstate(invalid='ignore'):
+            # distance beyond the fence, in interquartile ranges
+            ecart = np.where(connu, np.maximum(q1 - TUKEY * iqr - rendement, rendement - q3 - TUKEY * iqr) / iqr, 0)
+    aberrant = incoherent | (ecart > 0)
+
+    duree_ok = np.maximum(duree, 0)
+    par_etape = _distribution(etape[valide], rendement[valide], depart[valide], finale[valide],
+                              duree_ok[valide], aberrant[valide])
+    par_fruit = _distribution(groupe[valide], rendement[valide], depart[valide], finale[valide],
+                              duree_ok[valide], aberrant[valide])
+    for e in set(etape[~valide].tolist()) - set(par_etape):
+        par_etape[e] = None
+
+    jour0, kg, en_cours = _debits(etape, len(codes), t['debut'], t['fin'], np.where(depart > 0, depart, 0))
+
+    etapes = []
+    for e, stats in sorted(par_etape.items()):
+        actifs = en_cours[e] > 0
+        etapes.append({
+            'etape': codes[e],
+            'libelle': ETAPES_LABELS.get(codes[e], codes[e]),
+            **(stats or {}),
+            'lots': int((etape == e).sum()),
+            'aberrants': int(aberrant[etape == e].sum()),
+            'debit_moyen': round(float(kg[e][actifs].mean()), 1) if actifs.any() else 0.0,
+            'debit_p95': round(float(np.percentile(kg[e][actifs], 95)), 1) if actifs.any() else 0.0,
+            'debit_max': round(float(kg[e].max()), 1),
+            'lots_en_cours_max': int(en_cours[e].max()),
+        })
+    largeur = int(t['fruit'].max()) + 1
+    lignes_fruits = [
+        {'etape': codes[g // largeur], 'libelle': ETAPES_LABELS.get(codes[g // largeur], codes[g // largeur]),
+         'fruit_id': g % largeur, 'fruit': fruits.nom(g % largeur), **stats}
+        for g, stats in par_fruit.items()
+    ]
+    lignes_fruits.sort(key=lambda r: (ETAPES.index(r['etape']) if r['etape'] in ETAPES else len(ETAPES), r['fruit']))
+
+    ordre = np.argsort(-np.where(incoherent, np.inf, ecart), kind='stable')
+    ordre = ordre[aberrant[ordre]]
+    return {
+        'etapes': etapes,
+        'fruits': lignes_fruits,
+        'aberrants': {
+            'id': t['id'][ordre], 'etape': etape[ordre], 'fruit': t['fruit'][ordre],
+            'rendement': rendement[ordre], 'ecart': ecart[ordre], 'incoherent': incoherent[ordre],
+            'depart': depart[ordre], 'finale': finale[ordre], 'duree': duree[ordre],
+        },
+        'debits': {'codes': codes, 'jour0': jour0, 'kg': kg, 'lots': en_cours},
+    }
+
+
+def table():
+    """The cached statistics, recomputed after writes on transformations, récoltes or fruits."""
+    return dashboard_cache.cached('transformations:statistiques', (), calculer, depends_on=DEPENDS_ON, timeout=TIMEOUT)
+
+
+def aberrants(resultat, etape=None, fruit=None, limit=50, offset=0):
+    """Page of the outlier lots, most extreme first, plus their number."""
+    col = resultat['aberrants']
+    if col is None:
+        return [], 0
+    codes = resultat['debits']['codes']
+    masque = np.ones(len(col['id']), dtype=bool)
+    if etape is not None:
+        masque &= col['etape'] == (codes.index(etape) if etape in codes else -1)
+    if fruit is not None:
+        masque &= col['fruit'] == fruit
+    idx = np.flatnonzero(masque)
+    return [
+        {
+            'transformation_id': int(col['id'][i]),
+            'etape': codes[col['etape'][i]],
+            'fruit_id': int(col['fruit'][i]),
+            'fruit': fruits.nom(int(col['fruit'][i])),
+            'quantite_depart': round(float(col['depart'][i]), 1),
+            'quantite_finale': round(float(col['finale'][i]), 1),
+            'rendement': None if np.isnan(col['rendement'][i]) else round(100 * float(col['rendement'][i]), 1),
+            'duree': int(col['duree'][i]),
+            'incoherent': bool(col['incoherent'][i]),
+            # in interquartile ranges beyond the fence
+            'ecart': round(float(col['ecart'][i]), 2),
+        }
+        for i in idx[offset:offset + limit]
+    ], len(idx)
+
+
+def debit_journalier(resultat, etape, jours=90):
+    """[{jour, kg, lots}] of `etape` over the last `jours` days of the data."""
+    debits = resultat['debits']
+    if not debits or etape not in debits['codes']:
+        return []
+    e = debits['codes'].index(etape)
+    kg, lots = debits['kg'][e], debits['lots'][e]
+    depuis = max(len(kg) - jours, 0)
+    dates = debits['jour0'] + np.arange(depuis, len(kg))
+    return [
+        {'jour': str(d), 'kg': round(float(k), 1), 'lots': int(n)}
+        for d, k, n in zip(dates, kg[depuis:], lots[depuis:])
+    ]
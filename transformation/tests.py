@@ -1,3 +1,134 @@
+from datetime import date, timedelta
+
+from django.core.cache import cache as django_cache
 from django.test import TestCase
+from django.urls import reverse
+
+from producteurs.models import Fruit, Parcelle, Producteur, Recolte
+
+from . import statistiques
+from .models import Transformation
+from .views import ABERRANTS_PAGE
+
+
+def creer_recolte(fruit='Mangue'):
+    producteur, _ = Producteur.objects.get_or_create(telephone='622000001', defaults={
+        'nom': 'Camara', 'prenom': 'Alpha', 'adresse': 'Kindia'})
+    parcelle = Parcelle.objects.create(nom='P1', superficie=2, adresse='Kindia', producteur=producteur)
+    return Recolte.objects.create(fruit=Fruit.objects.create(nom=fruit), quantite=5000, date_recolte=date(2026, 5, 1),
+                                  producteur=producteur, parcelle=parcelle)
+
+
+def lot(recolte, etape, depart, finale, debut, fin=None):
+    return Transformation.objects.create(code_lot=f'LOT-{Transformation.objects.count() + 1}', recolte=recolte,
+                                         etape=etape, quantite_depart=depart, quantite_finale=finale,
+                                         date_debut=debut, date_fin=fin or debut)
+
+
+#------ Statistiques des transformations ------
+
+class StatistiquesTests(TestCase):
+
+    def setUp(self):
+        django_cache.clear()
+        self.recolte = creer_recolte()
+        # nine regular lots (20 % to 28 %), a 90 % one and an impossible one
+        self.reguliers = [lot(self.recolte, 'CONDITIONNEMENT', 100, 20 + i, date(2026, 6, 1) + timedelta(days=i))
+                          for i in range(9)]
+        self.haut = lot(self.recolte, 'CONDITIONNEMENT', 100, 90, date(2026, 6, 10))
+        self.incoherent = lot(self.recolte, 'CONDITIONNEMENT', 100, 120, date(2026, 6, 11))
+        # throughput: 400 kg over 4 days, then 50 kg on the third one
+        lot(self.recolte, 'LYOPHILISATION', 400, 100, date(2026, 6, 1), date(2026, 6, 4))
+        lot(self.recolte, 'LYOPHILISATION', 50, 10, date(2026, 6, 3))
+
+    def test_aberrants(self):
+        resultat = statistiques.calculer()
+        aberrants, total = statistiques.aberrants(resultat)
+        self.assertEqual(total, 2)
+        # the incoherent lot first, then by distance beyond the fence
+        self.assertEqual([a['transformation_id'] for a in aberrants], [self.incoherent.id, self.haut.id])
+        self.assertTrue(aberrants[0]['incoherent'])
+        # q1 = 22.25 %, q3 = 26.75 %: fence at 33.5 %, 90 % is 12.56 IQR beyond
+        self.assertEqual(aberrants[1]['ecart'], 12.56)
+        self.assertEqual(statistiques.aberrants(resultat, etape='LYOPHILISATION'), ([], 0))
+
+        conditionnement = next(e for e in resultat['etapes'] if e['etape'] == 'CONDITIONNEMENT')
+        # the incoherent lot is counted, but out of the distribution
+        self.assertEqual((conditionnement['lots'], conditionnement['aberrants']), (11, 2))
+        self.assertEqual(conditionnement['quantite_depart'], 1000.0)
+        self.assertEqual(conditionnement['mediane'], 24.5)
+        self.assertEqual(conditionnement['rendement_global'], 30.6)
+
+    def test_petit_groupe_sans_barrieres(self):
+        # under TUKEY_MIN_LOTS lots an (étape, fruit) has no fences
+        Transformation.objects.filter(pk__in=[t.pk for t in self.reguliers[:4]]).delete()
+        aberrants, _ = statistiques.aberrants(statistiques.calculer())
+        self.assertEqual([a['transformation_id'] for a in aberrants], [self.incoherent.id])
+
+    def test_debit_journalier(self):
+        resultat = statistiques.calculer()
+        debit = {d['jour']: (d['kg'], d['lots']) for d in statistiques.debit_journalier(resultat, 'LYOPHILISATION')}
+        self.assertEqual(debit['2026-06-01'], (100.0, 1))
+        self.assertEqual(debit['2026-06-03'], (150.0, 2))
+        self.assertEqual(debit['2026-06-04'], (100.0, 1))
+        self.assertEqual(debit['2026-06-05'], (0.0, 0))
+        lyophilisation = next(e for e in resultat['etapes'] if e['etape'] == 'LYOPHILISATION')
+        self.assertEqual((lyophilisation['debit_max'], lyophilisation['lots_en_cours_max']), (150.0, 2))
+        # an étape without lots is idle every day, an unknown one has no series
+        self.assertEqual({(d['kg'], d['lots']) for d in statistiques.debit_journalier(resultat, 'STOCKE')}, {(0.0, 0)})
+        self.assertEqual(statistiques.debit_journalier(resultat, 'INCONNU'), [])
+
+    def test_api(self):
+        url = reverse('api_statistiques_transformations')
+        response = self.client.get(url, {'etape': 'CONDITIONNEMENT', 'limit': '1', 'jours': '3'})
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual((len(data['aberrants']), data['total_aberrants']), (1, 2))
+        self.assertEqual(list(data['debits']), ['CONDITIONNEMENT'])
+        self.assertEqual(len(data['debits']['CONDITIONNEMENT']), 3)
+        # '²'.isdigit() is true but int('²') fails: ignored
+        response = self.client.get(url, {'fruit': '²', 'offset': '²', 'limit': '²'})
+        self.assertEqual((response.status_code, response.json()['limit']), (200, ABERRANTS_PAGE))
+
+
+#------ Liste des transformations ------
+
+class ListeTransformationsTests(TestCase):
+
+    def setUp(self):
+        self.mangue, self.ananas = creer_recolte('Mangue'), creer_recolte('Ananas')
+        self._creer(5)
+
+    def _creer(self, n):
+        for _ in range(n):
+            i = Transformation.objects.count()
+            lot(self.mangue if i % 2 else self.ananas, ('LYOPHILISATION', 'CONDITIONNEMENT')[i % 3 == 0],
+                100, 20, date(2026, 6, 1) + timedelta(days=i))
+
+    def _ids(self, **params):
+        response = self.client.get(reverse('liste_transformations'), params)
+        self.assertEqual(response.status_code, 200)
+        return {t.id for t in response.context['transformations']}
+
+    def test_requetes_constantes(self):
+        # récolte, fruit and producteur come with the page
+        for n in (20, 30):
+            self._creer(n)
+            with self.subTest(lots=Transformation.objects.count()):
+                with self.assertNumQueries(2):
+                    response = self.client.get(reverse('liste_transformations'))
+                with self.assertNumQueries(2):
+                    self.client.get(reverse('liste_transformations'),
+                                    {'cursor': response.context['page_obj'].next_cursor})
 
-# Create your tests here.
+    def test_filtres(self):
+        lots = list(Transformation.objects.select_related('recolte'))
+        self.assertEqual(self._ids(etape='CONDITIONNEMENT'), {t.id for t in lots if t.etape == 'CONDITIONNEMENT'})
+        self.assertEqual(self._ids(fruit=self.mangue.fruit_id), {t.id for t in lots if t.recolte_id == self.mangue.id})
+        self.assertEqual(self._ids(code_lot='LOT-3'), {Transformation.objects.get(code_lot='LOT-3').id})
+        self.assertEqual(self._ids(date_debut='2026-06-02', date_fin='2026-06-03'),
+                         {t.id for t in lots if date(2026, 6, 2) <= t.date_debut <= date(2026, 6, 3)})
+        # unknown values are ignored ('²'.isdigit() is true but int('²') fails)
+        self.assertEqual(self._ids(etape='SECHAGE', fruit='²'), {t.id for t in lots})
+        response = self.client.get(reverse('liste_transformations'), {'tri': 'code'})
+        self.assertEqual([t.code_lot for t in response.context['transformations']], sorted(t.code_lot for t in lots))
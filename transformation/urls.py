@@ -3,6 +3,8 @@ from . import views
 
 urlpatterns = [
     path('transformations/', views.liste_transformations, name='liste_transformations'),
+    path('transformations/statistiques/', views.statistiques_transformations, name='statistiques_transformations'),
+    path('transformations/statistiques/api/', views.api_statistiques_transformations, name='api_statistiques_transformations'),
     path('transformations/ajouter/', views.ajouter_transformation, name='ajouter_transformation'),
     path('transformations/<int:id>/', views.details_transformation, name='details_transformation'),
     path('transformations/<int:id>/modifier/', views.modifier_transformation, name='modifier_transformation'),
@@ -1,16 +1,87 @@
+from datetime import date
+
 from django.shortcuts import render, redirect, get_object_or_404
+from django.http import JsonResponse
+from core import lookup
+from core.pagination import KeysetPaginator, approximate_count, query_string
+from producteurs import fruits
 from producteurs.models import Recolte
-from .models import Transformation
+from . import statistiques
+from .models import ETAPES_CHOICES, Transformation
 
 #---------------------------------- VUES POUR LES TRANSFORMATIONS ---------------------------------
 
+# tri -> keyset ordering, each backed by an index of transformation.models
+TRIS_TRANSFORMATIONS = {
+    'date': ('-date_debut', '-id'),
+    'code': ('code_lot', 'id'),
+}
+
+
+def _date_param(request, name):
+    try:
+        return date.fromisoformat(request.GET.get(name, ''))
+    except ValueError:
+        return None
+
+
 def liste_transformations(request):
-    transformations = Transformation.objects.all()
-    return render(request, 'transformation/liste.html', {'transformations': transformations})
+    """List transformations with filters and keyset pagination.
+
+    Supported GET params:
+    - etape: one of ETAPES_CHOICES
+    - fruit: catalog id of the récolte's fruit
+    - code_lot: prefix of the lot code
+    - date_debut / date_fin: range of the start date of the lot
+    - tri: 'date' (default, latest first) or 'code'
+    - cursor / total: as in liste_producteurs
+    """
+    # récolte, fruit and producteur in the same query: one query per page
+    qs = Transformation.objects.select_related('recolte__fruit', 'recolte__producteur')
+
+    etape = request.GET.get('etape', '')
+    if etape in dict(ETAPES_CHOICES):
+        qs = qs.filter(etape=etape)
+    else:
+        etape = ''
+    fruit = request.GET.get('fruit', '')
+    fruit = int(fruit) if fruit.isdecimal() else None
+    if fruit is not None:
+        qs = qs.filter(recolte__fruit_id=fruit)
+    code_lot = request.GET.get('code_lot', '').strip()
+    if code_lot:
+        qs = qs.filter(code_lot__startswith=code_lot)
+    date_debut = _date_param(request, 'date_debut')
+    date_fin = _date_param(request, 'date_fin')
+    if date_debut:
+        qs = qs.filter(date_debut__gte=date_debut)
+    if date_fin:
+        qs = qs.filter(date_debut__lte=date_fin)
+
+    tri = request.GET.get('tri', 'date')
+    if tri not in TRIS_TRANSFORMATIONS:
+        tri = 'date'
+    page_obj = KeysetPaginator(qs, TRIS_TRANSFORMATIONS[tri], 20).page(request.GET.get('cursor'))
+    total, total_exact = approximate_count(qs) if request.GET.get('total') == '1' else (None, False)
+
+    return render(request, 'transformation/liste.html', {
+        'transformations': page_obj.object_list,
+        'page_obj': page_obj,
+        'total': total,
+        'total_exact': total_exact,
+        'qstr': query_string(request, 'cursor'),
+        'tri': tri,
+        'etape': etape,
+        'fruit': fruit,
+        'code_lot': code_lot,
+        'date_debut': date_debut,
+        'date_fin': date_fin,
+        'etapes_choices': ETAPES_CHOICES,
+        'fruits_choices': fruits.choix(),
+    })
 
 
 def ajouter_transformation(request):
-    recoltes = Recolte.objects.all()
     if request.method == "POST":
         code_lot = request.POST['code_lot']
         recolte_id = request.POST['recolte']
@@ -31,12 +102,14 @@ def ajouter_transformation(request):
             date_fin=date_fin
         )
         return redirect('liste_transformations')
-    return render(request, 'transformation/ajouter.html', {'recoltes': recoltes})
+    # the récolte is a typeahead field (core.lookup): no table preloaded
+    return render(request, 'transformation/ajouter.html')
 
 
 def modifier_transformation(request, id):
-    transformation = get_object_or_404(Transformation, id=id)
-    recoltes = Recolte.objects.all()
+    transformation = get_object_or_404(
+        Transformation.objects.select_related('recolte__fruit', 'recolte__producteur'), id=id,
+    )
 
     if request.method == "POST":
         transformation.code_lot = request.POST['code_lot']
@@ -52,7 +125,7 @@ def modifier_transformation(request, id):
 
     return render(request, 'transformation/modifier.html', {
         'transformation': transformation,
-        'recoltes': recoltes
+        'recolte_label': lookup.libelle('recolte', transformation.recolte),
     })
 
 
@@ -65,3 +138,80 @@ def supprimer_transformation(request, id):
 def details_transformation(request, id):
     transformation = get_object_or_404(Transformation, id=id)
     return render(request, 'transformation/details.html', {'transformation': transformation})
+
+
+#---------------------------------- STATISTIQUES (rendements, pertes, débit) ---------------------------------
+
+ABERRANTS_PAGE = 50
+ABERRANTS_PAGE_MAX = 1000
+
+
+def _int_param(request, name):
+    value = request.GET.get(name, '')
+    return int(value) if value.isdecimal() else None
+
+
+def _statistiques(request, limit):
+    """Filters of the statistics report / API applied to the cached result."""
+    resultat = statistiques.table()
+    etape = request.GET.get('etape') or None
+    fruit = _int_param(request, 'fruit')
+    offset = _int_param(request, 'offset') or 0
+    aberrants, total = statistiques.aberrants(resultat, etape=etape, fruit=fruit, limit=limit, offset=offset)
+    par_fruit = [
+        r for r in resultat['fruits']
+        if etape in (None, r['etape']) and fruit in (None, r['fruit_id'])
+    ]
+    return resultat, etape, fruit, offset, aberrants, total, par_fruit
+
+
+def statistiques_transformations(request):
+    """Conversion yields, losses, durations and daily throughput per étape and fruit.
+
+    GET params: etape (code), fruit (id), jours (throughput window, default 90),
+    offset (page of the outlier lots).
+    """
+    resultat, etape, fruit, offset, aberrants, total, par_fruit = _statistiques(request, ABERRANTS_PAGE)
+    lots = Transformation.objects.in_bulk([a['transformation_id'] for a in aberrants])
+    for a in aberrants:
+        a['lot'] = lots.get(a['transformation_id'])
+    jours = _int_param(request, 'jours') or 90
+    debits = {e['etape']: statistiques.debit_journalier(resultat, e['etape'], jours) for e in resultat['etapes']}
+    context = {
+        'etapes': resultat['etapes'],
+        'par_fruit': par_fruit,
+        'aberrants': aberrants,
+        'total': total,
+        'debits': debits,
+        'jours': jours,
+        'filtres': {'etape': etape, 'fruit': fruit},
+        'etapes_choices': statistiques.ETAPES_LABELS.items(),
+        'fruits_choices': fruits.choix(),
+        'precedent': max(offset - ABERRANTS_PAGE, 0) if offset else None,
+        'suivant': offset + ABERRANTS_PAGE if offset + ABERRANTS_PAGE < total else None,
+        'qstr': query_string(request, 'offset'),
+    }
+    return render(request, 'transformation/statistiques.html', context)
+
+
+def api_statistiques_transformations(request):
+    """JSON of the statistics report: `etapes`, `fruits`, a page of `aberrants` and `debits`.
+
+    Same filters as statistiques_transformations, plus ?limit= (default 50, at most 1000).
+    """
+    limit = _int_param(request, 'limit')
+    limit = min(limit, ABERRANTS_PAGE_MAX) if limit else ABERRANTS_PAGE
+    resultat, etape, fruit, offset, aberrants, total, par_fruit = _statistiques(request, limit)
+    jours = _int_param(request, 'jours') or 90
+    return JsonResponse({
+        'etapes': resultat['etapes'],
+        'fruits': par_fruit,
+        'aberrants': aberrants,
+        'total_aberrants': total,
+        'offset': offset,
+        'limit': limit,
+        'debits': {
+            e['etape']: statistiques.debit_journalier(resultat, e['etape'], jours)
+            for e in resultat['etapes'] if etape in (None, e['etape'])
+        },
+    })
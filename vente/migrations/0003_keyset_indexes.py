@@ -0,0 +1,22 @@
+# Generated by Django 5.2.7 on 2026-10-18 19:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stock', '0002_stockmovement'),
+        ('vente', '0002_client_prenom'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='facture',
+            index=models.Index(fields=['date_emission', 'id'], name='facture_date_id'),
+        ),
+        migrations.AddIndex(
+            model_name='vente',
+            index=models.Index(fields=['date_vente', 'id'], name='vente_date_id'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.7 on 2026-10-18 19:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('vente', '0003_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='client',
+            index=models.Index(fields=['nom', 'prenom', 'id'], name='client_nom_prenom_id'),
+        ),
+    ]
@@ -8,6 +8,12 @@ class Client (models.Model):
     adresse = models.CharField(max_length=50)
     email = models.EmailField(max_length=254, unique=True)
 
+    class Meta:
+        indexes = [
+            # alphabetical typeahead lookups (core.lookup)
+            models.Index(fields=['nom', 'prenom', 'id'], name='client_nom_prenom_id'),
+        ]
+
     def __str__(self):
         return f"{self.nom} {self.prenom} {self.telephone}"
     
@@ -20,6 +26,12 @@ class Vente (models.Model):
     date_vente = models.DateField()
     montant_total = models.DecimalField(max_digits=10,decimal_places=2)
 
+    class Meta:
+        indexes = [
+            # keyset pagination of the vente overview
+            models.Index(fields=['date_vente', 'id'], name='vente_date_id'),
+        ]
+
     def __str__(self):
         return f"QTE {self.quantite_vendue} PU : {self.prix_unitaire} MTotal : {self.montant_total}"
     
@@ -41,7 +53,12 @@ class Facture (models.Model):
     montant = models.DecimalField(max_digits=10, decimal_places=2)
     mode_paiement = models.CharField(max_length=20, choices=PAIEMENT_CHOICES)
     statut = models.CharField(max_length=15, choices=STATUT_CHOICES)
-    
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['date_emission', 'id'], name='facture_date_id'),
+        ]
+
     def __str__(self):
         return f"Facture No: {self.numero_facture} Montant: {self.montant} Statut: {self.statut}"
 
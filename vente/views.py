@@ -1,13 +1,14 @@
 from django.shortcuts import render, get_object_or_404, redirect
 from django.http import JsonResponse
 from .models import Client, Vente, Facture
-from stock.models import Stock, StockMovement
+from stock import services as stock_services
+from stock.models import Stock
 from datetime import date
-from django.core.paginator import Paginator
 from django.contrib import messages
 from django.template.loader import render_to_string
 from django.http import HttpResponse
-from django.db.models import Q
+from core import lookup, search
+from core.pagination import KeysetPaginator, query_string
 
 #---------------------------------- VUES POUR LES CLIENTS ---------------------------------
 
@@ -78,12 +79,9 @@ def liste_ventes(request):
     ventes_qs = Vente.objects.select_related('client', 'stock').all()
 
     if field in ('', 'client') and q:
-        # search by client name / prenom / telephone
-        ventes_qs = ventes_qs.filter(
-            Q(client__nom__icontains=q) |
-            Q(client__prenom__icontains=q) |
-            Q(client__telephone__icontains=q)
-        )
+        # search by client name / prenom / telephone (trigram index, see core/search.py)
+        clients = search.filtrer(Client.objects.all(), q, ('nom', 'prenom', 'telephone'))
+        ventes_qs = ventes_qs.filter(client__in=clients.values('id'))
 
     if field == 'facture' and q:
         # search by facture number (reverse relation)
@@ -150,8 +148,6 @@ def liste_ventes(request):
 
 
 def ajouter_vente(request):
-    clients = Client.objects.all()
-    stocks = Stock.objects.all()
     if request.method == "POST":
         # Allow creating/selecting client in the same form
         client = None
@@ -197,59 +193,34 @@ def ajouter_vente(request):
         quantite_vendue = float(request.POST.get('quantite_vendue') or 0)
         prix_unitaire = float(request.POST.get('prix_unitaire') or 0)
         date_vente = request.POST.get('date_vente')
-        montant_total = quantite_vendue * prix_unitaire
-
-        # Strict stock option (if checked, refuse creation when insufficient stock)
-        strict_stock = request.POST.get('strict_stock') == '1'
-        if strict_stock and quantite_vendue > (stock.quantite_disponible or 0):
-            messages.error(request, f"Stock insuffisant pour '{stock.produit}' (disponible: {stock.quantite_disponible}). Vente annulée.")
-            return redirect('ajouter_vente')
-
-        vente = Vente.objects.create(
-            client=client,
-            stock=stock,
-            quantite_vendue=quantite_vendue,
-            prix_unitaire=prix_unitaire,
-            date_vente=date_vente,
-            montant_total=montant_total
-        )
-
-        # Reduce stock quantity by the sold amount (or set to zero when not strict)
-        try:
-            original = stock.quantite_disponible or 0
-            if quantite_vendue > original:
-                # if strict_stock, we already returned above; otherwise set to zero and record partial
-                deducted = original
-                stock.quantite_disponible = 0
-                messages.warning(request, f"Vente créée — stock insuffisant pour '{stock.produit}'. Quantité vendue limitée à {deducted} (stock mis à zéro).")
-            else:
-                deducted = quantite_vendue
-                stock.quantite_disponible = original - deducted
-            stock.save()
-            # record movement (negative change)
-            try:
-                StockMovement.objects.create(stock=stock, vente=vente, change=-deducted, reason='VENTE', note=f'Vente #{vente.id}')
-            except Exception:
-                # ignore movement creation errors but keep processing
-                pass
-        except Exception:
-            messages.warning(request, "Impossible de mettre à jour le stock automatiquement.")
 
         # Optionally create facture immediately if requested
+        facture = None
         if request.POST.get('create_facture') == '1':
-            numero_facture = request.POST.get('numero_facture') or ''
-            mode_paiement = request.POST.get('mode_paiement') or 'LIQUIDE'
-            statut = request.POST.get('statut') or 'ATTENTE'
-            # Invoice montant is strictly the vente montant_total
-            montant = float(montant_total)
-            Facture.objects.create(
-                vente=vente,
-                numero_facture=numero_facture,
-                date_emission=request.POST.get('date_emission') or date.today(),
-                montant=montant,
-                mode_paiement=mode_paiement,
-                statut=statut
+            facture = {
+                'numero_facture': request.POST.get('numero_facture') or '',
+                'date_emission': request.POST.get('date_emission') or date.today(),
+                # Invoice montant is strictly the vente montant_total
+                'montant': float(quantite_vendue * prix_unitaire),
+                'mode_paiement': request.POST.get('mode_paiement') or 'LIQUIDE',
+                'statut': request.POST.get('statut') or 'ATTENTE',
+            }
+
+        # Strict stock option (if checked, refuse creation when insufficient stock).
+        # Vente, stock decrement, movement and facture are one transaction.
+        strict_stock = request.POST.get('strict_stock') == '1'
+        try:
+            vente, deducted = stock_services.enregistrer_vente(
+                client, stock, quantite_vendue, prix_unitaire, date_vente, strict=strict_stock, facture=facture,
             )
+        except stock_services.StockInsuffisant as e:
+            messages.error(request, f"Stock insuffisant pour '{stock.produit}' (disponible: {e.disponible}). Vente annulée.")
+            return redirect('ajouter_vente')
+        except stock_services.QuantiteInvalide as e:
+            messages.error(request, f"{e}. Vente annulée.")
+            return redirect('ajouter_vente')
+        if deducted < quantite_vendue:
+            messages.warning(request, f"Vente créée — stock insuffisant pour '{stock.produit}'. Quantité vendue limitée à {deducted} (stock mis à zéro).")
 
         # If AJAX, return JSON with vente id and montant
         if request.headers.get('x-requested-with') == 'XMLHttpRequest' or request.POST.get('ajax') == '1':
@@ -257,19 +228,14 @@ def ajouter_vente(request):
 
         return redirect('liste_ventes')
 
-    return render(request, 'vente/ajouter.html', {'clients': clients, 'stocks': stocks})
+    # client and stock are typeahead fields (core.lookup): no table preloaded
+    return render(request, 'vente/ajouter.html')
 
 
 def modifier_vente(request, id):
-    vente = get_object_or_404(Vente, id=id)
-    clients = Client.objects.all()
-    stocks = Stock.objects.all()
+    vente = get_object_or_404(Vente.objects.select_related('client', 'stock'), id=id)
 
     if request.method == "POST":
-        # preserve old stock/quantity before changes so we can adjust stock correctly
-        old_stock = vente.stock
-        old_q = vente.quantite_vendue
-
         # get selected client and optionally update its details if provided inline
         client = get_object_or_404(Client, id=request.POST['client'])
         # inline client update fields (optional)
@@ -291,101 +257,49 @@ def modifier_vente(request, id):
             if client_email is not None:
                 client.email = client_email.strip()
             client.save()
-        vente.client = client
         new_stock = get_object_or_404(Stock, id=request.POST['stock'])
         new_q = float(request.POST['quantite_vendue'])
         new_price = float(request.POST['prix_unitaire'])
-        vente.stock = new_stock
-        vente.quantite_vendue = new_q
-        vente.prix_unitaire = new_price
-        vente.date_vente = request.POST['date_vente']
-        vente.montant_total = vente.quantite_vendue * vente.prix_unitaire
-        vente.save()
-
-        # Adjust stock inventories: add back the old sold quantity to old_stock, then subtract from new_stock
-        try:
-            strict_stock = request.POST.get('strict_stock') == '1'
 
-            # restore old quantity to old_stock when different
-            if old_stock and old_stock.id != new_stock.id:
-                try:
-                    old_orig = old_stock.quantite_disponible or 0
-                    old_stock.quantite_disponible = old_orig + (old_q or 0)
-                    old_stock.save()
-                    # record restoration movement
-                    try:
-                        StockMovement.objects.create(stock=old_stock, vente=vente, change=(old_q or 0), reason='RESTORE', note=f'Restore from vente #{vente.id} modification')
-                    except Exception:
-                        pass
-                except Exception:
-                    pass
-
-            # For new_stock, check availability
-            new_orig = new_stock.quantite_disponible or 0
-            if strict_stock and new_q > new_orig:
-                messages.error(request, f"Stock insuffisant pour '{new_stock.produit}' (disponible: {new_orig}). Mise à jour annulée.")
-                # rollback: reapply old_stock restoration if needed
-                return redirect('modifier_vente', id=vente.id)
-
-            if new_q > new_orig:
-                deducted = new_orig
-                new_stock.quantite_disponible = 0
-                messages.warning(request, f"Vente mise à jour — stock insuffisant pour '{new_stock.produit}'. Quantité vendue limitée à {deducted} (stock mis à zéro).")
-            else:
-                deducted = new_q
-                new_stock.quantite_disponible = new_orig - deducted
-
-            new_stock.save()
-            # record movement for new deduction
-            try:
-                StockMovement.objects.create(stock=new_stock, vente=vente, change=-deducted, reason='VENTE', note=f'Vente #{vente.id} updated')
-            except Exception:
-                pass
-        except Exception:
-            messages.warning(request, "Impossible de mettre à jour automatiquement les stocks liés à la vente.")
-
-        # Handle facture create/update inline
-        # look for existing facture linked to this vente (take first if multiple)
-        try:
-            facture = Facture.objects.filter(vente=vente).first()
-        except Exception:
-            facture = None
-
-        # detect if facture fields were submitted
+        # Handle facture create/update inline: detect if facture fields were submitted
+        facture = None
         create_facture_flag = request.POST.get('create_facture') == '1' or request.POST.get('numero_facture') or request.POST.get('montant')
         if create_facture_flag:
-            numero_facture = request.POST.get('numero_facture') or ''
-            date_emission = request.POST.get('date_emission') or date.today()
             montant = request.POST.get('montant')
             try:
-                montant_val = float(montant) if montant not in (None, '') else float(vente.montant_total)
-            except Exception:
-                montant_val = float(vente.montant_total)
-            mode_paiement = request.POST.get('mode_paiement') or 'LIQUIDE'
-            statut = request.POST.get('statut') or 'ATTENTE'
-
-            if facture:
-                facture.numero_facture = numero_facture
-                facture.date_emission = date_emission
-                facture.montant = montant_val
-                facture.mode_paiement = mode_paiement
-                facture.statut = statut
-                facture.save()
-            else:
-                Facture.objects.create(
-                    vente=vente,
-                    numero_facture=numero_facture,
-                    date_emission=date_emission,
-                    montant=montant_val,
-                    mode_paiement=mode_paiement,
-                    statut=statut
-                )
+                montant_val = float(montant) if montant not in (None, '') else new_q * new_price
+            except ValueError:
+                montant_val = new_q * new_price
+            facture = {
+                'numero_facture': request.POST.get('numero_facture') or '',
+                'date_emission': request.POST.get('date_emission') or date.today(),
+                'montant': montant_val,
+                'mode_paiement': request.POST.get('mode_paiement') or 'LIQUIDE',
+                'statut': request.POST.get('statut') or 'ATTENTE',
+            }
+
+        # Restore what the vente took from its old stock, take the new quantity from
+        # the new stock, save the vente and its facture: all or nothing
+        strict_stock = request.POST.get('strict_stock') == '1'
+        try:
+            deducted = stock_services.modifier_vente(
+                vente, client, new_stock, new_q, new_price, request.POST['date_vente'],
+                strict=strict_stock, facture=facture,
+            )
+        except stock_services.StockInsuffisant as e:
+            messages.error(request, f"Stock insuffisant pour '{new_stock.produit}' (disponible: {e.disponible}). Mise à jour annulée.")
+            return redirect('modifier_vente', id=vente.id)
+        except stock_services.QuantiteInvalide as e:
+            messages.error(request, f"{e}. Mise à jour annulée.")
+            return redirect('modifier_vente', id=vente.id)
+        if deducted < new_q:
+            messages.warning(request, f"Vente mise à jour — stock insuffisant pour '{new_stock.produit}'. Quantité vendue limitée à {deducted} (stock mis à zéro).")
         return redirect('liste_ventes')
 
     return render(request, 'vente/modifier.html', {
         'vente': vente,
-        'clients': clients,
-        'stocks': stocks
+        'client_label': lookup.libelle('client', vente.client),
+        'stock_label': lookup.libelle('stock', vente.stock),
     })
 
 
@@ -408,7 +322,6 @@ def liste_factures(request):
 
 
 def ajouter_facture(request):
-    ventes = Vente.objects.all()
     if request.method == "POST":
         vente = get_object_or_404(Vente, id=request.POST['vente'])
         numero_facture = request.POST['numero_facture']
@@ -427,12 +340,11 @@ def ajouter_facture(request):
         )
         return redirect('liste_factures')
 
-    return render(request, 'facture/ajouter.html', {'ventes': ventes})
+    return render(request, 'facture/ajouter.html')
 
 
 def modifier_facture(request, id):
-    facture = get_object_or_404(Facture, id=id)
-    ventes = Vente.objects.all()
+    facture = get_object_or_404(Facture.objects.select_related('vente__client'), id=id)
 
     if request.method == "POST":
         facture.vente = get_object_or_404(Vente, id=request.POST['vente'])
@@ -446,7 +358,7 @@ def modifier_facture(request, id):
 
     return render(request, 'facture/modifier.html', {
         'facture': facture,
-        'ventes': ventes
+        'vente_label': lookup.libelle('vente', facture.vente),
     })
 
 
@@ -513,25 +425,29 @@ def download_facture(request, id):
 
 
 def overview(request):
-    """Combined overview for the vente module: clients, ventes and factures in tabs."""
-    # small lists for quick overview, with optional pagination per tab
-    clients_qs = Client.objects.order_by('-id')
-    ventes_qs = Vente.objects.select_related('client', 'stock').order_by('-date_vente')
-    factures_qs = Facture.objects.select_related('vente').order_by('-date_emission')
+    """Combined overview for the vente module: clients, ventes and factures in tabs.
 
-    # simple pagination (show 12 per tab)
-    page_size = 12
-    c_page = request.GET.get('cpage')
-    v_page = request.GET.get('vpage')
-    f_page = request.GET.get('fpage')
+    Each tab has its own keyset cursor (ccursor, vcursor, fcursor): no COUNT
+    and no OFFSET, a deep page costs the same as the first one.
+    """
+    clients_qs = Client.objects.all()
+    ventes_qs = Vente.objects.select_related('client', 'stock')
+    factures_qs = Facture.objects.select_related('vente')
 
-    c_p = Paginator(clients_qs, page_size).get_page(c_page)
-    v_p = Paginator(ventes_qs, page_size).get_page(v_page)
-    f_p = Paginator(factures_qs, page_size).get_page(f_page)
+    # show 12 per tab
+    page_size = 12
+    c_p = KeysetPaginator(clients_qs, ('-id',), page_size).page(request.GET.get('ccursor'))
+    v_p = KeysetPaginator(ventes_qs, ('-date_vente', '-id'), page_size).page(request.GET.get('vcursor'))
+    f_p = KeysetPaginator(factures_qs, ('-date_emission', '-id'), page_size).page(request.GET.get('fcursor'))
 
     context = {
         'clients_page': c_p,
         'ventes_page': v_p,
         'factures_page': f_p,
+        'tab': request.GET.get('tab', 'ventes'),
+        # other tabs keep their position when one tab moves
+        'cqs': query_string(request, 'ccursor', 'tab'),
+        'vqs': query_string(request, 'vcursor', 'tab'),
+        'fqs': query_string(request, 'fcursor', 'tab'),
     }
     return render(request, 'vente/overview.html', context)